@@ -1 +1,214 @@
 # fastapi backend
+# Read-only JSON API over the bot's sqlite file, launched by start.sh (uvicorn backend.app:app).
+# Every response is built from the read-only pool, cached for a few seconds, tagged with an
+# ETag (If-None-Match -> 304) and gzipped, so hundreds of viewers polling during a big auction
+# cost one query per endpoint per TTL.
+import csv
+import hashlib
+import io
+import json
+import threading
+import time
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+
+from backend.databse import DatabaseUnavailable, ReadPool
+from modules.charts import CHART_RANGES, render_svg, series_query
+from modules.history import EXPORT_COLUMNS, archived_bids_chunk, archived_bids_start, next_cursor
+
+CACHE_TTL = 5         # seconds for listings
+AUCTION_TTL = 1       # live auctions change with every bid
+HISTORY_TTL = 30      # market history only moves once per market tick
+CHART_TTL = 3600      # charts are keyed by the club's latest history row, so a tick replaces them anyway
+CACHE_MAX = 1024      # cached responses kept before the cache is reset
+PAGE_LIMIT = 50
+PAGE_LIMIT_MAX = 200
+GZIP_MIN_SIZE = 512
+
+app = FastAPI(title="Club Auction API")
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+pool = ReadPool()
+
+# ---------- RESPONSE CACHE ----------
+class ResponseCache:
+    """
+    key -> (expires, body, etag). Only one thread builds a given key at a time; the others
+    wait for it and reuse the result, so an expired entry under load costs one query.
+    """
+    def __init__(self, max_entries=CACHE_MAX):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def get(self, key, ttl, build, encode=None):
+        hit = self._entries.get(key)
+        if hit and hit[0] > time.monotonic():
+            return hit
+        with self._key_lock(key):
+            hit = self._entries.get(key)
+            if hit and hit[0] > time.monotonic():
+                return hit
+            data = build()
+            body = encode(data) if encode else json.dumps(data, separators=(",", ":"), default=str).encode("utf-8")
+            # content hash: unchanged data keeps its ETag across expirations
+            etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+            entry = (time.monotonic() + ttl, body, etag)
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                    self._locks = {key: self._locks[key]}
+                self._entries[key] = entry
+            return entry
+
+cache = ResponseCache()
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def serve(request: Request, ttl, build, version=None, encode=None, media_type="application/json"):
+    # version: part of the cache key, for bodies that must change as soon as their data does
+    key = str(request.url.path) + "?" + str(request.url.query) + ("" if version is None else f"#{version}")
+    try:
+        _, body, etag = cache.get(key, ttl, build, encode)
+    except DatabaseUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={ttl}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def in_guild(guild, column="guild_id"):
+    # optional ?guild=<id>: only that server's rows (every listing is partitioned by guild)
+    return ("", ()) if guild is None else (f" AND {column} = ?", (guild,))
+
+def page(rows, limit):
+    # keyset pagination: pass `next` back as ?after= for the following page
+    return {"items": rows, "next": rows[-1]["id"] if len(rows) == limit else None}
+
+# ---------- ENDPOINTS ----------
+# plain `def` endpoints run in FastAPI's thread pool, so sqlite never blocks the event loop
+
+@app.get("/healthz")
+def healthz():
+    return {"ok": True}
+
+@app.get("/api/clubs")
+def clubs(request: Request, after: int = 0, limit: int = Query(PAGE_LIMIT, ge=1, le=PAGE_LIMIT_MAX), guild: int = None):
+    where, params = in_guild(guild)
+    return serve(request, CACHE_TTL, lambda: page(pool.fetchall(
+        f"SELECT id, guild_id, name, base_price, value, slogan, manager_id FROM club WHERE id > ?{where} ORDER BY id LIMIT ?",
+        (after, *params, limit)), limit))
+
+@app.get("/api/clubs/{club_id}")
+def club(request: Request, club_id: int):
+    def build():
+        row = pool.fetchone("SELECT id, guild_id, name, base_price, value, slogan, logo, banner, manager_id FROM club WHERE id=?", (club_id,))
+        if row is None:
+            raise HTTPException(status_code=404, detail="No such club")
+        row["owner"] = pool.fetchone(
+            "SELECT winner, winner_type, winner_id, amount, timestamp FROM club_history WHERE club_id=? ORDER BY id DESC LIMIT 1",
+            (club_id,))
+        return row
+    return serve(request, CACHE_TTL, build)
+
+@app.get("/api/clubs/{club_id}/market")
+def club_market(request: Request, club_id: int, limit: int = Query(100, ge=1, le=1000)):
+    # newest first, straight off idx_club_market_history_club
+    return serve(request, HISTORY_TTL, lambda: pool.fetchall(
+        "SELECT timestamp, value FROM club_market_history WHERE club_id=? ORDER BY id DESC LIMIT ?", (club_id, limit)))
+
+@app.get("/api/clubs/{club_id}/chart.svg")
+def club_chart(request: Request, club_id: int, chart_range: str = Query("month", alias="range")):
+    """
+    Market value chart, rendered from the club_market_rollups resolution the range calls
+    for. Cached under the club's latest history row: repeat views between two market
+    ticks cost one index probe, the next tick's row makes a fresh render.
+    """
+    if chart_range not in CHART_RANGES:
+        raise HTTPException(status_code=422, detail="range must be one of " + ", ".join(CHART_RANGES))
+    try:
+        last = pool.fetchone("SELECT MAX(id) AS id FROM club_market_history WHERE club_id=?", (club_id,))
+    except DatabaseUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if last["id"] is None:
+        raise HTTPException(status_code=404, detail="No market history for this club")
+    def build():
+        sql, params = series_query(club_id, chart_range)
+        return render_svg(f"Club {club_id} market value ({chart_range})", pool.fetchall(sql, params))
+    return serve(request, CHART_TTL, build, version=last["id"], encode=lambda svg: svg.encode("utf-8"), media_type="image/svg+xml")
+
+@app.get("/api/duelists")
+def duelists(request: Request, after: int = 0, limit: int = Query(PAGE_LIMIT, ge=1, le=PAGE_LIMIT_MAX), guild: int = None):
+    where, params = in_guild(guild)
+    return serve(request, CACHE_TTL, lambda: page(pool.fetchall(
+        "SELECT id, guild_id, username, base_price, expected_salary, owned_by, owner_type, owner_id, registered_at "
+        f"FROM duelists WHERE id > ?{where} ORDER BY id LIMIT ?", (after, *params, limit)), limit))
+
+@app.get("/api/auctions")
+def auctions(request: Request, guild: int = None):
+    # latest bid per live auction via idx_bids_item; bids are written behind by the bot,
+    # so this trails the in-memory state by at most the write-behind delay plus the TTL
+    where, params = in_guild(guild, "l.guild_id")
+    return serve(request, AUCTION_TTL, lambda: pool.fetchall(
+        "SELECT l.guild_id, l.item_type, l.item_id, l.base_price, "
+        "COALESCE(c.name, d.username) AS name, b.amount AS high_bid, b.bidder, b.bidder_type, b.bidder_id, b.timestamp AS last_bid_at "
+        "FROM live_auctions l "
+        "LEFT JOIN club c ON l.item_type = 'club' AND c.id = CAST(l.item_id AS INTEGER) "
+        "LEFT JOIN duelists d ON l.item_type = 'duelist' AND d.id = CAST(l.item_id AS INTEGER) "
+        "LEFT JOIN bids b ON b.id = (SELECT MAX(id) FROM bids WHERE item_type = l.item_type AND item_id = l.item_id) "
+        f"WHERE 1{where} ORDER BY l.item_type, l.item_id", params))
+
+@app.get("/api/groups")
+def groups(request: Request, guild: int = None):
+    where, params = in_guild(guild, "g.guild_id")
+    return serve(request, CACHE_TTL, lambda: pool.fetchall(
+        "SELECT g.id, g.guild_id, g.name, g.funds, COUNT(m.id) AS members FROM investor_groups g "
+        "LEFT JOIN groups_members m ON m.guild_id = g.guild_id AND m.group_name = g.name "
+        f"WHERE 1{where} GROUP BY g.id ORDER BY g.funds DESC", params))
+
+@app.get("/api/bids/archive.csv")
+def bids_archive_csv(guild: int, month: str = None):
+    """
+    One guild's archived bids (optionally one YYYY-MM) as CSV, oldest first: the same
+    columns and keyset chunks as !exportbids (modules/history.py). Streamed chunk by chunk:
+    never cached, never held in memory as a whole, and each chunk holds a pool connection
+    only for its own query.
+    """
+    try:
+        cursor, end = archived_bids_start(month)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="month must be YYYY-MM")
+    def chunk(cursor):
+        return pool.fetchall(*archived_bids_chunk(guild, cursor, end))
+    try:
+        rows = chunk(cursor)   # first chunk up front, so a missing database is a 503 and not a broken stream
+    except DatabaseUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    def lines(rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EXPORT_COLUMNS)
+        while True:
+            writer.writerows([r[c] for c in EXPORT_COLUMNS] for r in rows)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            cursor = next_cursor(rows)
+            if cursor is None:
+                return
+            rows = chunk(cursor)
+    name = f"bids-{guild}-{month or 'all'}.csv"
+    return StreamingResponse(lines(rows), media_type="text/csv", headers={"Content-Disposition": f'attachment; filename="{name}"'})
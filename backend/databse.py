@@ -0,0 +1,89 @@
+# read-only sqlite access for the web backend (never writes; the bot owns the write path)
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_FILE = os.getenv("AUCTION_DB_FILE") or "auction.db"
+POOL_SIZE = int(os.getenv("BACKEND_DB_POOL") or 8)
+POOL_TIMEOUT = 5   # seconds a request waits for a free connection
+
+class DatabaseUnavailable(Exception):
+    pass
+
+class ReadPool:
+    """
+    Fixed pool of read-only connections (mode=ro, query_only). In WAL mode readers never
+    block the bot's writer and the writer never blocks them, so the dashboard can be
+    polled hard without touching the bot's write path.
+    """
+    def __init__(self, path=DB_FILE, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if not os.path.exists(self.path):
+            raise DatabaseUnavailable(f"database {self.path} does not exist yet (start the bot first)")
+        uri = pathlib.Path(self.path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only=1")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._opened < self.size
+                if grow:
+                    self._opened += 1
+            if grow:
+                try:
+                    conn = self._open()
+                except Exception:
+                    self._release_slot()
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=POOL_TIMEOUT)
+                except queue.Empty:
+                    raise DatabaseUnavailable("no database connection available")
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            # broken connection (file replaced, schema missing, ...): don't hand it out again
+            conn.close()
+            self._release_slot()
+            raise
+        except BaseException:
+            self._idle.put(conn)
+            raise
+        else:
+            self._idle.put(conn)
+
+    def _release_slot(self):
+        with self._lock:
+            self._opened -= 1
+
+    def fetchall(self, sql, params=()):
+        with self.connection() as conn:
+            return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+    def fetchone(self, sql, params=()):
+        with self.connection() as conn:
+            row = conn.execute(sql, params).fetchone()
+            return dict(row) if row else None
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,394 @@
+# offline load test for the auction commands (no Discord connection needed)
+# Drives the @bot.command callbacks in bot.py with fake ctx/channel/user objects against
+# a throwaway sqlite file, and reports throughput, latency, event-loop lag and SQL counts.
+#
+# Usage:
+#   python3 benchmarks/bench_auction.py                   run every scenario
+#   python3 benchmarks/bench_auction.py -s bid_storm      run one scenario
+#   python3 benchmarks/bench_auction.py --json out.json   also write the results as JSON
+#   python3 benchmarks/bench_auction.py --compare         exit 1 if worse than benchmarks/baseline.json
+#   python3 benchmarks/bench_auction.py --write-baseline  record benchmarks/baseline.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BASELINE_FILE = os.path.join(HERE, "baseline.json")
+sys.path.insert(0, ROOT)
+
+# ---------- FAKES ----------
+class FakePermissions:
+    administrator = True
+
+class FakeGuild:
+    def __init__(self, gid=1):
+        self.id = gid
+
+class FakeUser:
+    def __init__(self, uid, name):
+        self.id = uid
+        self.name = name
+        self.mention = f"<@{uid}>"
+        self.avatar = None
+        self.guild_permissions = FakePermissions()
+        self.dms = 0
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, *args, **kwargs):
+        self.dms += 1
+
+class FakeChannel:
+    def __init__(self, cid):
+        self.id = cid
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+class FakeCtx:
+    def __init__(self, author, channel, guild):
+        self.author = author
+        self.channel = channel
+        self.guild = guild
+        self.last = None   # the command's latest reply
+
+    async def send(self, *args, **kwargs):
+        self.last = args[0] if args else None
+        return await self.channel.send(*args, **kwargs)
+
+# ---------- PROBES ----------
+class StatementCounter:
+    """sqlite trace callback on the writer connection and every read-pool connection."""
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, sql):
+        verb = sql.split(None, 1)[0].upper() if sql.strip() else "?"
+        with self._lock:
+            self.counts[verb] += 1
+
+    def install(self, adb):
+        adb.db.conn.set_trace_callback(self)
+        open_reader = adb._reader_conn
+        def reader_conn():
+            conn = open_reader()
+            conn.set_trace_callback(self)
+            return conn
+        adb._reader_conn = reader_conn
+
+    def take(self):
+        with self._lock:
+            counts, self.counts = dict(self.counts), Counter()
+        return counts
+
+class LoopLagSampler:
+    """How late a short sleep wakes up = how long something else held the event loop."""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def take(self):
+        samples, self.samples = self.samples, []
+        return samples
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+# ---------- HARNESS ----------
+class Harness:
+    def __init__(self, bot_module, concurrency):
+        self.m = bot_module
+        self.concurrency = concurrency
+        self.guild = FakeGuild()
+        self.channel = FakeChannel(1000)
+        self.users = {}
+        self.admin = self.user(1)
+        self.statements = StatementCounter()
+        self.statements.install(self.m.db)
+        self.state = self.m.guilds.get(self.guild.id)   # the one guild every scenario runs in
+        self.lag = LoopLagSampler()
+        # offline: the bot has no gateway cache, so hand it our fakes
+        self.m.bot.get_channel = lambda cid: self.channel if cid == self.channel.id else None
+        self.m.bot.get_user = lambda uid: self.users.get(uid)
+
+    def user(self, uid):
+        if uid not in self.users:
+            self.users[uid] = FakeUser(uid, f"user{uid}")
+        return self.users[uid]
+
+    def ctx(self, author=None):
+        return FakeCtx(author or self.admin, self.channel, self.guild)
+
+    def command(self, name):
+        return self.m.bot.get_command(name).callback
+
+    async def measure(self, calls):
+        """Run the call factories with bounded concurrency; returns the scenario's result dict."""
+        sem = asyncio.Semaphore(self.concurrency)
+        latencies = []
+        async def one(factory):
+            async with sem:
+                start = time.perf_counter()
+                await factory()
+                latencies.append(time.perf_counter() - start)
+        self.statements.take()
+        self.lag.take()
+        start = time.perf_counter()
+        await asyncio.gather(*(one(f) for f in calls))
+        # write-behind work (bids, buffered audit entries) belongs to the scenario that caused it
+        await self.state.engine.flush()
+        await self.m.audit.flush()
+        elapsed = time.perf_counter() - start
+        lag = self.lag.take()
+        statements = self.statements.take()
+        ops = len(latencies)
+        return {
+            "ops": ops,
+            "seconds": round(elapsed, 4),
+            "ops_per_sec": round(ops / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "max_ms": round(max(latencies) * 1000, 3) if latencies else 0.0,
+            "loop_lag_p99_ms": round(percentile(lag, 99) * 1000, 3),
+            "loop_lag_max_ms": round(max(lag) * 1000, 3) if lag else 0.0,
+            "statements": sum(statements.values()),
+            "statements_per_op": round(sum(statements.values()) / ops, 3) if ops else 0.0,
+            "statements_by_verb": statements,
+        }
+
+    # ---------- SCENARIOS ----------
+    async def setup_clubs(self, n, prefix):
+        ids = []
+        for i in range(n):
+            name = f"{prefix}{i}"
+            await self.command("registerclub")(self.ctx(), name, 1000, slogan="")
+            await self.command("startclubauction")(self.ctx(), name)
+            ids.append((await self.m.db.fetchone("SELECT id FROM club WHERE name=?", (name,)))["id"])
+        return ids
+
+    async def bid_storm(self, auctions=50, bidders=200, bids=5000):
+        club_ids = await self.setup_clubs(auctions, "storm")
+        placebid = self.command("placebid")
+        def bid():
+            author = self.user(10_000 + random.randrange(bidders))
+            club_id = random.choice(club_ids)
+            async def call():
+                auction = self.state.engine.get("club", club_id)
+                amount = auction.min_required() + random.randrange(3) if auction else 1100
+                await placebid(self.ctx(author), amount, "club", club_id)
+            return call
+        return await self.measure([bid() for _ in range(bids)])
+
+    async def group_storm(self, groups=20, members=50, bids=1000):
+        creategroup, joingroup = self.command("creategroup"), self.command("joingroup")
+        names = []
+        for g in range(groups):
+            founder = self.user(100_000 + g * members)
+            name = f"group{g}"
+            await creategroup(self.ctx(founder), name, 10 ** 12)
+            for m in range(1, members):
+                await joingroup(self.ctx(self.user(100_000 + g * members + m)), name)
+            names.append((name, founder))
+        club_ids = await self.setup_clubs(10, "groupclub")
+        self.m.notifier.start()
+        groupbid = self.command("groupbid")
+        def bid():
+            name, founder = random.choice(names)
+            club_id = random.choice(club_ids)
+            async def call():
+                auction = self.state.engine.get("club", club_id)
+                amount = auction.min_required() + random.randrange(3) if auction else 1100
+                await groupbid(self.ctx(founder), name, amount, "club", club_id)
+            return call
+        result = await self.measure([bid() for _ in range(bids)])
+        await self.m.notifier.queue.join()
+        result["dms_sent"] = self.m.notifier.sent
+        return result
+
+    async def bid_contention(self, auctions=5, bidders=500, bids=5000, finalize_every=250):
+        """
+        Every bidder reads the current high, yields, then bids the minimum it saw, so most
+        bids race another bid on the same auction; auctions are also finalized mid-storm.
+        Afterwards the persisted bids must match the accepted ones: per auction strictly
+        increasing, none missing. Accepted bids are tallied from the replies, and checked
+        against `bids` plus `bids_archive`, so a bid lost before a finalize counts too.
+        """
+        club_ids = await self.setup_clubs(auctions, "contended")
+        placebid = self.command("placebid")
+        engine = self.state.engine
+        accepted = Counter()   # (item_id, bidder_id, amount) -> bids accepted
+        def bid(n):
+            author = self.user(200_000 + random.randrange(bidders))
+            club_id = random.choice(club_ids)
+            async def call():
+                auction = engine.get("club", club_id)
+                amount = auction.min_required() if auction else 1050
+                await asyncio.sleep(0)   # let the other bidders read the same high
+                ctx = self.ctx(author)
+                await placebid(ctx, amount, "club", club_id)
+                if ctx.last.startswith("✅"):
+                    accepted[(str(club_id), author.id, amount)] += 1
+                if n % finalize_every == finalize_every - 1:
+                    await self.m.finalize_auction(self.state, "club", str(club_id), self.channel.id)
+            return call
+        result = await self.measure([bid(n) for n in range(bids)])
+        items = ",".join("?" * len(club_ids))
+        rows = await self.m.db.fetchall(f"SELECT item_id, amount FROM bids WHERE item_type='club' AND item_id IN ({items}) ORDER BY id",
+                                        [str(c) for c in club_ids])
+        out_of_order, last = 0, {}
+        for r in rows:
+            if r["item_id"] in last and r["amount"] <= last[r["item_id"]]:
+                out_of_order += 1
+            last[r["item_id"]] = r["amount"]
+        persisted = Counter()
+        for table in ("bids", "bids_archive"):
+            for r in await self.m.db.fetchall(f"SELECT item_id, bidder_id, amount FROM {table} WHERE item_type='club' AND item_id IN ({items})",
+                                              [str(c) for c in club_ids]):
+                persisted[(r["item_id"], int(r["bidder_id"]), r["amount"])] += 1
+        result["accepted_bids"] = sum(accepted.values())
+        result["lost_bids"] = sum((accepted - persisted).values())
+        result["phantom_bids"] = sum((persisted - accepted).values())
+        result["out_of_order"] = out_of_order
+        return result
+
+    async def finalize(self):
+        # finalize every auction left open by the previous scenarios
+        keys = list(self.state.engine.auctions)
+        calls = [(lambda k=k: self.m.finalize_auction(self.state, k[0], k[1], self.channel.id)) for k in keys]
+        return await self.measure(calls)
+
+    async def timer_churn(self, keys=500, resets=100_000):
+        # schedule_auction_timer is synchronous; one call per accepted bid
+        schedule = self.m.schedule_auction_timer
+        async def churn():
+            for i in range(resets):
+                schedule(self.state, "club", str(i % keys), self.channel.id)
+        result = await self.measure([churn])
+        result["ops"] = resets
+        result["ops_per_sec"] = round(resets / result["seconds"], 1) if result["seconds"] else 0.0
+        result["pending_deadlines"] = self.state.scheduler.pending
+        for k in range(keys):
+            self.state.scheduler.cancel(("club", str(k)))
+        return result
+
+    async def payroll(self, contracts=20_000, owners=50):
+        # one payroll over `contracts` group-owned contracts, which also opens every duelist's wallet
+        creategroup = self.command("creategroup")
+        for g in range(owners):
+            await creategroup(self.ctx(self.user(300_000 + g)), f"payroll{g}", 10 ** 12)
+        async with self.m.db.transaction() as tx:
+            tx.query("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) "
+                     "INSERT INTO duelists (guild_id, discord_user_id, username, base_price, expected_salary) "
+                     "SELECT ?, 400000 + i, 'payroll' || i, 10, 100 + i % 50 FROM n", (contracts, self.guild.id))
+            tx.query("INSERT INTO duelist_contracts (guild_id, duelist_id, club_owner, owner_type, owner_id, purchase_price, salary, signed_at, misses) "
+                     "SELECT d.guild_id, d.id, g.name, 'group', g.id, 10, d.expected_salary, datetime('now'), d.id % 3 FROM duelists d "
+                     "JOIN (SELECT id, name, ROW_NUMBER() OVER (ORDER BY id) - 1 AS k FROM investor_groups WHERE name LIKE 'payroll%') g "
+                     "ON g.k = d.id % ? WHERE d.username LIKE 'payroll%'", (owners,))
+        payroll = self.command("payroll")
+        result = await self.measure([lambda: payroll(self.ctx(), "run")])
+        paid = await self.m.db.fetchone("SELECT COUNT(*) AS n FROM payroll_lines WHERE status = 'paid'")
+        result["ops"] = paid["n"]
+        result["ops_per_sec"] = round(paid["n"] / result["seconds"], 1) if result["seconds"] else 0.0
+        result["statements_per_op"] = round(result["statements"] / paid["n"], 3) if paid["n"] else 0.0
+        return result
+
+SCENARIOS = ["bid_storm", "group_storm", "finalize", "timer_churn", "bid_contention", "payroll"]
+
+async def run(selected, concurrency):
+    tmp = tempfile.mkdtemp(prefix="auction-bench-")
+    os.environ["AUCTION_DB_FILE"] = os.path.join(tmp, "bench.db")
+    import bot as bot_module
+    bot_module.TIME_LIMIT = 3600   # scenarios finalize explicitly; no timer may fire mid-run
+    await bot_module.db.open()   # the bot opens it in on_ready; the probes need the connection
+    random.seed(1)
+    h = Harness(bot_module, concurrency)
+    lag_task = asyncio.ensure_future(h.lag.run())
+    results = {}
+    try:
+        for name in SCENARIOS:
+            if name in selected:
+                results[name] = await getattr(h, name)()
+    finally:
+        lag_task.cancel()
+    return results
+
+def compare(results, baseline, tolerance):
+    # throughput may not drop, and latency / statements per op may not grow, by more than `tolerance`
+    problems = []
+    for name, base in baseline.get("scenarios", {}).items():
+        cur = results.get(name)
+        if not cur:
+            continue
+        if cur["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            problems.append(f"{name}: ops_per_sec {cur['ops_per_sec']} < baseline {base['ops_per_sec']}")
+        if cur["p99_ms"] > base["p99_ms"] * (1 + tolerance) + 1:
+            problems.append(f"{name}: p99_ms {cur['p99_ms']} > baseline {base['p99_ms']}")
+        if cur["statements_per_op"] > base["statements_per_op"] * (1 + tolerance / 5) + 0.01:
+            problems.append(f"{name}: statements_per_op {cur['statements_per_op']} > baseline {base['statements_per_op']}")
+    # correctness, not speed: any lost / phantom / out-of-order bid fails regardless of the baseline
+    for name, cur in results.items():
+        for field in ("lost_bids", "phantom_bids", "out_of_order"):
+            if cur.get(field):
+                problems.append(f"{name}: {field} {cur[field]}")
+    return problems
+
+def print_table(results):
+    cols = ["ops", "ops_per_sec", "p50_ms", "p99_ms", "loop_lag_p99_ms", "statements_per_op"]
+    print(f"{'scenario':<14}" + "".join(f"{c:>20}" for c in cols))
+    for name, r in results.items():
+        print(f"{name:<14}" + "".join(f"{r[c]:>20}" for c in cols))
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the auction commands")
+    parser.add_argument("-s", "--scenario", action="append", choices=SCENARIOS, help="run only these scenarios")
+    parser.add_argument("-c", "--concurrency", type=int, default=64)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", action="store_true", help="compare against the baseline file")
+    parser.add_argument("--write-baseline", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.scenario or SCENARIOS, args.concurrency))
+    print_table(results)
+    payload = {"concurrency": args.concurrency, "python": sys.version.split()[0], "scenarios": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, sort_keys=True)
+    if args.write_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+    if args.compare:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for p in problems:
+            print("REGRESSION:", p)
+        if problems:
+            sys.exit(1)
+        print("no regressions against baseline")
+
+if __name__ == "__main__":
+    main()
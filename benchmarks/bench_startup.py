@@ -0,0 +1,136 @@
+# cold-start benchmark: what bot.py costs between `python bot.py` and live auction timers
+# Every phase runs in a fresh interpreter, so imports are measured cold, and against a
+# throwaway sqlite file, so nothing touches the real database.
+#
+# Usage:
+#   python3 benchmarks/bench_startup.py                  median of 5 runs per phase
+#   python3 benchmarks/bench_startup.py -r 11 -a 500     more runs, 500 live auctions to restore
+#   python3 benchmarks/bench_startup.py --json out.json  also write the results as JSON
+#   python3 benchmarks/bench_startup.py --importtime     print the 15 slowest imports (python -X importtime)
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# ---------- PHASES ----------
+# each snippet runs in its own interpreter and prints the seconds it measured
+PHASES = {
+    "import discord": """
+import time; t = time.perf_counter()
+import discord
+from discord.ext import commands
+print(time.perf_counter() - t)
+""",
+    "import modules": """
+import time; t = time.perf_counter()
+import modules.db, modules.auction, modules.notify, modules.clubs, modules.history, modules.pagination
+import modules.investors, modules.metrics, modules.events, modules.audit, modules.finance
+print(time.perf_counter() - t)
+""",
+    "import bot": """
+import time; t = time.perf_counter()
+import bot
+print(time.perf_counter() - t)
+""",
+    "db open (new file)": """
+import os, time
+from modules.db import DB
+for suffix in ("", "-wal", "-shm"):
+    if os.path.exists(os.environ["AUCTION_DB_FILE"] + suffix):
+        os.remove(os.environ["AUCTION_DB_FILE"] + suffix)
+t = time.perf_counter()
+DB(os.environ["AUCTION_DB_FILE"], "shared_schema.sql").close()
+print(time.perf_counter() - t)
+""",
+    "db open (migrated)": """
+import os, time
+from modules.db import DB
+t = time.perf_counter()
+DB(os.environ["AUCTION_DB_FILE"], "shared_schema.sql").close()
+print(time.perf_counter() - t)
+""",
+    "restore auctions": """
+import asyncio, time
+import bot
+async def main():
+    await bot.db.open()
+    t = time.perf_counter()
+    await bot.restore_guild(bot.guilds.get(0), await bot.jobs.pending("finalize"))
+    print(time.perf_counter() - t)
+asyncio.run(main())
+""",
+}
+
+SEED = """
+import os
+from modules.db import DB
+db = DB(os.environ["AUCTION_DB_FILE"], "shared_schema.sql")
+with db.transaction():
+    db.conn.executemany("INSERT OR REPLACE INTO live_auctions (item_type, item_id, channel_id, base_price) VALUES ('club', ?, 1000, 100)",
+                        [(str(i),) for i in range({n})])
+    db.conn.executemany("INSERT OR REPLACE INTO jobs (kind, key, due_at) VALUES ('finalize', ?, strftime('%s', 'now') + 30)",
+                        [("club:" + str(i),) for i in range({n})])
+db.close()
+"""
+
+def run_snippet(code, env):
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"exit {out.returncode}")
+    return float(out.stdout.strip().splitlines()[-1])
+
+def importtime(env, top=15):
+    # per-module cumulative import cost of bot.py, slowest first
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import bot"], cwd=ROOT, env=env, capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start cost of bot.py, per phase")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("-a", "--auctions", type=int, default=200, help="live auctions to seed for the restore phase")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="auction-startup-")
+    env = dict(os.environ, AUCTION_DB_FILE=os.path.join(tmp, "startup.db"), PYTHONDONTWRITEBYTECODE="1")
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (ROOT, env.get("PYTHONPATH")) if p)
+    results = {}
+    try:
+        for name, code in PHASES.items():
+            if name == "restore auctions":
+                run_snippet(SEED.replace("{n}", str(args.auctions)) + "print(0)", env)
+            try:
+                samples = [run_snippet(code, env) for _ in range(args.repeat)]
+            except RuntimeError as e:
+                print(f"{name:<22} failed: {e}")
+                continue
+            results[name] = {"median_ms": round(statistics.median(samples) * 1000, 2),
+                             "min_ms": round(min(samples) * 1000, 2), "max_ms": round(max(samples) * 1000, 2)}
+            r = results[name]
+            print(f"{name:<22}{r['median_ms']:>10} ms  (min {r['min_ms']}, max {r['max_ms']})")
+        if args.importtime:
+            print("\nslowest imports (cumulative):")
+            for us, module in importtime(env):
+                print(f"{us / 1000:>10.1f} ms  {module}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"repeat": args.repeat, "auctions": args.auctions, "python": sys.version.split()[0], "phases": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,39 @@
 # bot with duelist register, duelist auction, salary deduction, club balance adjust
-import discord
-import asyncio
-from discord.ext import commands
-from fastapi import FastAPI
-from pymongo import MongoClient
-import uvicorn
-
 # bot.py
 # Full Club Auction Bot (single-file)
-# Dependencies: discord.py, fastapi, uvicorn, jinja2
+# Dependencies: discord.py (+ fastapi, uvicorn, jinja2 for the optional dashboard)
 # Install: pip install discord.py fastapi uvicorn jinja2
 
-import os
-import sqlite3
+import time
+_import_started = time.perf_counter()
+
 import asyncio
+import io
+import os
 import random
+import sqlite3
+import tempfile
 import threading
-from datetime import datetime, timedelta
+from datetime import datetime
+
+import discord
+from discord.ext import commands
+
+from modules.db import DB, VACUUM_INTERVAL, AsyncDB
+from modules.auction import AuctionEngine, DeadlineScheduler, next_min_bid
+from modules.notify import Notifier
+from modules.clubs import MARKET_TICK_INTERVAL, run_market_tick
+from modules.history import archive_bids, build_report, export_archived_bids, rollup_sale, rollup_transfer, REPORT_PERIODS
+from modules.pagination import KeysetPager, send_paginated
+from modules.investors import OWNER_GROUP, OWNER_USER, club_owner, group_owner, owner_from_label, user_owner
+from modules.metrics import BotMetrics
+from modules.events import EventBus, auction_topic
+from modules.audit import AuditLog
+from modules.finance import LEDGER_SNAPSHOT_INTERVAL, PAYROLL_INTERVAL, InsufficientFunds, Ledger, run_payroll
+from modules.guilds import GuildRegistry, GuildState, claim_unpartitioned
+from modules.cache import EntityCache
+from modules.jobs import JobQueue
+from modules.charts import CHART_CACHE_MAX, CHART_RANGES, render_svg, series_query
 
 # ---------- CONFIG ----------
 # Add your Discord token here OR set environment variable DISCORD_TOKEN
@@ -30,6 +47,15 @@ BOT_OWNER_ID = int(os.getenv("BOT_OWNER_ID")) if os.getenv("BOT_OWNER_ID") else
 # Optional: report channel id for weekly auto report
 REPORT_CHANNEL_ID = int(os.getenv("REPORT_CHANNEL_ID")) if os.getenv("REPORT_CHANNEL_ID") else None
 
+# Sharding: by default one process runs every shard (AutoShardedBot picks the count).
+# To spread shards over several processes / cores, start each with the same SHARD_COUNT
+# and its own SHARD_IDS, e.g. SHARD_COUNT=4 SHARD_IDS=0,1 and SHARD_COUNT=4 SHARD_IDS=2,3.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = [int(s) for s in os.getenv("SHARD_IDS").split(",")] if os.getenv("SHARD_IDS") else None
+
+# Optional: when upgrading a single-server install, the guild that inherits its existing clubs, groups and auctions
+LEGACY_GUILD_ID = int(os.getenv("LEGACY_GUILD_ID")) if os.getenv("LEGACY_GUILD_ID") else None
+
 # Enable a small web dashboard (FastAPI). Set to False if you don't want it.
 START_DASHBOARD = False
 DASHBOARD_HOST = "0.0.0.0"
@@ -37,213 +63,311 @@ DASHBOARD_PORT = 8000
 
 # Auction config
 TIME_LIMIT = 30                 # seconds after last bid until finalize
+FINALIZE_RETRY = 10             # seconds before a finalize whose settlement failed runs again
 MIN_INCREMENT_PERCENT = 5      # minimum percent increase per new bid
 LEAVE_PENALTY_PERCENT = 10     # if member leaves group mid-auction (applies to group funds)
 DUELIST_MISS_PENALTY_PERCENT = 15  # salary deduction percent when a duelist misses a match
 
-DB_FILE = "auction.db"
+DB_FILE = os.getenv("AUCTION_DB_FILE") or "auction.db"
 SCHEMA_FILE = "shared_schema.sql"
-
-# ---------- DATABASE HELPER ----------
-class DB:
-    def __init__(self, path=DB_FILE):
-        self.path = path
-        self.conn = sqlite3.connect(self.path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self._ensure_schema()
-
-    def _ensure_schema(self):
-        # If schema file exists in same folder, use that; otherwise create minimal schema
-        if os.path.exists(SCHEMA_FILE):
-            with open(SCHEMA_FILE, "r", encoding="utf-8") as f:
-                schema = f.read()
-        else:
-            schema = """
-BEGIN TRANSACTION;
-CREATE TABLE IF NOT EXISTS investor_groups (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, funds INTEGER DEFAULT 0);
-CREATE TABLE IF NOT EXISTS groups_members (id INTEGER PRIMARY KEY AUTOINCREMENT, group_name TEXT, user_id TEXT);
-CREATE TABLE IF NOT EXISTS personal_wallets (user_id TEXT PRIMARY KEY, balance INTEGER DEFAULT 0);
-CREATE TABLE IF NOT EXISTS user_profiles (user_id TEXT PRIMARY KEY, bio TEXT, banner TEXT, color TEXT, created_at TEXT);
-CREATE TABLE IF NOT EXISTS club (id INTEGER PRIMARY KEY, name TEXT UNIQUE, base_price INTEGER, slogan TEXT, logo TEXT, banner TEXT, value INTEGER, manager_id TEXT);
-CREATE TABLE IF NOT EXISTS club_market_history (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, value INTEGER);
-CREATE TABLE IF NOT EXISTS bids (id INTEGER PRIMARY KEY AUTOINCREMENT, bidder TEXT, amount INTEGER, item_type TEXT, item_id TEXT, timestamp TEXT DEFAULT (datetime('now')));
-CREATE TABLE IF NOT EXISTS club_history (id INTEGER PRIMARY KEY AUTOINCREMENT, winner TEXT, amount INTEGER, timestamp TEXT, market_value_at_sale INTEGER);
-CREATE TABLE IF NOT EXISTS audit_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, entry TEXT, timestamp TEXT DEFAULT (datetime('now')));
-CREATE TABLE IF NOT EXISTS duelists (id INTEGER PRIMARY KEY AUTOINCREMENT, discord_user_id TEXT, username TEXT, avatar_url TEXT, base_price INTEGER, expected_salary INTEGER, registered_at TEXT, owned_by TEXT);
-CREATE TABLE IF NOT EXISTS duelist_contracts (id INTEGER PRIMARY KEY AUTOINCREMENT, duelist_id INTEGER, club_owner TEXT, purchase_price INTEGER, salary INTEGER, signed_at TEXT);
-CREATE TABLE IF NOT EXISTS wallet_transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, amount INTEGER, type TEXT, timestamp TEXT DEFAULT (datetime('now')));
-COMMIT;
-"""
-        self.conn.executescript(schema)
-        self.conn.commit()
-
-    def query(self, sql, params=()):
-        cur = self.conn.cursor()
-        cur.execute(sql, params)
-        self.conn.commit()
-        return cur
-
-    def fetchone(self, sql, params=()):
-        cur = self.conn.cursor()
-        cur.execute(sql, params)
-        return cur.fetchone()
-
-    def fetchall(self, sql, params=()):
-        cur = self.conn.cursor()
-        cur.execute(sql, params)
-        return cur.fetchall()
+GROUP_COMMIT_MS = 5             # writes arriving within this window share one sqlite commit (0 = commit each)
+EVENT_HEARTBEAT = 15            # seconds between keep-alives on idle live-feed connections
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR") or "audit_archive"
 
 # ---------- SETUP ----------
-db = DB(DB_FILE)
+# async sqlite layer (writer thread + read pool); opened on first use or in on_ready
+db = AsyncDB(DB(DB_FILE, SCHEMA_FILE, connect=False), group_commit_ms=GROUP_COMMIT_MS)
 
 # ---------- DISCORD BOT ----------
-import discord
-from discord.ext import commands
-
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-# in-memory timer tracking (single timer simplified; supports multiple auctions if you extend)
-active_timers = {}  # key: (item_type,item_id) -> asyncio.Task
-bidding_frozen = False
+bot = commands.AutoShardedBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+# DMs go out from background workers
+notifier = Notifier(bot)
+
+# club / group / duelist / membership rows (LRU+TTL); writers invalidate
+cache = EntityCache()
+# rendered market charts by (club_id, range); dropped by the market tick
+charts = EntityCache(CHART_CACHE_MAX, MARKET_TICK_INTERVAL)
+# wallets and group funds (append-only ledger)
+ledger = Ledger(db, on_change=lambda account: account[0] == OWNER_GROUP and on_group_funds(int(account[1])))
+# buffered audit log, old segments archived to AUDIT_ARCHIVE_DIR
+audit = AuditLog(db, AUDIT_ARCHIVE_DIR)
+# durable auction deadlines and periodic ticks
+jobs = JobQueue(db, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+auctions_restored = False
+# live auction feed for the dashboard (/events, /ws)
+events = EventBus(snapshot=lambda topics: auction_snapshot(topics))
 
 # ---------- UTIL FUNCTIONS ----------
-def log_audit(entry: str):
-    db.query("INSERT INTO audit_logs (entry) VALUES (?)", (entry,))
+async def log_audit(entry: str):
+    audit.log(entry)
 
-def get_current_bid(item_type=None, item_id=None):
-    if item_type and item_id is not None:
-        row = db.fetchone("SELECT amount FROM bids WHERE item_type=? AND item_id=? ORDER BY id DESC LIMIT 1", (item_type, str(item_id)))
-    else:
-        row = db.fetchone("SELECT amount FROM bids ORDER BY id DESC LIMIT 1")
-    if row:
-        return int(row["amount"])
-    # fallback values
-    if item_type == "club" and item_id is not None:
-        row2 = db.fetchone("SELECT base_price FROM club WHERE id=?", (item_id,))
-        return int(row2["base_price"]) if row2 else 0
-    if item_type == "duelist" and item_id is not None:
-        row2 = db.fetchone("SELECT base_price FROM duelists WHERE id=?", (item_id,))
-        return int(row2["base_price"]) if row2 else 0
-    row2 = db.fetchone("SELECT base_price FROM club WHERE id=1")
-    return int(row2["base_price"]) if row2 else 0
+async def get_base_price(guild_id, item_type, item_id):
+    row = await (get_club(item_id, guild_id) if item_type == "club" else get_duelist(item_id, guild_id))
+    return int(row["base_price"] or 0) if row else None
+
+# ---------- ENTITY LOOKUPS ----------
+# cached by id, names through a cached name -> id index; with guild_id, other guilds' rows are not found
+def _in_guild(row, guild_id):
+    return row if row is not None and (guild_id is None or row["guild_id"] == guild_id) else None
+
+async def get_club(club_id, guild_id=None):
+    row = await cache.get("club", int(club_id), lambda: db.fetchone("SELECT * FROM club WHERE id=?", (club_id,)))
+    return _in_guild(row, guild_id)
+
+async def find_club(guild_id, name):
+    ref = await cache.get("club_name", (guild_id, name),
+                          lambda: db.fetchone("SELECT id FROM club WHERE guild_id=? AND name=?", (guild_id, name)))
+    return await get_club(ref["id"]) if ref else None
+
+async def get_group(group_id):
+    return await cache.get("group", int(group_id), lambda: db.fetchone("SELECT * FROM investor_groups WHERE id=?", (group_id,)))
+
+async def find_group(guild_id, name):
+    name = name.lower()
+    ref = await cache.get("group_name", (guild_id, name),
+                          lambda: db.fetchone("SELECT id FROM investor_groups WHERE guild_id=? AND name=?", (guild_id, name)))
+    return await get_group(ref["id"]) if ref else None
+
+async def get_duelist(duelist_id, guild_id=None):
+    row = await cache.get("duelist", int(duelist_id), lambda: db.fetchone("SELECT * FROM duelists WHERE id=?", (duelist_id,)))
+    return _in_guild(row, guild_id)
+
+async def is_member(guild_id, group_name, user_id):
+    key = (guild_id, group_name.lower(), str(user_id))
+    row = await cache.get("member", key, lambda: db.fetchone(
+        "SELECT 1 AS ok FROM groups_members WHERE guild_id=? AND group_name=? AND user_id=?", key))
+    return row is not None
+
+async def get_auction(state, item_type, item_id, channel_id=None):
+    # the first bid on an item that was never started opens it at base price
+    auction = state.engine.get(item_type, item_id)
+    if auction is None:
+        base = await get_base_price(state.guild_id, item_type, item_id)
+        if base is None:
+            return None
+        auction = state.engine.open(item_type, item_id, base, channel_id)
+    elif channel_id is not None:
+        state.engine.open(item_type, item_id, auction.base_price, channel_id)
+    return auction
+
+async def get_current_bid(state, item_type, item_id):
+    auction = state.engine.get(item_type, item_id)
+    if auction:
+        return auction.current
+    return await get_base_price(state.guild_id, item_type, item_id) or 0
 
 def min_required_bid(current):
-    # integer-safe: round up to nearest integer
-    add = current * MIN_INCREMENT_PERCENT / 100
-    return int(current + max(1, round(add)))  # require at least +1 if percent too small
+    return next_min_bid(current, MIN_INCREMENT_PERCENT)
+
+# ---------- LIVE FEED ----------
+def auction_event(kind, auction, guild_id):
+    # deadlines are monotonic loop times; viewers get unix timestamps
+    deadline = time.time() + auction.deadline - time.monotonic() if auction.deadline is not None else None
+    return {"type": kind, "guild_id": guild_id, "item_type": auction.item_type, "item_id": auction.item_id,
+            "base_price": auction.base_price, "high_bid": auction.high_bid, "bidder": auction.bidder,
+            "bidder_type": auction.bidder_type, "bidder_id": auction.bidder_id,
+            "min_required": auction.min_required(), "bid_count": auction.bid_count, "deadline": deadline}
+
+def publish_auction(state, kind, auction):
+    if events.active:
+        events.publish(auction_topic(auction.item_type, auction.item_id), auction_event(kind, auction, state.guild_id))
+
+def auction_snapshot(topics):
+    # requested auctions (None = all)
+    snapshot = []
+    for state in guilds.values():
+        for auction in list(state.engine.auctions.values()):
+            topic = auction_topic(auction.item_type, auction.item_id)
+            if topics is None or topic in topics:
+                snapshot.append(dict(auction_event("snapshot", auction, state.guild_id), topic=topic))
+    return snapshot
 
 # ---------- BACKGROUND: MARKET SIMULATION & WEEKLY REPORT ----------
-async def market_simulation_task():
-    while True:
-        await asyncio.sleep(3600)  # hourly
-        club = db.fetchone("SELECT * FROM club WHERE id=1")
-        if not club:
-            continue
-        base = int(club["value"] or club["base_price"])
-        bid_count = len(db.fetchall('SELECT id FROM bids WHERE item_type="club"'))
-        bid_factor = max(0, bid_count - 1) * 0.001
-        change = random.uniform(-0.03, 0.03) + bid_factor
-        new_value = int(max(100, base * (1 + change)))
-        db.query("UPDATE club SET value=? WHERE id=1", (new_value,))
-        db.query("INSERT INTO club_market_history (timestamp, value) VALUES (?,?)", (datetime.now().isoformat(), new_value))
-        log_audit(f"Market updated to {new_value}")
-
-async def weekly_report_scheduler():
-    while True:
-        await asyncio.sleep(7 * 24 * 3600)
-        report = generate_weekly_report()
-        log_audit("Weekly report generated")
-        if REPORT_CHANNEL_ID:
-            ch = bot.get_channel(REPORT_CHANNEL_ID)
-            if ch:
-                await ch.send(report)
-
-def generate_weekly_report():
-    now = datetime.now()
-    weekago = now - timedelta(days=7)
-    rows = db.fetchall("SELECT * FROM club_history WHERE timestamp>?", (weekago.isoformat(),))
-    total_sales = len(rows)
-    total_volume = sum([r["amount"] for r in rows]) if rows else 0
-    group_profits = {}
-    for r in rows:
-        w = r["winner"]
-        if "(group)" in str(w):
-            g = str(w).replace(" (group)", "")
-            group_profits[g] = group_profits.get(g, 0) + r["amount"]
-    top = sorted(group_profits.items(), key=lambda x: x[1], reverse=True)[:5]
-    report = f"📈 Weekly Report\nTotal Sales: {total_sales}\nVolume: {total_volume}\nTop Groups: {top}\nGenerated: {now}"
-    return report
+# recurring jobs (see on_ready / new_guild_state)
+async def market_tick(state, ticks=1, due=None):
+    # hourly per guild
+    for club_id in await run_market_tick(db, state.guild_id, state.engine.bid_counts("club"), ticks, due):
+        cache.invalidate("club", club_id)
+        for chart_range in CHART_RANGES:
+            charts.invalidate("chart", (club_id, chart_range))
+
+async def market_tick_job(job):
+    await market_tick(guilds.get(job["guild_id"]), job["ticks"], job["due_at"])
+
+async def weekly_report_job(job):
+    # for the report channel's guild
+    ch = bot.get_channel(REPORT_CHANNEL_ID) if REPORT_CHANNEL_ID else None
+    if ch:
+        report = await generate_weekly_report(ch.guild.id)
+        await log_audit("Weekly report generated")
+        await ch.send(report)
+
+async def audit_maintenance_job(job):
+    await audit.archive()
+
+async def ledger_snapshot_job(job):
+    await ledger.snapshot()
+
+async def db_vacuum_job(job):
+    # incremental; older files need !enableautovacuum first
+    result = await db.vacuum()
+    if result:
+        _vacuum_pages.inc(amount=result[0])
+        _free_pages.set(result[1])
+
+async def payroll_job(job):
+    summary = await run_payroll(ledger, job["guild_id"], job["ticks"], DUELIST_MISS_PENALTY_PERCENT)
+    await log_audit(payroll_line(job["guild_id"], summary))
+
+def payroll_line(guild_id, summary):
+    unpaid = summary["contracts"] - summary["paid"]
+    return (f"Payroll for guild {guild_id}" + (f" ({summary['periods']} periods)" if summary["periods"] > 1 else "") +
+            f": {summary['paid']} contracts paid, {summary['net']} total ({summary['penalty']} in miss penalties)" +
+            (f", {unpaid} unpaid" if unpaid else ""))
+
+jobs.register("market_tick", market_tick_job)
+jobs.register("weekly_report", weekly_report_job)
+jobs.register("audit_maintenance", audit_maintenance_job)
+jobs.register("ledger_snapshot", ledger_snapshot_job)
+jobs.register("db_vacuum", db_vacuum_job)
+jobs.register("payroll", payroll_job)
+
+async def generate_weekly_report(guild_id):
+    return await build_report(db, guild_id, "week")
 
 # ---------- TIMER / AUCTION FINALIZER ----------
-async def finalize_auction(item_type: str, item_id: str, channel_id: int):
+async def finalize_auction(state, item_type: str, item_id: str, channel_id: int):
     # This runs after TIME_LIMIT seconds with no new bids
-    winner = db.fetchone("SELECT bidder, amount FROM bids WHERE item_type=? AND item_id=? ORDER BY id DESC LIMIT 1", (item_type, str(item_id)))
+    async with state.engine.lock(item_type, item_id):
+        try:
+            auction, announce = await close_auction(state, item_type, item_id)
+        except Exception:
+            # still live: try again later
+            schedule_auction_timer(state, item_type, item_id, channel_id, delay=FINALIZE_RETRY)
+            raise
+    events.publish(auction_topic(item_type, item_id), {
+        "type": "finalize", "guild_id": state.guild_id, "item_type": item_type, "item_id": str(item_id),
+        "winner": auction.bidder if auction else None, "winner_type": auction.bidder_type if auction else None,
+        "winner_id": auction.bidder_id if auction else None, "amount": auction.high_bid if auction else None})
     channel = bot.get_channel(channel_id)
-    if winner:
-        bidder_str = winner["bidder"]
-        amount = int(winner["amount"])
-        if item_type == "club":
-            db.query("INSERT INTO club_history (winner, amount, timestamp, market_value_at_sale) VALUES (?,?,datetime('now'),?)",
-                     (bidder_str, amount, (db.fetchone("SELECT value FROM club WHERE id=1")["value"] if db.fetchone("SELECT value FROM club WHERE id=1") else None)))
+    if channel and announce:
+        await channel.send(announce)
+
+async def close_auction(state, item_type, item_id):
+    # persist the outcome, then close; returns (auction, announcement)
+    auction = state.engine.get(item_type, item_id)
+    await state.engine.flush()
+    guild_id = state.guild_id
+    async with db.transaction() as tx:
+        if auction and auction.bidder is not None:
+            bidder_str = auction.bidder
+            owner_type, owner_id = auction.bidder_type, auction.bidder_id
+            amount = auction.high_bid
             # if group, deduct funds
-            if "(group)" in bidder_str:
-                gname = bidder_str.replace(" (group)", "").lower()
-                g = db.fetchone("SELECT funds FROM investor_groups WHERE name=?", (gname,))
+            g = None
+            if owner_type == OWNER_GROUP and owner_id is not None:
+                g = await get_group(owner_id)
+            if item_type == "club":
+                club = await get_club(item_id)
+                tx.query("INSERT INTO club_history (guild_id, club_id, winner, winner_type, winner_id, amount, timestamp, market_value_at_sale) VALUES (?,?,?,?,?,?,datetime('now'),?)",
+                         (guild_id, item_id, bidder_str, owner_type, owner_id, amount, club["value"] if club else None))
                 if g:
-                    newfunds = max(0, g["funds"] - amount)
-                    db.query("UPDATE investor_groups SET funds=? WHERE name=?", (newfunds, gname))
-                    log_audit(f"Deducted {amount} from group {gname} after winning club")
-            if channel:
-                await channel.send(f"🏁 Auction ended for club {item_id}. Winner: **{bidder_str}** for **{amount}**.")
-            log_audit(f"Auction ended for club {item_id}. Winner: {bidder_str} for {amount}")
-        else:  # duelist
-            duelist = db.fetchone("SELECT * FROM duelists WHERE id=?", (item_id,))
-            if duelist:
-                # sign contract: purchase_price=amount, salary = expected_salary (negotiation not implemented in this version)
-                salary = duelist["expected_salary"]
-                db.query("INSERT INTO duelist_contracts (duelist_id, club_owner, purchase_price, salary, signed_at) VALUES (?,?,?,?,datetime('now'))",
-                         (item_id, bidder_str, amount, salary))
-                db.query("UPDATE duelists SET owned_by=? WHERE id=?", (bidder_str, item_id))
-                # if group, deduct funds
-                if "(group)" in bidder_str:
-                    gname = bidder_str.replace(" (group)", "").lower()
-                    g = db.fetchone("SELECT funds FROM investor_groups WHERE name=?", (gname,))
+                    ledger.post(tx, (OWNER_GROUP, g["id"]), -amount, "auction_win", f"club {item_id}", clamp=True)
+                    tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"Deducted {amount} from group {g['name']} after winning club",))
+                rollup_sale(tx, guild_id, "club", (owner_type, owner_id, bidder_str), amount)
+                tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"Auction ended for club {item_id}. Winner: {bidder_str} for {amount}",))
+                announce = f"🏁 Auction ended for club {item_id}. Winner: **{bidder_str}** for **{amount}**."
+            else:  # duelist
+                duelist = await get_duelist(item_id)
+                if duelist:
+                    # sign contract: purchase_price=amount, salary = expected_salary (negotiation not implemented in this version)
+                    salary = duelist["expected_salary"]
+                    tx.query("INSERT INTO duelist_contracts (guild_id, duelist_id, club_owner, owner_type, owner_id, purchase_price, salary, signed_at) VALUES (?,?,?,?,?,?,?,datetime('now'))",
+                             (guild_id, item_id, bidder_str, owner_type, owner_id, amount, salary))
+                    tx.query("UPDATE duelists SET owned_by=?, owner_type=?, owner_id=? WHERE id=?", (bidder_str, owner_type, owner_id, item_id))
+                    tx.on_commit(lambda: cache.invalidate("duelist", int(item_id)))
                     if g:
-                        newfunds = max(0, g["funds"] - amount)
-                        db.query("UPDATE investor_groups SET funds=? WHERE name=?", (newfunds, gname))
-                        log_audit(f"Deducted {amount} from group {gname} after signing duelist")
-                if channel:
-                    await channel.send(f"🏁 Duelist auction ended. {duelist['username']} signed to **{bidder_str}** for **{amount}**. Salary: {salary}")
-                log_audit(f"Duelist {duelist['username']} signed to {bidder_str} for {amount}")
-    else:
-        if channel:
-            await channel.send("Auction ended with no bids.")
-    # cleanup bids for item
-    db.query("DELETE FROM bids WHERE item_type=? AND item_id=?", (item_type, str(item_id)))
-    # remove active timer entry
-    active_timers.pop((item_type, str(item_id)), None)
-
-def schedule_auction_timer(item_type: str, item_id: str, channel_id: int):
-    # cancel existing
-    key = (item_type, str(item_id))
-    task = active_timers.get(key)
-    if task and not task.done():
-        task.cancel()
-    # schedule new timer
-    loop = asyncio.get_event_loop()
-    t = loop.create_task(asyncio.sleep(TIME_LIMIT))
-    async def wrapper():
-        try:
-            await t
-            await finalize_auction(item_type, item_id, channel_id)
-        except asyncio.CancelledError:
-            return
-    task2 = loop.create_task(wrapper())
-    active_timers[key] = task2
+                        ledger.post(tx, (OWNER_GROUP, g["id"]), -amount, "auction_win", f"duelist {item_id}", clamp=True)
+                        tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"Deducted {amount} from group {g['name']} after signing duelist",))
+                    rollup_sale(tx, guild_id, "duelist", (owner_type, owner_id, bidder_str), amount)
+                    tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"Duelist {duelist['username']} signed to {bidder_str} for {amount}",))
+                    announce = f"🏁 Duelist auction ended. {duelist['username']} signed to **{bidder_str}** for **{amount}**. Salary: {salary}"
+                else:
+                    announce = None
+        else:
+            announce = "Auction ended with no bids."
+        # archive bids for item
+        archive_bids(tx, "finalized", "item_type=? AND item_id=?", (item_type, str(item_id)))
+        tx.query("DELETE FROM proxy_bids WHERE item_type=? AND item_id=?", (item_type, str(item_id)))
+        tx.query("DELETE FROM live_auctions WHERE item_type=? AND item_id=?", (item_type, str(item_id)))
+        jobs.cancel("finalize", auction_job_key(item_type, item_id), tx)
+    state.engine.close(item_type, item_id)
+    return auction, announce
+
+# ---------- GUILDS ----------
+def new_guild_state(guild_id):
+    """
+    One guild's engine, deadline scheduler, market tick and payroll
+    """
+    async def on_auction_deadline(key, channel_id):
+        await finalize_auction(state, key[0], key[1], channel_id)
+    engine = AuctionEngine(db, MIN_INCREMENT_PERCENT, audit_log=audit.log, guild_id=guild_id)
+    state = GuildState(guild_id, engine, DeadlineScheduler(on_auction_deadline))
+    # first tick at a random point in the interval
+    jobs.ensure("market_tick", guild_id, MARKET_TICK_INTERVAL, guild_id=guild_id, first_in=random.uniform(0, MARKET_TICK_INTERVAL))
+    jobs.ensure("payroll", guild_id, PAYROLL_INTERVAL, guild_id=guild_id)
+    return state
+
+# created on a guild's first command (or at startup)
+guilds = GuildRegistry(new_guild_state)
+
+@bot.check
+async def guild_only(ctx):
+    return ctx.guild is not None
+
+# ---------- METRICS ----------
+# served on the dashboard at /metrics
+metrics = BotMetrics()
+db.db.on_statement = metrics.on_statement
+db.on_statements = metrics.on_statements
+metrics.registry.gauge("guilds_loaded", "Guilds with auction state in this process.", lambda: len(guilds))
+metrics.registry.gauge("auctions_live", "Auctions open in the engine.", lambda: sum(len(s.engine.auctions) for s in guilds.values()))
+metrics.registry.gauge("auction_timers_pending", "Auction deadlines waiting to fire.", lambda: sum(s.scheduler.pending for s in guilds.values()))
+metrics.registry.gauge("notify_queue_depth", "Users waiting for a DM.", lambda: notifier.queue.qsize())
+metrics.registry.gauge("live_feed_subscribers", "Viewers connected to the live auction feed.", lambda: events.subscribers)
+metrics.registry.gauge("live_feed_dropped", "Live feed viewers dropped for falling behind.", lambda: events.dropped)
+metrics.registry.gauge("entity_cache_entries", "Club/group/duelist/membership rows held in the entity cache.", lambda: len(cache))
+_cache_lookups = metrics.registry.counter("entity_cache_lookups_total", "Entity cache lookups by kind and result.", ("kind", "result"))
+cache.on_lookup = lambda kind, result: _cache_lookups.inc(kind, result)
+charts.on_lookup = cache.on_lookup
+_job_runs = metrics.registry.counter("jobs_run_total", "Durable jobs run by kind and result.", ("kind", "result"))
+jobs.on_run = lambda kind, result: _job_runs.inc(kind, result)
+_vacuum_pages = metrics.registry.counter("db_vacuum_pages_total", "Free pages handed back to the filesystem by the vacuum job.")
+_free_pages = metrics.registry.gauge("db_free_pages", "Free pages left in the database file after the last vacuum job.")
+
+@bot.before_invoke
+async def metrics_before_invoke(ctx):
+    metrics.command_started(ctx)
+
+@bot.after_invoke
+async def metrics_after_invoke(ctx):
+    metrics.command_finished(ctx)
+
+def auction_job_key(item_type, item_id):
+    return f"{item_type}:{item_id}"
+
+def schedule_auction_timer(state, item_type: str, item_id: str, channel_id: int, delay=TIME_LIMIT):
+    # (re)arm the deadline; the finalize job row survives a restart
+    deadline = state.scheduler.schedule((item_type, str(item_id)), delay, channel_id)
+    jobs.defer("finalize", auction_job_key(item_type, item_id), time.time() + delay, channel_id, guild_id=state.guild_id)
+    auction = state.engine.get(item_type, item_id)
+    if auction:
+        auction.deadline = deadline
+        publish_auction(state, "extend", auction)
 
 # ---------- DISCORD COMMANDS ----------
 @bot.command()
@@ -253,22 +377,24 @@ async def registerclub(ctx, name: str, base_price: int, *, slogan: str = ""):
     Admin command: register a club
     !registerclub <name> <base_price> [slogan]
     """
-    if db.fetchone("SELECT * FROM club WHERE name=?", (name,)):
+    gid = ctx.guild.id
+    if await find_club(gid, name):
         return await ctx.send("Club already registered.")
-    db.query("INSERT INTO club (name, base_price, slogan, value) VALUES (?,?,?,?)", (name, base_price, slogan, base_price))
-    db.query("INSERT INTO club_market_history (timestamp,value) VALUES (?,?)", (datetime.now().isoformat(), base_price))
+    async with db.transaction() as tx:
+        tx.on_commit(lambda: cache.invalidate("club_name", (gid, name)))
+        tx.query("INSERT INTO club (guild_id, name, base_price, slogan, value) VALUES (?,?,?,?,?)", (gid, name, base_price, slogan, base_price))
+        tx.query("INSERT INTO club_market_history (club_id, timestamp, value) VALUES ((SELECT id FROM club WHERE guild_id=? AND name=?),?,?)",
+                 (gid, name, datetime.now().isoformat(), base_price))
     await ctx.send(f"Club **{name}** registered with base price {base_price}.")
-    log_audit(f"{ctx.author} registered club {name} (base {base_price})")
+    await log_audit(f"{ctx.author} registered club {name} (base {base_price})")
 
 @bot.command()
 async def listclubs(ctx):
-    rows = db.fetchall("SELECT id,name,base_price,value FROM club")
-    if not rows:
-        return await ctx.send("No clubs registered.")
-    msg = "📋 Registered Clubs:\n"
-    for r in rows:
-        msg += f"- {r['id']}: {r['name']} | base {r['base_price']} | value {r['value']}\n"
-    await ctx.send(msg)
+    pager = KeysetPager(db, f"clubs:{ctx.guild.id}", "📋 Registered Clubs:",
+                        "SELECT id,name,base_price,value FROM club WHERE guild_id=? AND {where} ORDER BY id {order} LIMIT ?", (ctx.guild.id,),
+                        lambda r: f"- {r['id']}: {r['name']} | base {r['base_price']} | value {r['value']}")
+    if not await send_paginated(ctx, pager):
+        await ctx.send("No clubs registered.")
 
 @bot.command()
 @commands.has_permissions(administrator=True)
@@ -276,30 +402,56 @@ async def startclubauction(ctx, club_name: str):
     """
     Admin command: start auction for a registered club by name
     """
-    club = db.fetchone("SELECT * FROM club WHERE name=?", (club_name,))
+    state = guilds.get(ctx.guild.id)
+    club = await find_club(state.guild_id, club_name)
     if not club:
         return await ctx.send("No such registered club.")
-    # clear bids for this club and announce
-    db.query("DELETE FROM bids WHERE item_type='club' AND item_id=?", (str(club["id"]),))
+    # archive bids for this club and announce
+    async with state.engine.lock("club", club["id"]):
+        await state.engine.flush()
+        async with db.transaction() as tx:
+            archive_bids(tx, "restarted", "item_type='club' AND item_id=?", (str(club["id"]),))
+        state.engine.open("club", club["id"], club["base_price"], ctx.channel.id, reset=True)
     await ctx.send(f"🔔 Auction started for club **{club_name}**! Starting price: {club['base_price']}\nUse `!placebid <amount> club {club['id']}` to bid.")
-    log_audit(f"{ctx.author} started auction for club {club_name}")
-    schedule_auction_timer("club", str(club["id"]), ctx.channel.id)
+    await log_audit(f"{ctx.author} started auction for club {club_name}")
+    schedule_auction_timer(state, "club", str(club["id"]), ctx.channel.id)
 
 @bot.command()
 async def clubinfo(ctx, club_id: int = None):
+    state = guilds.get(ctx.guild.id)
     if club_id is None:
-        row = db.fetchone("SELECT * FROM club WHERE id=1")
+        row = await db.fetchone("SELECT * FROM club WHERE guild_id=? ORDER BY id LIMIT 1", (state.guild_id,))
     else:
-        row = db.fetchone("SELECT * FROM club WHERE id=?", (club_id,))
+        row = await get_club(club_id, state.guild_id)
     if not row:
         return await ctx.send("No such club.")
-    current = get_current_bid("club", row["id"])
+    current = await get_current_bid(state, "club", row["id"])
     embed = discord.Embed(title=f"{row['name']}", description=row["slogan"] or "")
     embed.add_field(name="Base price", value=str(row["base_price"]))
     embed.add_field(name="Current bid", value=str(current))
     embed.add_field(name="Market value", value=str(row["value"]))
     await ctx.send(embed=embed)
 
+@bot.command()
+async def marketchart(ctx, club_name: str, chart_range: str = "month"):
+    """
+    Market value chart of a club
+    !marketchart <club_name> [day|week|month|year|all]
+    """
+    if chart_range not in CHART_RANGES:
+        return await ctx.send("range must be one of: " + ", ".join(CHART_RANGES))
+    club = await find_club(ctx.guild.id, club_name)
+    if not club:
+        return await ctx.send("No such club.")
+    async def render():
+        sql, params = series_query(club["id"], chart_range)
+        points = await db.fetchall(sql, params)
+        return render_svg(f"{club['name']} market value ({chart_range})", points).encode() if points else None
+    svg = await charts.get("chart", (club["id"], chart_range), render)
+    if svg is None:
+        return await ctx.send("No market history for this club yet.")
+    await ctx.send(file=discord.File(io.BytesIO(svg), filename=f"{club['name']}-{chart_range}.svg"))
+
 # Duelist registration & auction
 @bot.command()
 async def registerduelist(ctx, username: str, base_price: int, expected_salary: int):
@@ -308,180 +460,286 @@ async def registerduelist(ctx, username: str, base_price: int, expected_salary:
     !registerduelist <username> <base_price> <expected_salary>
     """
     avatar = ctx.author.avatar.url if ctx.author.avatar else ""
-    db.query("INSERT INTO duelists (discord_user_id, username, avatar_url, base_price, expected_salary, registered_at) VALUES (?,?,?,?,?,?)",
-             (str(ctx.author.id), username, avatar, base_price, expected_salary, datetime.now().isoformat()))
-    d = db.fetchone("SELECT id FROM duelists WHERE discord_user_id=? ORDER BY id DESC", (str(ctx.author.id),))
+    await db.query("INSERT INTO duelists (guild_id, discord_user_id, username, avatar_url, base_price, expected_salary, registered_at) VALUES (?,?,?,?,?,?,?)",
+             (ctx.guild.id, str(ctx.author.id), username, avatar, base_price, expected_salary, datetime.now().isoformat()))
+    d = await db.fetchone("SELECT id FROM duelists WHERE discord_user_id=? ORDER BY id DESC", (str(ctx.author.id),))
+    cache.invalidate("duelist", d["id"])
     await ctx.send(f"Duelist **{username}** registered with ID **{d['id']}** (base {base_price}, salary {expected_salary}).")
-    log_audit(f"{ctx.author} registered duelist {username} id={d['id']}")
+    await log_audit(f"{ctx.author} registered duelist {username} id={d['id']}")
 
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def startduelistauction(ctx, duelist_id: int):
-    d = db.fetchone("SELECT * FROM duelists WHERE id=?", (duelist_id,))
+    state = guilds.get(ctx.guild.id)
+    d = await get_duelist(duelist_id, state.guild_id)
     if not d:
         return await ctx.send("No such duelist ID.")
-    db.query("DELETE FROM bids WHERE item_type='duelist' AND item_id=?", (str(duelist_id),))
+    async with state.engine.lock("duelist", duelist_id):
+        await state.engine.flush()
+        async with db.transaction() as tx:
+            archive_bids(tx, "restarted", "item_type='duelist' AND item_id=?", (str(duelist_id),))
+        state.engine.open("duelist", duelist_id, d["base_price"], ctx.channel.id, reset=True)
     await ctx.send(f"🔔 Auction started for duelist **{d['username']}** (ID {duelist_id}). Base price: {d['base_price']}\nUse `!placebid <amount> duelist {duelist_id}` to bid.")
-    log_audit(f"{ctx.author} started duelist auction id={duelist_id}")
-    schedule_auction_timer("duelist", str(duelist_id), ctx.channel.id)
+    await log_audit(f"{ctx.author} started duelist auction id={duelist_id}")
+    schedule_auction_timer(state, "duelist", str(duelist_id), ctx.channel.id)
 
 @bot.command()
 async def listduelists(ctx):
-    rows = db.fetchall("SELECT id, username, base_price, expected_salary, owned_by FROM duelists")
-    if not rows:
-        return await ctx.send("No duelists registered.")
-    msg = "📜 Duelists:\n"
-    for r in rows:
-        owned = r["owned_by"] or "Free Agent"
-        msg += f"- ID {r['id']}: {r['username']} | base {r['base_price']} | salary {r['expected_salary']} | {owned}\n"
-    await ctx.send(msg)
+    pager = KeysetPager(db, f"duelists:{ctx.guild.id}", "📜 Duelists:",
+                        "SELECT id, username, base_price, expected_salary, owned_by FROM duelists WHERE guild_id=? AND {where} ORDER BY id {order} LIMIT ?", (ctx.guild.id,),
+                        lambda r: f"- ID {r['id']}: {r['username']} | base {r['base_price']} | salary {r['expected_salary']} | {r['owned_by'] or 'Free Agent'}")
+    if not await send_paginated(ctx, pager):
+        await ctx.send("No duelists registered.")
 
 # Generic bidding commands (personal and group)
 @bot.command()
 async def placebid(ctx, amount: int, item_type: str = "club", item_id: int = None):
-    if bidding_frozen:
+    state = guilds.get(ctx.guild.id)
+    if state.frozen:
         return await ctx.send("Bidding is currently frozen by an admin.")
     if item_type not in ("club", "duelist"):
         return await ctx.send("item_type must be 'club' or 'duelist'.")
     if item_id is None:
         return await ctx.send("Provide the item_id (club id or duelist id).")
     # check min
-    current = get_current_bid(item_type, str(item_id))
-    min_req = min_required_bid(current)
-    if amount < min_req:
-        return await ctx.send(f"Minimum required bid is {min_req} (current {current}, +{MIN_INCREMENT_PERCENT}%).")
-    db.query("INSERT INTO bids (bidder, amount, item_type, item_id) VALUES (?, ?, ?, ?)", (str(ctx.author), amount, item_type, str(item_id)))
-    db.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"{ctx.author} bid {amount} on {item_type} {item_id}",))
-    await ctx.send(f"✅ New bid of **{amount}** on {item_type} {item_id} by {ctx.author.mention}")
-    schedule_auction_timer(item_type, str(item_id), ctx.channel.id)
+    async with state.engine.lock(item_type, item_id):
+        if await get_auction(state, item_type, str(item_id), ctx.channel.id) is None:
+            return await ctx.send(f"No such {item_type} in this server.")
+        accepted, auction = state.engine.place(item_type, str(item_id), user_owner(ctx.author), amount,
+                                               audit=f"{ctx.author} bid {amount} on {item_type} {item_id}")
+    if not accepted:
+        return await ctx.send(f"Minimum required bid is {auction.min_required()} (current {auction.current}, +{MIN_INCREMENT_PERCENT}%).")
+    publish_auction(state, "bid", auction)
+    if auction.leader == (OWNER_USER, ctx.author.id):
+        await ctx.send(f"✅ New bid of **{amount}** on {item_type} {item_id} by {ctx.author.mention}")
+    else:
+        await ctx.send(f"✅ Bid of **{amount}** on {item_type} {item_id} by {ctx.author.mention} was answered by a max bid: "
+                       f"**{auction.bidder}** leads at **{auction.high_bid}**")
+    schedule_auction_timer(state, item_type, str(item_id), ctx.channel.id)
+
+def on_group_funds(group_id):
+    cache.invalidate("group", group_id)
+    asyncio.ensure_future(cap_group_proxies(group_id))
+
+async def cap_group_proxies(group_id):
+    g = await get_group(group_id)
+    state = guilds.find(g["guild_id"]) if g else None
+    if state is not None:
+        state.engine.cap_proxies((OWNER_GROUP, group_id), g["funds"])
+
+async def register_proxy(ctx, state, owner, max_amount, item_type, item_id):
+    # shared by !proxybid and !groupproxy
+    if state.frozen:
+        return await ctx.send("Bidding is currently frozen.")
+    if item_type not in ("club", "duelist"):
+        return await ctx.send("item_type must be 'club' or 'duelist'.")
+    if item_id is None:
+        return await ctx.send("Provide the item_id.")
+    async with state.engine.lock(item_type, item_id):
+        if await get_auction(state, item_type, str(item_id), ctx.channel.id) is None:
+            return await ctx.send(f"No such {item_type} in this server.")
+        before = state.engine.get(item_type, item_id).high_bid
+        accepted, auction = state.engine.set_proxy(item_type, str(item_id), owner, max_amount)
+    if not accepted:
+        return await ctx.send(f"A max bid must be at least {auction.min_required()} (or above your own standing bid).")
+    await log_audit(f"{ctx.author} set a max bid of {max_amount} for {owner[2]} on {item_type} {item_id}")
+    if auction.high_bid != before:
+        publish_auction(state, "bid", auction)
+        schedule_auction_timer(state, item_type, str(item_id), ctx.channel.id)
+    await ctx.send(f"🤖 Max bid of **{max_amount}** registered for **{owner[2]}** on {item_type} {item_id}. "
+                   f"**{auction.bidder}** leads at **{auction.high_bid}**.")
+
+@bot.command()
+async def proxybid(ctx, max_amount: int, item_type: str = "club", item_id: int = None):
+    """
+    Bid automatically up to a hidden maximum
+    !proxybid <max> <item_type> <item_id>
+    """
+    await register_proxy(ctx, guilds.get(ctx.guild.id), user_owner(ctx.author), max_amount, item_type, item_id)
+
+@bot.command()
+async def groupproxy(ctx, group_name: str, max_amount: int, item_type: str = "club", item_id: int = None):
+    state = guilds.get(ctx.guild.id)
+    g = await find_group(state.guild_id, group_name)
+    if not g:
+        return await ctx.send("No such group.")
+    if not await is_member(state.guild_id, group_name, ctx.author.id):
+        return await ctx.send("You are not in that group.")
+    if max_amount > g["funds"]:
+        await ctx.send(f"Max bid capped at the group's funds ({g['funds']}).")
+        max_amount = g["funds"]
+    await register_proxy(ctx, state, group_owner(g), max_amount, item_type, item_id)
+
+@bot.command()
+async def cancelproxy(ctx, item_type: str, item_id: int, group_name: str = None):
+    state = guilds.get(ctx.guild.id)
+    owner = (OWNER_USER, ctx.author.id)
+    if group_name:
+        g = await find_group(state.guild_id, group_name)
+        if not g or not await is_member(state.guild_id, group_name, ctx.author.id):
+            return await ctx.send("You are not in that group.")
+        owner = (OWNER_GROUP, g["id"])
+    async with state.engine.lock(item_type, item_id):
+        cancelled = state.engine.cancel_proxy(item_type, str(item_id), owner)
+    await ctx.send("Max bid withdrawn." if cancelled else "No max bid to withdraw on that item.")
 
 @bot.command()
 async def groupbid(ctx, group_name: str, amount: int, item_type: str = "club", item_id: int = None):
-    if bidding_frozen:
+    state = guilds.get(ctx.guild.id)
+    if state.frozen:
         return await ctx.send("Bidding is currently frozen.")
     if item_type not in ("club", "duelist"):
         return await ctx.send("item_type must be 'club' or 'duelist'.")
     if item_id is None:
         return await ctx.send("Provide the item_id.")
-    g = db.fetchone("SELECT * FROM investor_groups WHERE name=?", (group_name.lower(),))
+    g = await find_group(state.guild_id, group_name)
     if not g:
         return await ctx.send("No such group.")
-    mem = db.fetchone("SELECT * FROM groups_members WHERE group_name=? AND user_id=?", (group_name.lower(), str(ctx.author.id)))
-    if not mem:
+    if not await is_member(state.guild_id, group_name, ctx.author.id):
         return await ctx.send("You are not in that group.")
     if amount > g["funds"]:
         return await ctx.send(f"Group lacks funds (available {g['funds']}).")
-    current = get_current_bid(item_type, str(item_id))
-    min_req = min_required_bid(current)
-    if amount < min_req:
-        return await ctx.send(f"Minimum required bid is {min_req}.")
-    db.query("INSERT INTO bids (bidder, amount, item_type, item_id) VALUES (?, ?, ?, ?)", (group_name.lower() + " (group)", amount, item_type, str(item_id)))
-    db.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"Group {group_name} bid {amount} on {item_type} {item_id}",))
-    await ctx.send(f"✅ Group **{group_name}** placed a bid of **{amount}** on {item_type} {item_id}.")
+    async with state.engine.lock(item_type, item_id):
+        if await get_auction(state, item_type, str(item_id), ctx.channel.id) is None:
+            return await ctx.send(f"No such {item_type} in this server.")
+        accepted, auction = state.engine.place(item_type, str(item_id), group_owner(g), amount,
+                                               audit=f"Group {group_name} bid {amount} on {item_type} {item_id}")
+    if not accepted:
+        return await ctx.send(f"Minimum required bid is {auction.min_required()}.")
+    publish_auction(state, "bid", auction)
+    schedule_auction_timer(state, item_type, str(item_id), ctx.channel.id)
+    if auction.leader == (OWNER_GROUP, g["id"]):
+        await ctx.send(f"✅ Group **{group_name}** placed a bid of **{amount}** on {item_type} {item_id}.")
+    else:
+        await ctx.send(f"✅ Group **{group_name}** bid **{amount}** on {item_type} {item_id}, answered by a max bid: "
+                       f"**{auction.bidder}** leads at **{auction.high_bid}**")
     # DM notify group members
-    members = db.fetchall("SELECT user_id FROM groups_members WHERE group_name=?", (group_name.lower(),))
+    members = await db.fetchall("SELECT user_id FROM groups_members WHERE guild_id=? AND group_name=?", (state.guild_id, group_name.lower()))
     for m in members:
-        try:
-            user = await bot.fetch_user(int(m["user_id"]))
-            await user.send(f"📢 Your group **{group_name}** placed a bid of **{amount}** on {item_type} {item_id}.")
-        except:
-            pass
-    schedule_auction_timer(item_type, str(item_id), ctx.channel.id)
+        notifier.notify(m["user_id"], f"📢 Your group **{group_name}** placed a bid of **{amount}** on {item_type} {item_id}.")
 
 # ---------- GROUP / WALLET / PROFILE / ADMIN COMMANDS ----------
 @bot.command()
 async def creategroup(ctx, name: str, starting_funds: int = 0):
-    name = name.lower()
-    if db.fetchone("SELECT * FROM investor_groups WHERE name=?", (name,)):
+    name, gid = name.lower(), ctx.guild.id
+    if await find_group(gid, name):
+        return await ctx.send("Group already exists.")
+    if starting_funds < 0:
+        return await ctx.send("Starting funds can't be negative.")
+    batch = None
+    try:
+        async with db.transaction() as tx:
+            tx.on_commit(lambda: (cache.invalidate("group_name", (gid, name)), cache.invalidate("member", (gid, name, str(ctx.author.id)))))
+            tx.query("INSERT INTO investor_groups (guild_id, name, funds) VALUES (?, ?, 0)", (gid, name))
+            tx.query("INSERT INTO groups_members (guild_id, group_name, user_id) VALUES (?, ?, ?)", (gid, name, str(ctx.author.id)))
+            if starting_funds:
+                batch = ledger.post_set(
+                    tx, f"SELECT '{OWNER_GROUP}' AS account_type, id AS account_id, ? AS amount FROM investor_groups WHERE guild_id=? AND name=?",
+                    (starting_funds, gid, name), "opening", f"created by {ctx.author}")
+    except sqlite3.IntegrityError:
         return await ctx.send("Group already exists.")
-    db.query("INSERT INTO investor_groups (name, funds) VALUES (?, ?)", (name, starting_funds))
-    db.query("INSERT INTO groups_members (group_name, user_id) VALUES (?, ?)", (name, str(ctx.author.id)))
-    log_audit(f"{ctx.author} created group {name} with starting {starting_funds}")
+    if batch:
+        await ledger.notify(batch)
+    await log_audit(f"{ctx.author} created group {name} with starting {starting_funds}")
     await ctx.send(f"Group **{name}** created with funds **{starting_funds}** and you were added as a member.")
 
 @bot.command()
 async def joingroup(ctx, name: str):
-    name = name.lower()
-    g = db.fetchone("SELECT * FROM investor_groups WHERE name=?", (name,))
+    name, gid = name.lower(), ctx.guild.id
+    g = await find_group(gid, name)
     if not g:
         return await ctx.send("No such group.")
-    if db.fetchone("SELECT * FROM groups_members WHERE group_name=? AND user_id=?", (name, str(ctx.author.id))):
+    if await is_member(gid, name, ctx.author.id):
+        return await ctx.send("You are already in this group.")
+    try:
+        await db.query("INSERT INTO groups_members (guild_id, group_name, user_id) VALUES (?, ?, ?)", (gid, name, str(ctx.author.id)))
+    except sqlite3.IntegrityError:
         return await ctx.send("You are already in this group.")
-    db.query("INSERT INTO groups_members (group_name, user_id) VALUES (?, ?)", (name, str(ctx.author.id)))
-    log_audit(f"{ctx.author} joined group {name}")
+    cache.invalidate("member", (gid, name, str(ctx.author.id)))
+    await log_audit(f"{ctx.author} joined group {name}")
     await ctx.send(f"{ctx.author.mention} joined **{name}**.")
 
 @bot.command()
 async def leavegroup(ctx, name: str):
-    name = name.lower()
-    g = db.fetchone("SELECT * FROM investor_groups WHERE name=?", (name,))
+    name, gid = name.lower(), ctx.guild.id
+    g = await find_group(gid, name)
     if not g:
         return await ctx.send("No such group.")
-    if not db.fetchone("SELECT * FROM groups_members WHERE group_name=? AND user_id=?", (name, str(ctx.author.id))):
+    if not await is_member(gid, name, ctx.author.id):
         return await ctx.send("You are not in this group.")
     # apply penalty on group's funds
     penalty = g["funds"] * LEAVE_PENALTY_PERCENT // 100
-    new = max(0, g["funds"] - penalty)
-    db.query("UPDATE investor_groups SET funds=? WHERE name=?", (new, name))
-    db.query("DELETE FROM groups_members WHERE group_name=? AND user_id=?", (name, str(ctx.author.id)))
-    log_audit(f"{ctx.author} left group {name}, penalty {penalty}")
+    async with db.transaction() as tx:
+        if penalty:
+            ledger.post(tx, (OWNER_GROUP, g["id"]), -penalty, "leave_penalty", f"{ctx.author} left", clamp=True)
+        tx.query("DELETE FROM groups_members WHERE guild_id=? AND group_name=? AND user_id=?", (gid, name, str(ctx.author.id)))
+        tx.on_commit(lambda: cache.invalidate("member", (gid, name, str(ctx.author.id))))
+    await log_audit(f"{ctx.author} left group {name}, penalty {penalty}")
     await ctx.send(f"{ctx.author.mention} left **{name}**. Penalty applied to group funds: **{penalty}**.")
 
 @bot.command()
 async def deposit(ctx, group_name: str, amount: int):
-    g = db.fetchone("SELECT * FROM investor_groups WHERE name=?", (group_name.lower(),))
+    g = await find_group(ctx.guild.id, group_name)
     if not g:
         return await ctx.send("No such group.")
-    new = g["funds"] + amount
-    db.query("UPDATE investor_groups SET funds=? WHERE name=?", (new, group_name.lower()))
-    db.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"{ctx.author} deposited {amount} to {group_name}",))
+    if amount <= 0:
+        return await ctx.send("Amount must be positive.")
+    account = (OWNER_GROUP, g["id"])
+    async with db.transaction() as tx:
+        ledger.post(tx, account, amount, "deposit", str(ctx.author))
+        tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"{ctx.author} deposited {amount} to {group_name}",))
+    new = await ledger.balance(account)
     await ctx.send(f"Deposited **{amount}** to **{group_name}**. New funds: {new}")
 
 @bot.command()
 async def withdraw(ctx, group_name: str, amount: int):
-    g = db.fetchone("SELECT * FROM investor_groups WHERE name=?", (group_name.lower(),))
+    g = await find_group(ctx.guild.id, group_name)
     if not g:
         return await ctx.send("No such group.")
-    if amount > g["funds"]:
+    if amount <= 0:
+        return await ctx.send("Amount must be positive.")
+    account = (OWNER_GROUP, g["id"])
+    try:
+        async with db.transaction() as tx:
+            ledger.post(tx, account, -amount, "withdraw", str(ctx.author))
+            tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"{ctx.author} withdrew {amount} from {group_name}",))
+    except InsufficientFunds:
         return await ctx.send("Not enough group funds.")
-    new = g["funds"] - amount
-    db.query("UPDATE investor_groups SET funds=? WHERE name=?", (new, group_name.lower()))
-    db.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"{ctx.author} withdrew {amount} from {group_name}",))
+    new = await ledger.balance(account)
+    guilds.get(ctx.guild.id).engine.cap_proxies(account, new)
     await ctx.send(f"Withdrew **{amount}** from **{group_name}**. New funds: {new}")
 
 # personal wallet
 @bot.command()
 async def wallet(ctx):
     uid = str(ctx.author.id)
-    row = db.fetchone("SELECT balance FROM personal_wallets WHERE user_id=?", (uid,))
+    row = await db.fetchone("SELECT balance FROM personal_wallets WHERE user_id=?", (uid,))
     bal = int(row["balance"]) if row else 0
     await ctx.send(f"{ctx.author.mention} wallet balance: **{bal}**")
 
 @bot.command()
 async def depositwallet(ctx, amount: int):
-    uid = str(ctx.author.id)
-    row = db.fetchone("SELECT balance FROM personal_wallets WHERE user_id=?", (uid,))
-    bal = int(row["balance"]) if row else 0
-    new = bal + amount
-    if row:
-        db.query("UPDATE personal_wallets SET balance=? WHERE user_id=?", (new, uid))
-    else:
-        db.query("INSERT INTO personal_wallets (user_id, balance) VALUES (?, ?)", (uid, new))
-    db.query("INSERT INTO wallet_transactions (user_id, amount, type) VALUES (?,?,?)", (uid, amount, "deposit"))
-    log_audit(f"{ctx.author} deposited {amount} to personal wallet")
+    if amount <= 0:
+        return await ctx.send("Amount must be positive.")
+    account = (OWNER_USER, ctx.author.id)
+    async with db.transaction() as tx:
+        ledger.post(tx, account, amount, "deposit")
+        tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"{ctx.author} deposited {amount} to personal wallet",))
+    new = await ledger.balance(account)
     await ctx.send(f"{ctx.author.mention} deposited **{amount}** to personal wallet. New balance: **{new}**")
 
 @bot.command()
 async def withdrawwallet(ctx, amount: int):
-    uid = str(ctx.author.id)
-    row = db.fetchone("SELECT balance FROM personal_wallets WHERE user_id=?", (uid,))
-    bal = int(row["balance"]) if row else 0
-    if amount > bal:
+    if amount <= 0:
+        return await ctx.send("Amount must be positive.")
+    account = (OWNER_USER, ctx.author.id)
+    try:
+        async with db.transaction() as tx:
+            ledger.post(tx, account, -amount, "withdraw")
+            tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"{ctx.author} withdrew {amount} from personal wallet",))
+    except InsufficientFunds:
         return await ctx.send("Not enough funds.")
-    new = bal - amount
-    db.query("UPDATE personal_wallets SET balance=? WHERE user_id=?", (new, uid))
-    db.query("INSERT INTO wallet_transactions (user_id, amount, type) VALUES (?,?,?)", (uid, amount, "withdraw"))
-    log_audit(f"{ctx.author} withdrew {amount} from personal wallet")
+    new = await ledger.balance(account)
     await ctx.send(f"{ctx.author.mention} withdrew **{amount}** from personal wallet. New balance: **{new}**")
 
 # profile
@@ -489,10 +747,16 @@ async def withdrawwallet(ctx, amount: int):
 async def profile(ctx, member: discord.Member = None):
     member = member or ctx.author
     uid = str(member.id)
-    prof = db.fetchone("SELECT * FROM user_profiles WHERE user_id=?", (uid,))
-    bal = db.fetchone("SELECT balance FROM personal_wallets WHERE user_id=?", (uid,))
-    groups = db.fetchall("SELECT group_name FROM groups_members WHERE user_id=?", (uid,))
-    bids = db.fetchall("SELECT * FROM bids WHERE bidder LIKE ? ORDER BY id DESC LIMIT 10", (f"%{member}%",))
+    prof = await db.fetchone("SELECT * FROM user_profiles WHERE user_id=?", (uid,))
+    bal = await db.fetchone("SELECT balance FROM personal_wallets WHERE user_id=?", (uid,))
+    groups = await db.fetchall("SELECT group_name FROM groups_members WHERE user_id=? AND guild_id=?", (uid, ctx.guild.id))
+    # live and archived bids
+    bids = await db.fetchall(
+        "SELECT bidder, amount FROM ("
+        "  SELECT * FROM (SELECT id, bidder, amount FROM bids WHERE bidder_type=? AND bidder_id=? AND guild_id=? ORDER BY id DESC LIMIT 10)"
+        "  UNION ALL"
+        "  SELECT * FROM (SELECT id, bidder, amount FROM bids_archive WHERE bidder_type=? AND bidder_id=? AND guild_id=? ORDER BY id DESC LIMIT 10)"
+        ") ORDER BY id DESC LIMIT 10", (OWNER_USER, member.id, ctx.guild.id) * 2)
     embed = discord.Embed(title=f"Profile: {member}", color=0x00ff99)
     try:
         if member.avatar:
@@ -508,59 +772,63 @@ async def profile(ctx, member: discord.Member = None):
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def setclubmanager(ctx, club_name: str, member: discord.Member):
-    club = db.fetchone("SELECT * FROM club WHERE name=?", (club_name,))
+    club = await find_club(ctx.guild.id, club_name)
     if not club:
         return await ctx.send("No such club.")
-    db.query("UPDATE club SET manager_id=? WHERE name=?", (str(member.id), club_name))
-    log_audit(f"{ctx.author} set {member} as manager for {club_name}")
+    await db.query("UPDATE club SET manager_id=? WHERE id=?", (str(member.id), club["id"]))
+    cache.invalidate("club", club["id"])
+    await log_audit(f"{ctx.author} set {member} as manager for {club_name}")
     await ctx.send(f"{member.mention} set as manager for {club_name}.")
 
 @bot.command()
 async def clubmanager(ctx, club_name: str):
-    club = db.fetchone("SELECT * FROM club WHERE name=?", (club_name,))
+    club = await find_club(ctx.guild.id, club_name)
     if not club:
         return await ctx.send("No such club.")
     if not club["manager_id"]:
         return await ctx.send("No manager assigned.")
     try:
-        user = await bot.fetch_user(int(club["manager_id"]))
+        user = await notifier.resolve_user(club["manager_id"])
         await ctx.send(f"Manager for {club_name}: {user.mention}")
     except:
         await ctx.send("Manager set but user not found.")
 
 @bot.command()
 async def clubduelists(ctx, club_name: str):
-    club = db.fetchone("SELECT * FROM club WHERE name=?", (club_name,))
+    club = await find_club(ctx.guild.id, club_name)
     if not club:
         return await ctx.send("No such club.")
-    duelists = db.fetchall("SELECT * FROM duelists WHERE owned_by LIKE ?", (f"%{club_name}%",))
-    if not duelists:
+    # duelists owned by whoever owns the club
+    owner = await club_owner(db, club)
+    if not owner:
         return await ctx.send("No duelists signed to this club.")
-    msg = f"📜 Duelists for {club_name}:\n"
-    for d in duelists:
-        msg += f"- {d['username']} (ID {d['id']}) | Salary: {d['expected_salary']} | Owned by: {d['owned_by']}\n"
-    await ctx.send(msg)
+    pager = KeysetPager(db, f"clubduelists:{owner[0]}:{owner[1]}", f"📜 Duelists for {club_name}:",
+                        "SELECT id, username, expected_salary, owned_by FROM duelists WHERE owner_type=? AND owner_id=? AND {where} ORDER BY id {order} LIMIT ?",
+                        owner,
+                        lambda d: f"- {d['username']} (ID {d['id']}) | Salary: {d['expected_salary']} | Owned by: {d['owned_by']}")
+    if not await send_paginated(ctx, pager):
+        await ctx.send("No duelists signed to this club.")
 
 # apply salary deduction when a duelist misses a match
 @bot.command()
 async def deductsalary(ctx, duelist_id: int, apply: str = "yes"):
-    d = db.fetchone("SELECT * FROM duelists WHERE id=?", (duelist_id,))
+    d = await get_duelist(duelist_id, ctx.guild.id)
     if not d:
         return await ctx.send("No such duelist.")
-    contract = db.fetchone("SELECT * FROM duelist_contracts WHERE duelist_id=? ORDER BY id DESC LIMIT 1", (duelist_id,))
+    contract = await db.fetchone("SELECT * FROM duelist_contracts WHERE duelist_id=? ORDER BY id DESC LIMIT 1", (duelist_id,))
     if not contract:
         return await ctx.send("Duelist not contracted.")
-    club_owner = contract["club_owner"]
     invoker_id = str(ctx.author.id)
     allowed = False
+    g = None
     # if group owner: allow members of group
-    if "(group)" in club_owner:
-        gname = club_owner.replace(" (group)", "").lower()
-        if db.fetchone("SELECT * FROM groups_members WHERE group_name=? AND user_id=?", (gname, invoker_id)):
+    if contract["owner_type"] == OWNER_GROUP:
+        g = await get_group(contract["owner_id"])
+        if g and await is_member(g["guild_id"], g["name"], invoker_id):
             allowed = True
     else:
-        # compare invoker string to stored owner string OR allow server admins
-        if str(ctx.author) == club_owner or ctx.author.guild_permissions.administrator:
+        # owner id match OR allow server admins
+        if contract["owner_id"] == ctx.author.id or ctx.author.guild_permissions.administrator:
             allowed = True
     if not allowed:
         return await ctx.send("You are not authorized to apply salary deduction for this duelist.")
@@ -568,28 +836,42 @@ async def deductsalary(ctx, duelist_id: int, apply: str = "yes"):
         return await ctx.send("apply must be 'yes' or 'no'")
     if apply.lower() in ("no", "n"):
         return await ctx.send("Salary deduction skipped by club decision.")
-    # apply deduction
+    # recorded on the contract; the next payroll deducts it
     penalty = contract["salary"] * DUELIST_MISS_PENALTY_PERCENT // 100
-    # deduct from group funds if group owned
-    if "(group)" in club_owner:
-        gname = club_owner.replace(" (group)", "").lower()
-        g = db.fetchone("SELECT funds FROM investor_groups WHERE name=?", (gname,))
-        if g:
-            new = max(0, g["funds"] - penalty)
-            db.query("UPDATE investor_groups SET funds=? WHERE name=?", (new, gname))
-    log_audit(f"{ctx.author} applied salary deduction {penalty} for duelist {d['username']} (id {duelist_id})")
-    await ctx.send(f"Salary deduction applied: {penalty} (15%) for duelist {d['username']}.")
+    await db.query("UPDATE duelist_contracts SET misses = misses + 1 WHERE id=?", (contract["id"],))
+    await log_audit(f"{ctx.author} applied salary deduction {penalty} for duelist {d['username']} (id {duelist_id})")
+    await ctx.send(f"Salary deduction recorded: {penalty} ({DUELIST_MISS_PENALTY_PERCENT}%) comes off {d['username']}'s next payroll.")
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def payroll(ctx, mode: str = "preview"):
+    """
+    !payroll          what the next payroll would pay (nothing is written)
+    !payroll run      pay it now; the weekly schedule is unchanged
+    """
+    if mode not in ("preview", "run"):
+        return await ctx.send("mode must be 'preview' or 'run'")
+    summary = await run_payroll(ledger, ctx.guild.id, 1, DUELIST_MISS_PENALTY_PERCENT, dry_run=mode == "preview")
+    if mode == "run":
+        await log_audit(f"{ctx.author}: " + payroll_line(ctx.guild.id, summary))
+    lines = [f"{'Payroll' if mode == 'run' else 'Payroll preview'}: {summary['contracts']} active contracts"]
+    for status, (n, gross, penalty, net) in sorted(summary["by_status"].items()):
+        lines.append(f"- {status}: {n} contracts | salaries {gross} | miss penalties {penalty} | net {net}")
+    await ctx.send("\n".join(lines))
 
 # admin adjust club/group balance
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def adjustgroupfunds(ctx, group_name: str, amount: int):
-    g = db.fetchone("SELECT * FROM investor_groups WHERE name=?", (group_name.lower(),))
+    g = await find_group(ctx.guild.id, group_name)
     if not g:
         return await ctx.send("No such group.")
-    new = max(0, g["funds"] + amount)
-    db.query("UPDATE investor_groups SET funds=? WHERE name=?", (new, group_name.lower()))
-    log_audit(f"{ctx.author} adjusted funds of {group_name} by {amount}. New funds {new}")
+    account = (OWNER_GROUP, g["id"])
+    async with db.transaction() as tx:
+        ledger.post(tx, account, amount, "adjustment", str(ctx.author), clamp=True)
+    new = await ledger.balance(account)
+    guilds.get(ctx.guild.id).engine.cap_proxies(account, new)
+    await log_audit(f"{ctx.author} adjusted funds of {group_name} by {amount}. New funds {new}")
     await ctx.send(f"Adjusted funds of {group_name} by {amount}. New funds: {new}")
 
 # owner/admin overrides
@@ -598,62 +880,146 @@ async def adjustgroupfunds(ctx, group_name: str, amount: int):
 async def forcewinner(ctx, item_type: str, item_id: int, winner_str: str, amount: int):
     if item_type not in ("club", "duelist"):
         return await ctx.send("item_type must be club or duelist.")
+    gid = ctx.guild.id
+    owner_type, owner_id, winner_str = await owner_from_label(db, gid, winner_str)
     if item_type == "club":
-        db.query("INSERT INTO club_history (winner, amount, timestamp, market_value_at_sale) VALUES (?,?,datetime('now'),?)",
-                 (winner_str, amount, (db.fetchone("SELECT value FROM club WHERE id=1")["value"] if db.fetchone("SELECT value FROM club WHERE id=1") else None)))
-        log_audit(f"Owner forced winner {winner_str} for club {item_id} at {amount}")
+        club = await get_club(item_id, gid)
+        if not club:
+            return await ctx.send("No such club in this server.")
+        async with db.transaction() as tx:
+            tx.query("INSERT INTO club_history (guild_id, club_id, winner, winner_type, winner_id, amount, timestamp, market_value_at_sale) VALUES (?,?,?,?,?,?,datetime('now'),?)",
+                     (gid, item_id, winner_str, owner_type, owner_id, amount, club["value"]))
+            rollup_sale(tx, gid, "club", (owner_type, owner_id, winner_str), amount)
+            tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"Owner forced winner {winner_str} for club {item_id} at {amount}",))
         await ctx.send(f"Owner forced {winner_str} as winner for club {item_id} at {amount}")
     else:
-        salary = db.fetchone("SELECT expected_salary FROM duelists WHERE id=?", (item_id,))
-        salary_val = salary["expected_salary"] if salary else 0
-        db.query("INSERT INTO duelist_contracts (duelist_id, club_owner, purchase_price, salary, signed_at) VALUES (?,?,?,?,datetime('now'))",
-                 (item_id, winner_str, amount, salary_val))
-        db.query("UPDATE duelists SET owned_by=? WHERE id=?", (winner_str, item_id))
-        log_audit(f"Owner forced winner {winner_str} for duelist {item_id} at {amount}")
+        salary = await get_duelist(item_id, gid)
+        if not salary:
+            return await ctx.send("No such duelist in this server.")
+        async with db.transaction() as tx:
+            tx.query("INSERT INTO duelist_contracts (guild_id, duelist_id, club_owner, owner_type, owner_id, purchase_price, salary, signed_at) VALUES (?,?,?,?,?,?,?,datetime('now'))",
+                     (gid, item_id, winner_str, owner_type, owner_id, amount, salary["expected_salary"]))
+            tx.query("UPDATE duelists SET owned_by=?, owner_type=?, owner_id=? WHERE id=?", (winner_str, owner_type, owner_id, item_id))
+            tx.on_commit(lambda: cache.invalidate("duelist", item_id))
+            rollup_sale(tx, gid, "duelist", (owner_type, owner_id, winner_str), amount)
+            tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"Owner forced winner {winner_str} for duelist {item_id} at {amount}",))
         await ctx.send(f"Owner forced {winner_str} as winner for duelist {item_id} at {amount}")
 
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def report(ctx, period: str = "week", start: str = None, end: str = None):
+    """
+    Admin command: sales report on demand
+    !report [day|week|month]  or  !report custom <YYYY-MM-DD> [YYYY-MM-DD]
+    """
+    if period not in REPORT_PERIODS and period != "custom":
+        return await ctx.send("period must be day, week, month or custom.")
+    if period == "custom" and not start:
+        return await ctx.send("Usage: !report custom <YYYY-MM-DD> [YYYY-MM-DD]")
+    try:
+        text = await build_report(db, ctx.guild.id, period, start, end)
+    except ValueError:
+        return await ctx.send("Dates must be YYYY-MM-DD.")
+    await ctx.send(text)
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def exportbids(ctx, month: str = None):
+    """
+    Admin command: this server's archived bids as a gzipped CSV
+    !exportbids [YYYY-MM]
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        name = f"bids-{ctx.guild.id}-{month or 'all'}.csv.gz"
+        path = os.path.join(tmp, name)
+        try:
+            count = await export_archived_bids(db, ctx.guild.id, path, month)
+        except ValueError:
+            return await ctx.send("Month must be YYYY-MM.")
+        if not count:
+            return await ctx.send("No archived bids" + (f" for {month}." if month else "."))
+        await ctx.send(f"📦 {count} archived bids", file=discord.File(path, filename=name))
+
 @bot.command()
 @commands.is_owner()
 async def freezeauction(ctx):
-    global bidding_frozen
-    bidding_frozen = True
-    log_audit(f"{ctx.author} froze auctions")
-    await ctx.send("All auctions frozen (owner).")
+    guilds.get(ctx.guild.id).frozen = True
+    await log_audit(f"{ctx.author} froze auctions in guild {ctx.guild.id}")
+    await ctx.send("All auctions in this server frozen (owner).")
 
 @bot.command()
 @commands.is_owner()
 async def unfreezeauction(ctx):
-    global bidding_frozen
-    bidding_frozen = False
-    log_audit(f"{ctx.author} unfroze auctions")
-    await ctx.send("Auctions unfrozen (owner).")
+    guilds.get(ctx.guild.id).frozen = False
+    await log_audit(f"{ctx.author} unfroze auctions in guild {ctx.guild.id}")
+    await ctx.send("Auctions in this server unfrozen (owner).")
 
 @bot.command()
 @commands.is_owner()
-async def auditlog(ctx, lines: int = 50):
-    rows = db.fetchall("SELECT entry, timestamp FROM audit_logs ORDER BY id DESC LIMIT ?", (lines,))
-    if not rows:
-        return await ctx.send("No audit logs.")
-    text = "\n".join([f"[{r['timestamp']}] {r['entry']}" for r in rows])
-    for chunk in [text[i:i+1900] for i in range(0, len(text), 1900)]:
-        await ctx.send(f"```{chunk}```")
+async def auditlog(ctx, lines: int = 25):
+    page_size = max(1, min(lines, 50))
+    pager = KeysetPager(db, f"auditlog:{lines}", "🧾 Audit log:",
+                        "SELECT id, entry, timestamp FROM audit_logs WHERE {where} ORDER BY id {order} LIMIT ?", (),
+                        lambda r: f"[{r['timestamp']}] {r['entry']}", descending=True,
+                        page_size=page_size, wrap=("```", "```"),
+                        head=lambda: [f"[{ts}] {entry} (pending)" for ts, entry in audit.pending(page_size)])
+    if not await send_paginated(ctx, pager):
+        await ctx.send("No audit logs.")
+
+@bot.command()
+@commands.is_owner()
+async def timerstats(ctx):
+    s = guilds.get(ctx.guild.id).scheduler.stats()
+    await ctx.send(f"⏱️ Pending deadlines: {s['pending']} | fired: {s['fired']} | "
+                   f"last lag: {s['last_lag'] * 1000:.1f}ms | max lag: {s['max_lag'] * 1000:.1f}ms | "
+                   f"guilds on this shard process: {len(guilds)}")
+
+@bot.command()
+@commands.is_owner()
+async def cachestats(ctx):
+    s = cache.stats()
+    kinds = " | ".join(f"{kind}: {hits}/{hits + misses} hits" for kind, (hits, misses) in s["kinds"].items()) or "no lookups yet"
+    await ctx.send(f"🗃️ Entity cache: {s['entries']}/{s['max_entries']} entries | evictions: {s['evictions']} | {kinds}")
+
+@bot.command()
+@commands.is_owner()
+async def enableautovacuum(ctx):
+    await ctx.send("Rewriting the database for incremental vacuum; writes pause until it is done.")
+    started = time.perf_counter()
+    converted = await db.enable_incremental_vacuum()
+    await ctx.send(f"Incremental vacuum enabled in {time.perf_counter() - started:.1f}s." if converted
+                   else "Incremental vacuum is already enabled.")
 
 @bot.command()
 @commands.is_owner()
 async def resetauction(ctx):
-    db.query("DELETE FROM bids")
-    db.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"{ctx.author} reset auctions",))
-    await ctx.send("All bids cleared and auctions reset.")
+    state = guilds.get(ctx.guild.id)
+    async with state.engine.lock_all():
+        await state.engine.flush()
+        async with db.transaction() as tx:
+            archive_bids(tx, "reset", "guild_id=?", (state.guild_id,))
+        state.engine.clear_bids()
+    await log_audit(f"{ctx.author} reset auctions in guild {state.guild_id}")
+    await ctx.send("All bids in this server cleared and auctions reset.")
 
 @bot.command()
 @commands.is_owner()
 async def transferclub(ctx, old_group: str, new_group: str):
     # sets latest club_history winner to new_group (quick admin override)
-    latest = db.fetchone("SELECT id FROM club_history ORDER BY id DESC LIMIT 1")
+    gid = ctx.guild.id
+    latest = await db.fetchone("SELECT id, winner, winner_type, winner_id, amount, date(timestamp) AS day FROM club_history "
+                               "WHERE guild_id=? ORDER BY id DESC LIMIT 1", (gid,))
     if not latest:
         return await ctx.send("No sale to transfer.")
-    db.query("UPDATE club_history SET winner=? WHERE id=?", (new_group + " (group)", latest["id"]))
-    log_audit(f"{ctx.author} transferred last sale from {old_group} to {new_group}")
+    g = await find_group(gid, new_group)
+    if not g:
+        return await ctx.send("No such group.")
+    new_owner = group_owner(g)
+    async with db.transaction() as tx:
+        tx.query("UPDATE club_history SET winner=?, winner_type=?, winner_id=? WHERE id=?", (new_owner[2], OWNER_GROUP, g["id"], latest["id"]))
+        if latest["day"]:
+            rollup_transfer(tx, gid, "club", latest["day"], (latest["winner_type"], latest["winner_id"], latest["winner"]), new_owner, latest["amount"])
+        tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (f"{ctx.author} transferred last sale from {old_group} to {new_group}",))
     await ctx.send(f"Transferred club ownership from {old_group} to {new_group} (admin override).")
 
 # simple help command override (shows many commands grouped)
@@ -669,6 +1035,7 @@ Club admin/registration:
 !listclubs
 !startclubauction <club_name>  (admin)
 !clubinfo <club_id>
+!marketchart <club_name> [day|week|month|year|all]
 
 Duelists:
 !registerduelist <username> <base_price> <expected_salary>
@@ -678,6 +1045,9 @@ Duelists:
 Bids:
 !placebid <amount> <item_type> <item_id>
 !groupbid <group_name> <amount> <item_type> <item_id>
+!proxybid <max> <item_type> <item_id>
+!groupproxy <group_name> <max> <item_type> <item_id>
+!cancelproxy <item_type> <item_id> [group_name]
 
 Groups/Wallets:
 !creategroup <name> <starting_funds>
@@ -692,19 +1062,27 @@ Managers & Salary:
 !clubmanager <club_name>
 !clubduelists <club_name>
 !deductsalary <duelist_id> <yes|no>
+!payroll [preview|run]  (admin)
+!report [day|week|month|custom <start> [end]]  (admin)
+!exportbids [YYYY-MM]  (admin)
 
 Admin/Owner:
 !freezeauction / !unfreezeauction (owner)
 !forcewinner (owner)
 !auditlog (owner)
+!timerstats (owner)
+!cachestats (owner)
+!enableautovacuum (owner)
 !resetauction (owner)
 """
     await ctx.send(txt)
 
 # ---------- DASHBOARD (Optional FastAPI) ----------
-if START_DASHBOARD:
+def start_dashboard():
+    global START_DASHBOARD
     try:
-        from fastapi import FastAPI, Request
+        from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect
+        from fastapi.responses import PlainTextResponse, StreamingResponse
         from fastapi.staticfiles import StaticFiles
         from fastapi.templating import Jinja2Templates
         import uvicorn
@@ -720,16 +1098,60 @@ if START_DASHBOARD:
         app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
         templates = Jinja2Templates(directory=str(templates_dir))
 
-        def get_db_conn():
-            conn = sqlite3.connect(DB_FILE)
-            conn.row_factory = sqlite3.Row
-            return conn
+        @app.get("/metrics")
+        def metrics_endpoint():
+            return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+        # live auction feed; ?topic=club:3 (repeatable) limits it
+        @app.get("/events")
+        async def event_stream(topic: list[str] = Query(None)):
+            sub = events.subscribe(topic)
+            async def stream():
+                try:
+                    for payload in events.initial_events(sub):
+                        yield f"data: {payload}\n\n"
+                    while True:
+                        try:
+                            payload = await sub.get(timeout=EVENT_HEARTBEAT)
+                        except asyncio.TimeoutError:
+                            yield ": ping\n\n"
+                            continue
+                        if payload is None:
+                            yield 'data: {"type":"dropped"}\n\n'
+                            break
+                        yield f"data: {payload}\n\n"
+                finally:
+                    events.unsubscribe(sub)
+            return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+        @app.websocket("/ws")
+        async def event_socket(websocket: WebSocket):
+            await websocket.accept()
+            sub = events.subscribe(websocket.query_params.getlist("topic") or None)
+            try:
+                for payload in events.initial_events(sub):
+                    await websocket.send_text(payload)
+                while True:
+                    try:
+                        payload = await sub.get(timeout=EVENT_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        await websocket.send_text('{"type":"ping"}')
+                        continue
+                    if payload is None:
+                        await websocket.close(code=1013)
+                        break
+                    await websocket.send_text(payload)
+            except WebSocketDisconnect:
+                pass
+            finally:
+                events.unsubscribe(sub)
 
         @app.get("/")
-        def index(request: Request):
-            conn = get_db_conn()
-            club = conn.execute("SELECT * FROM club WHERE id=1").fetchone()
-            conn.close()
+        async def index(request: Request, guild: int = Query(None)):
+            if guild is None:
+                club = await db.fetchone("SELECT * FROM club ORDER BY id LIMIT 1")
+            else:
+                club = await db.fetchone("SELECT * FROM club WHERE guild_id=? ORDER BY id LIMIT 1", (guild,))
             return templates.TemplateResponse("index.html", {"request": request, "club": club})
 
         def run_dashboard():
@@ -746,13 +1168,66 @@ if START_DASHBOARD:
 @bot.event
 async def on_ready():
     print("Bot started as", bot.user)
-    bot.loop.create_task(market_simulation_task())
-    bot.loop.create_task(weekly_report_scheduler())
+    global auctions_restored
+    if not auctions_restored:
+        auctions_restored = True
+        started = time.perf_counter()
+        await db.open()
+        startup_phases["db_open"] = time.perf_counter() - started
+        if LEGACY_GUILD_ID is not None and bot.get_guild(LEGACY_GUILD_ID):
+            moved = await claim_unpartitioned(db, LEGACY_GUILD_ID)
+            if any(moved.values()):
+                cache.clear()
+                print(f"[startup] pre-sharding rows handed to guild {LEGACY_GUILD_ID}:", moved)
+        started = time.perf_counter()
+        restored = await restore_guilds()
+        startup_phases["restore"] = time.perf_counter() - started
+        startup_phases["to_ready"] = time.perf_counter() - _import_started
+        bot.loop.create_task(metrics.sample_loop_lag())
+        jobs.ensure("audit_maintenance", "", 3600)
+        jobs.ensure("ledger_snapshot", "", LEDGER_SNAPSHOT_INTERVAL)
+        jobs.ensure("db_vacuum", "", VACUUM_INTERVAL)
+        ch = bot.get_channel(REPORT_CHANNEL_ID) if REPORT_CHANNEL_ID else None
+        if ch:
+            jobs.ensure("weekly_report", REPORT_CHANNEL_ID, 7 * 24 * 3600, guild_id=ch.guild.id)
+        jobs.start()
+        notifier.start()
+        print("[startup] " + " | ".join(f"{k} {v:.3f}s" for k, v in startup_phases.items())
+              + f" | {restored} auctions restored in {len(guilds)} guilds")
+
+async def restore_guilds():
+    """Restore every served guild with clubs or live auctions; returns the auction count"""
+    served = {g.id for g in bot.guilds}
+    rows = await db.fetchall("SELECT guild_id FROM live_auctions UNION SELECT guild_id FROM club")
+    deadlines = await jobs.pending("finalize")
+    counts = await asyncio.gather(*(restore_guild(guilds.get(r["guild_id"]), deadlines) for r in rows if r["guild_id"] in served))
+    return sum(counts)
+
+async def restore_guild(state, deadlines):
+    """Rebuild one guild's live auctions and re-arm their deadlines"""
+    auctions = await state.engine.load()
+    now = time.time()
+    for auction in auctions:
+        due = deadlines.get((state.guild_id, auction_job_key(auction.item_type, auction.item_id)))
+        delay = max(0, due[0] - now) if due else TIME_LIMIT
+        schedule_auction_timer(state, auction.item_type, auction.item_id, auction.channel_id, delay)
+    return len(auctions)
+
+@bot.event
+async def on_guild_remove(guild):
+    await guilds.drop(guild.id)
+    jobs.cancel("market_tick", guild.id)
+    jobs.cancel("payroll", guild.id)
 
 # ---------- RUN ----------
+startup_phases = {"imports": time.perf_counter() - _import_started}
+
 if __name__ == "__main__":
     if DISCORD_TOKEN == "PASTE_YOUR_TOKEN_HERE" or not DISCORD_TOKEN:
         print("ERROR: Please set your DISCORD_TOKEN environment variable OR paste your token into DISCORD_TOKEN in this file.")
     else:
+        db.open_soon()
+        if START_DASHBOARD:
+            start_dashboard()
         bot.run(DISCORD_TOKEN)
 
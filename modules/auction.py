@@ -1 +1,385 @@
 # unified auction system for clubs and duelists
+import asyncio
+import heapq
+from contextlib import AsyncExitStack, asynccontextmanager
+
+WRITE_BEHIND_DELAY = 0.02   # seconds accepted bids may wait in memory before being written
+WRITE_BEHIND_RETRY = 1      # seconds before a failed write-behind batch is tried again
+LOCK_STRIPES = 32           # locks per engine that auctions hash onto (see AuctionEngine.lock)
+
+def next_min_bid(current, percent):
+    # integer-safe: round up to nearest integer
+    add = current * percent / 100
+    return int(current + max(1, round(add)))  # require at least +1 if percent too small
+
+class Auction:
+    """
+    State of one live auction. `high_bid`/`bidder` are None until the first bid lands;
+    `bidder` is the display label, `bidder_type`/`bidder_id` the owner identity.
+    `proxies` holds the hidden maximums: (owner_type, owner_id) -> (max, seq, owner).
+    """
+    __slots__ = ("item_type", "item_id", "base_price", "min_increment_percent", "channel_id",
+                 "high_bid", "bidder", "bidder_type", "bidder_id", "deadline", "bid_count", "proxies")
+
+    def __init__(self, item_type, item_id, base_price, min_increment_percent, channel_id=None):
+        self.item_type = item_type
+        self.item_id = str(item_id)
+        self.base_price = int(base_price or 0)
+        self.min_increment_percent = min_increment_percent
+        self.channel_id = channel_id
+        self.high_bid = None
+        self.bidder = None
+        self.bidder_type = None
+        self.bidder_id = None
+        self.deadline = None   # loop time the auction finalizes at, set by the timer
+        self.bid_count = 0     # bids on record for this auction (feeds the market model)
+        self.proxies = {}
+
+    @property
+    def key(self):
+        return (self.item_type, self.item_id)
+
+    @property
+    def current(self):
+        return self.high_bid if self.high_bid is not None else self.base_price
+
+    def min_required(self):
+        return next_min_bid(self.current, self.min_increment_percent)
+
+    @property
+    def leader(self):
+        return (self.bidder_type, self.bidder_id) if self.high_bid is not None else None
+
+class AuctionEngine:
+    """
+    Keeps every live auction in memory, keyed like active_timers by (item_type, item_id),
+    so bid checks never touch sqlite. Accepted bids are written to `bids` behind the
+    caller's back in small batches; flush() forces them out (finalize does this first).
+    Proxy (max) bids are settled here too, in memory, every time the auction moves.
+    With a guild_id the engine holds that guild's auctions only (one engine per guild,
+    see modules/guilds.py) and tags its rows with it.
+    """
+    def __init__(self, db, min_increment_percent, audit_log=None, guild_id=0):
+        self.db = db
+        self.min_increment_percent = min_increment_percent
+        self.guild_id = guild_id
+        self.audit_log = audit_log   # e.g. AuditLog.log; without one, audit rows ride the write-behind batch
+        self.auctions = {}
+        self._pending = []
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._stripes = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+        self._proxy_seq = 0
+
+    def lock(self, item_type, item_id):
+        """
+        Lock for one auction's sequences that await between reading and writing its state
+        (opening it for a first bid, closing and persisting it, restarting it). place()
+        itself never awaits, so the bid check and the new high are one step; the lock keeps
+        a bid from landing in the middle of a close or reset. Auctions hash onto a fixed
+        set of stripes: bids on different auctions almost never wait for each other, and
+        there are no per-auction locks to create or clean up.
+        """
+        return self._stripes[hash((item_type, str(item_id))) % len(self._stripes)]
+
+    @asynccontextmanager
+    async def lock_all(self):
+        """Every stripe, for sequences over all of the engine's auctions at once (a reset)."""
+        # always taken in stripe order, so two lock_all() callers can't deadlock
+        async with AsyncExitStack() as stack:
+            for stripe in self._stripes:
+                await stack.enter_async_context(stripe)
+            yield
+
+    def get(self, item_type, item_id):
+        return self.auctions.get((item_type, str(item_id)))
+
+    def open(self, item_type, item_id, base_price, channel_id=None, reset=False):
+        # returns the existing auction unless reset=True (an admin restarting it)
+        key = (item_type, str(item_id))
+        auction = self.auctions.get(key)
+        if auction is None or reset:
+            if reset and key in self.auctions:
+                self._queue("DELETE FROM proxy_bids WHERE item_type=? AND item_id=?", key)
+            auction = Auction(item_type, item_id, base_price, self.min_increment_percent, channel_id)
+            self.auctions[key] = auction
+            self._queue("INSERT OR REPLACE INTO live_auctions (guild_id, item_type, item_id, base_price, channel_id) VALUES (?,?,?,?,?)",
+                        (self.guild_id, item_type, auction.item_id, auction.base_price, channel_id))
+        elif channel_id is not None and auction.channel_id != channel_id:
+            auction.channel_id = channel_id
+            self._queue("UPDATE live_auctions SET channel_id=? WHERE item_type=? AND item_id=?", (channel_id, item_type, auction.item_id))
+        return auction
+
+    def place(self, item_type, item_id, owner, amount, audit=None):
+        """
+        Check and apply a bid in O(1). `owner` is (owner_type, owner_id, label).
+        Returns (accepted, auction); the bid row (and the optional audit entry) is
+        queued for write-behind only when accepted. Proxies then answer it, so the
+        auction may already be led by someone else when this returns.
+        """
+        auction = self.get(item_type, item_id)
+        if auction is None or amount < auction.min_required():
+            return False, auction
+        self._bid(auction, owner, amount, audit)
+        self._settle(auction)
+        return True, auction
+
+    def _bid(self, auction, owner, amount, audit=None):
+        auction.high_bid = amount
+        auction.bidder_type, auction.bidder_id, auction.bidder = owner
+        auction.bid_count += 1
+        self._queue("INSERT INTO bids (guild_id, bidder, bidder_type, bidder_id, amount, item_type, item_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.guild_id, auction.bidder, auction.bidder_type, auction.bidder_id, amount, auction.item_type, auction.item_id))
+        if audit and self.audit_log:
+            self.audit_log(audit)
+        elif audit:
+            self._queue("INSERT INTO audit_logs (entry) VALUES (?)", (audit,))
+
+    # ---------- PROXY BIDS ----------
+    def set_proxy(self, item_type, item_id, owner, max_amount):
+        """
+        Register (or move) `owner`'s hidden maximum and settle. The maximum must reach the
+        next minimum bid, or top the owner's own standing bid. Returns (accepted, auction);
+        accepted auctions may have a new high bid (see place()).
+        """
+        auction = self.get(item_type, item_id)
+        if auction is None:
+            return False, auction
+        key = tuple(owner[:2])
+        if max_amount < (auction.high_bid + 1 if auction.leader == key else auction.min_required()):
+            return False, auction
+        self._proxy_seq += 1
+        auction.proxies[key] = (max_amount, self._proxy_seq, owner)
+        self._queue("INSERT OR REPLACE INTO proxy_bids (guild_id, item_type, item_id, owner_type, owner_id, label, max_amount) VALUES (?,?,?,?,?,?,?)",
+                    (self.guild_id, item_type, auction.item_id, owner[0], owner[1], owner[2], max_amount))
+        self._settle(auction)
+        return True, auction
+
+    def cancel_proxy(self, item_type, item_id, owner_key):
+        # a standing bid the proxy already placed stays
+        auction = self.get(item_type, item_id)
+        if auction is None or auction.proxies.pop(tuple(owner_key), None) is None:
+            return False
+        self._queue("DELETE FROM proxy_bids WHERE item_type=? AND item_id=? AND owner_type=? AND owner_id=?",
+                    (item_type, auction.item_id, owner_key[0], owner_key[1]))
+        return True
+
+    def cap_proxies(self, owner_key, limit):
+        """Lower `owner_key`'s maximums above `limit` (e.g. a group's funds now) to it. Returns how many moved."""
+        owner_key = tuple(owner_key)
+        moved = 0
+        for auction in self.auctions.values():
+            proxy = auction.proxies.get(owner_key)
+            if proxy is None or proxy[0] <= limit:
+                continue
+            auction.proxies[owner_key] = (limit, proxy[1], proxy[2])
+            self._queue("UPDATE proxy_bids SET max_amount=? WHERE item_type=? AND item_id=? AND owner_type=? AND owner_id=?",
+                        (limit, auction.item_type, auction.item_id, owner_key[0], owner_key[1]))
+            moved += 1
+        return moved
+
+    def _settle(self, auction):
+        """
+        Where proxies bidding against each other one minimum step at a time would end up,
+        in one computation: the highest maximum wins at one step above the runner-up's
+        maximum (never above its own), ties going to the standing bid, then to the earlier
+        proxy. Places at most one bid. Returns True if it did.
+        """
+        if not auction.proxies:
+            return False
+        leader = auction.leader
+        floor = auction.min_required()
+        # (max, rank, key, owner); the leader's standing bid counts as a maximum of its own
+        ranked = [(m, seq, key, owner) for key, (m, seq, owner) in auction.proxies.items()]
+        if leader is not None:
+            standing = auction.proxies.get(leader, (0,))[0]
+            if standing < auction.high_bid:
+                ranked = [r for r in ranked if r[2] != leader]
+                ranked.append((auction.high_bid, 0, leader, None))
+            else:
+                ranked = [r if r[2] != leader else (r[0], 0, r[2], r[3]) for r in ranked]
+        ranked.sort(key=lambda r: (-r[0], r[1]))
+        top = ranked[0]
+        # only the leader and proxies that can still meet the next minimum take part
+        rivals = [r for r in ranked[1:] if r[2] == leader or r[0] >= floor]
+        if top[2] == leader:
+            if not rivals:
+                return False
+            amount = min(top[0], next_min_bid(rivals[0][0], self.min_increment_percent))
+            if amount <= auction.high_bid:
+                return False
+        else:
+            if top[0] < floor:
+                return False
+            amount = floor if not rivals else max(floor, min(top[0], next_min_bid(rivals[0][0], self.min_increment_percent)))
+        owner = top[3] or (auction.bidder_type, auction.bidder_id, auction.bidder)
+        self._bid(auction, owner, amount, f"Proxy bid {amount} for {owner[2]} on {auction.item_type} {auction.item_id}")
+        return True
+
+    def close(self, item_type, item_id):
+        # drop the auction from memory; the caller persists the outcome
+        return self.auctions.pop((item_type, str(item_id)), None)
+
+    def bid_counts(self, item_type):
+        # running per-item bid counters; O(live auctions), independent of the bids table size
+        return {a.item_id: a.bid_count for a in self.auctions.values() if a.item_type == item_type}
+
+    def clear_bids(self):
+        # every open auction goes back to its base price (bids table was wiped)
+        for auction in self.auctions.values():
+            auction.high_bid = None
+            auction.bidder = auction.bidder_type = auction.bidder_id = None
+            auction.bid_count = 0
+            auction.proxies.clear()
+        self._queue("DELETE FROM proxy_bids WHERE guild_id=?", (self.guild_id,))
+
+    # ---------- WRITE-BEHIND ----------
+    def _queue(self, sql, params):
+        self._pending.append((sql, params))
+        self._schedule_flush()
+
+    def _schedule_flush(self, delay=WRITE_BEHIND_DELAY):
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later(delay))
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            pass   # logged and queued again by flush()
+
+    async def flush(self):
+        # serialized, so returning means every write queued before the call is on disk,
+        # including a batch the write-behind task had already picked up. A failed batch is
+        # kept for a retry and the error re-raised, so callers about to archive or settle stop.
+        async with self._flush_lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            try:
+                async with self.db.transaction() as tx:
+                    for sql, params in pending:
+                        tx.query(sql, params)
+            except Exception as e:
+                # the bids were accepted already: keep them, ahead of anything queued meanwhile, and retry
+                self._pending = pending + self._pending
+                self._schedule_flush(WRITE_BEHIND_RETRY)
+                print(f"Failed to persist {len(pending)} auction writes, retrying:", e)
+                raise
+
+    # ---------- RECOVERY ----------
+    async def load(self):
+        """Rebuild this guild's live auctions from live_auctions + the latest row per item in bids."""
+        for r in await self.db.fetchall("SELECT item_type, item_id, base_price, channel_id FROM live_auctions WHERE guild_id=?", (self.guild_id,)):
+            auction = Auction(r["item_type"], r["item_id"], r["base_price"], self.min_increment_percent, r["channel_id"])
+            self.auctions[auction.key] = auction
+        # bids are looked up per live item (idx_bids_item), so restoring one guild never scans
+        # another guild's bids. Every bid row is queued after its live_auctions row.
+        rows = await self.db.fetchall(
+            "SELECT b.item_type, b.item_id, b.bidder, b.bidder_type, b.bidder_id, b.amount, latest.n FROM bids b "
+            "JOIN (SELECT MAX(bids.id) AS id, COUNT(*) AS n FROM live_auctions l "
+            "      JOIN bids ON bids.item_type = l.item_type AND bids.item_id = l.item_id "
+            "      WHERE l.guild_id = ? GROUP BY bids.item_type, bids.item_id) latest ON b.id = latest.id",
+            (self.guild_id,))
+        for r in rows:
+            auction = self.auctions.get((r["item_type"], r["item_id"]))
+            if auction is None:
+                continue
+            auction.high_bid = int(r["amount"])
+            auction.bidder = r["bidder"]
+            auction.bidder_type = r["bidder_type"]
+            auction.bidder_id = r["bidder_id"]
+            auction.bid_count = int(r["n"])
+        # registration order (rowid) keeps tie-breaks as they were
+        for r in await self.db.fetchall("SELECT item_type, item_id, owner_type, owner_id, label, max_amount FROM proxy_bids "
+                                        "WHERE guild_id=? ORDER BY rowid", (self.guild_id,)):
+            auction = self.auctions.get((r["item_type"], r["item_id"]))
+            if auction is not None:
+                self._proxy_seq += 1
+                owner = (r["owner_type"], r["owner_id"], r["label"])
+                auction.proxies[owner[:2]] = (int(r["max_amount"]), self._proxy_seq, owner)
+        return list(self.auctions.values())
+
+# ---------- DEADLINES ----------
+class DeadlineScheduler:
+    """
+    One coroutine (run()) drives every auction deadline off a min-heap, instead of a task
+    pair per bid. schedule() on a key that is already pending only moves its deadline in
+    the entries dict; the stale heap slot is re-pushed with the real deadline when it
+    surfaces, so extending an auction costs no heap work and no new tasks.
+    callback(key, payload) is awaited in its own task when a deadline passes.
+    """
+    def __init__(self, callback):
+        self.callback = callback
+        self.entries = {}   # key -> [deadline, payload]
+        self._heap = []     # (deadline, seq, key); may lag behind entries
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self.fired = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    @property
+    def pending(self):
+        return len(self.entries)
+
+    def schedule(self, key, delay, payload=None):
+        deadline = asyncio.get_running_loop().time() + delay
+        entry = self.entries.get(key)
+        if entry is not None and deadline >= entry[0]:
+            # extension: the existing heap slot fires early and gets re-pushed
+            entry[0] = deadline
+            entry[1] = payload
+            return deadline
+        self.entries[key] = [deadline, payload]
+        self._push(deadline, key)
+        return deadline
+
+    def cancel(self, key):
+        return self.entries.pop(key, None) is not None
+
+    def deadline(self, key):
+        entry = self.entries.get(key)
+        return entry[0] if entry else None
+
+    def stats(self):
+        return {"pending": self.pending, "fired": self.fired,
+                "last_lag": self.last_lag, "max_lag": self.max_lag}
+
+    def _push(self, deadline, key):
+        self._seq += 1
+        heapq.heappush(self._heap, (deadline, self._seq, key))
+        if self._heap[0][2] == key:
+            self._wakeup.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, key = heapq.heappop(self._heap)
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue   # cancelled or already fired
+                if entry[0] > now:
+                    self._push(entry[0], key)   # extended since this slot was pushed
+                    continue
+                del self.entries[key]
+                self.fired += 1
+                self.last_lag = now - entry[0]
+                self.max_lag = max(self.max_lag, self.last_lag)
+                asyncio.ensure_future(self._fire(key, entry[1]))
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key, payload):
+        try:
+            await self.callback(key, payload)
+        except Exception as e:
+            print(f"Deadline callback failed for {key}:", e)
@@ -0,0 +1,158 @@
+# buffered audit log with time-based segments and gzip archival
+import asyncio
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+AUDIT_FLUSH_INTERVAL = 1.0      # seconds entries may wait in memory before being written
+AUDIT_BUFFER_MAX = 500          # flush right away once this many entries are waiting
+AUDIT_INSERT_ROWS = 400         # rows per multi-row INSERT (2 bound values each, under sqlite's 999 limit)
+AUDIT_SEGMENT_SECONDS = 86400   # one segment per UTC day
+AUDIT_HOT_SEGMENTS = 7          # segments kept in audit_logs; older ones are archived
+AUDIT_ARCHIVE_DIR = "audit_archive"
+ARCHIVE_CHUNK = 5000            # rows read per query while archiving a segment
+LEGACY_SEGMENT = "0000-00-00T00:00:00"   # rows written before segments existed; sorts oldest
+
+def _utc(ts):
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+def _stamp(ts):
+    # same format as sqlite's datetime('now')
+    return _utc(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+def segment_key(ts=None, seconds=AUDIT_SEGMENT_SECONDS):
+    ts = time.time() if ts is None else ts
+    return _utc(ts - ts % seconds).strftime("%Y-%m-%dT%H:%M:%S")
+
+class AuditLog:
+    """
+    log() only appends to an in-memory buffer; a background flush writes everything
+    waiting as one multi-row INSERT (one statement, one commit) per interval.
+    Units of work that move money keep their audit row inside their own transaction
+    instead, so the record can never be lost without the change it describes.
+
+    audit_logs is cut into time segments by id range (audit_segments: first_id..last_id).
+    rotate() closes the open segment when its period is over, and archive() gzips every
+    segment beyond the newest `hot_segments` to archive_dir and deletes its rows, so the
+    hot table stays bounded.
+    """
+    def __init__(self, db, archive_dir=AUDIT_ARCHIVE_DIR, flush_interval=AUDIT_FLUSH_INTERVAL,
+                 buffer_max=AUDIT_BUFFER_MAX, segment_seconds=AUDIT_SEGMENT_SECONDS, hot_segments=AUDIT_HOT_SEGMENTS):
+        self.db = db
+        self.archive_dir = archive_dir
+        self.flush_interval = flush_interval
+        self.buffer_max = buffer_max
+        self.segment_seconds = segment_seconds
+        self.hot_segments = hot_segments
+        self._buffer = []   # (unix time, entry), oldest first; formatted when written
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._segment = None   # key of the open segment, loaded on first flush
+
+    # ---------- WRITING ----------
+    def log(self, entry):
+        self._buffer.append((time.time(), str(entry)))
+        if len(self._buffer) >= self.buffer_max:
+            asyncio.ensure_future(self.flush())
+        elif self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            await self._load_segment()
+            batch, self._buffer = self._buffer, []
+            key = segment_key(seconds=self.segment_seconds)
+            if not batch and key <= self._segment:
+                return
+            try:
+                async with self.db.transaction() as tx:
+                    if key > self._segment:
+                        self._rotate(tx, key)
+                    for i in range(0, len(batch), AUDIT_INSERT_ROWS):
+                        chunk = batch[i:i + AUDIT_INSERT_ROWS]
+                        tx.query("INSERT INTO audit_logs (timestamp, entry) VALUES " + ",".join(["(?,?)"] * len(chunk)),
+                                 [v for ts, entry in chunk for v in (_stamp(ts), entry)])
+            except Exception as e:
+                # keep the entries for the next attempt, ahead of anything logged meanwhile
+                self._buffer = batch + self._buffer
+                print("Failed to write audit log:", e)
+                return
+            if key > self._segment:
+                self._segment = key
+
+    async def _load_segment(self):
+        if self._segment is not None:
+            return
+        row = await self.db.fetchone("SELECT segment FROM audit_segments WHERE last_id IS NULL ORDER BY segment DESC LIMIT 1")
+        if row:
+            self._segment = row["segment"]
+            return
+        # first run: everything already in the table becomes one closed segment
+        self._segment = segment_key(seconds=self.segment_seconds)
+        async with self.db.transaction() as tx:
+            tx.query("INSERT OR IGNORE INTO audit_segments (segment, first_id, last_id) "
+                     "SELECT ?, MIN(id), MAX(id) FROM audit_logs HAVING COUNT(*) > 0", (LEGACY_SEGMENT,))
+            tx.query("INSERT OR IGNORE INTO audit_segments (segment, first_id) "
+                     "SELECT ?, COALESCE(MAX(id), 0) + 1 FROM audit_logs", (self._segment,))
+
+    def _rotate(self, tx, key):
+        # rows are assigned to segments by id, so direct inserts from other units of work are covered too
+        tx.query("UPDATE audit_segments SET last_id = (SELECT COALESCE(MAX(id), 0) FROM audit_logs) WHERE last_id IS NULL")
+        tx.query("INSERT OR IGNORE INTO audit_segments (segment, first_id) SELECT ?, COALESCE(MAX(id), 0) + 1 FROM audit_logs", (key,))
+
+    async def rotate(self):
+        # flush() rotates whenever the period changed, even with nothing buffered
+        await self.flush()
+
+    # ---------- READING ----------
+    def pending(self, limit=None):
+        """Buffered (timestamp, entry) pairs not yet written, newest first."""
+        rows = self._buffer[::-1] if limit is None else self._buffer[:-limit - 1:-1]
+        return [(_stamp(ts), entry) for ts, entry in rows]
+
+    # ---------- ARCHIVAL ----------
+    async def archive(self):
+        """Gzip and drop every closed segment older than the newest `hot_segments`. Returns the files written."""
+        await self.rotate()
+        segments = await self.db.fetchall("SELECT segment, first_id, last_id FROM audit_segments WHERE archived_at IS NULL ORDER BY segment DESC")
+        written = []
+        for seg in segments[self.hot_segments:]:
+            if seg["last_id"] is None:
+                continue
+            path, count = await self._archive_segment(seg)
+            async with self.db.transaction() as tx:
+                tx.query("DELETE FROM audit_logs WHERE id BETWEEN ? AND ?", (seg["first_id"], seg["last_id"]))
+                tx.query("UPDATE audit_segments SET archived_at=datetime('now'), archive_path=?, entries=? WHERE segment=?",
+                         (path, count, seg["segment"]))
+            written.append(path)
+        return written
+
+    async def _archive_segment(self, seg):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        name = "audit-" + seg["segment"].replace(":", "") + ".jsonl.gz"
+        path = os.path.join(self.archive_dir, name)
+        tmp = path + ".tmp"
+        count, after = 0, seg["first_id"] - 1
+        out = await asyncio.to_thread(gzip.open, tmp, "wt", encoding="utf-8")
+        try:
+            while True:
+                rows = await self.db.fetchall("SELECT id, timestamp, entry FROM audit_logs WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                                              (after, seg["last_id"], ARCHIVE_CHUNK))
+                if not rows:
+                    break
+                lines = "".join(json.dumps({"id": r["id"], "timestamp": r["timestamp"], "entry": r["entry"]}) + "\n" for r in rows)
+                await asyncio.to_thread(out.write, lines)
+                count += len(rows)
+                after = rows[-1]["id"]
+        finally:
+            await asyncio.to_thread(out.close)
+        # the rows are only deleted once the archive is complete on disk
+        await asyncio.to_thread(os.replace, tmp, path)
+        return path, count
@@ -0,0 +1,87 @@
+# read-through cache for hot entity rows (clubs, groups, duelists, memberships)
+import asyncio
+import time
+from collections import OrderedDict
+
+CACHE_MAX_ENTRIES = 10000   # least recently used entries are evicted beyond this
+CACHE_TTL = 60              # seconds an entry is trusted; bounds staleness for writes made outside the bot
+
+class EntityCache:
+    """
+    get(kind, key, load) returns the cached value for (kind, key) or awaits load() for it;
+    concurrent misses on one key share a single load. "Not found" (None) is cached too, so
+    the write path that creates an entity must invalidate its key.
+
+    Entries expire after `ttl` seconds and the least recently used go first once there are
+    more than `max_entries`. Write paths call invalidate(kind, key) once their change has
+    committed; a load that was in flight across an invalidation is returned to its callers
+    but not stored. `on_lookup(kind, result)` (result: 'hit' | 'miss') feeds the metrics.
+    """
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # (kind, key) -> (expires, value), least recently used first
+        self._loading = {}              # (kind, key) -> future of the load in flight
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+        self.on_lookup = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, kind, key, load):
+        k = (kind, key)
+        entry = self._entries.get(k)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(k)
+            self._count(self.hits, kind, "hit")
+            return entry[1]
+        self._count(self.misses, kind, "miss")
+        fut = self._loading.get(k)
+        if fut is not None:
+            return await asyncio.shield(fut)
+        fut = self._loading[k] = asyncio.get_running_loop().create_future()
+        try:
+            value = await load()
+        except BaseException as e:
+            if self._loading.get(k) is fut:
+                del self._loading[k]
+            if isinstance(e, Exception):
+                fut.set_exception(e)
+                fut.exception()   # retrieved: waiters re-raise it, nobody else has to
+            else:
+                fut.cancel()
+            raise
+        if self._loading.get(k) is fut:
+            del self._loading[k]
+            self._store(k, value)
+        fut.set_result(value)
+        return value
+
+    def _store(self, k, value):
+        self._entries[k] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(k)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _count(self, counts, kind, result):
+        counts[kind] = counts.get(kind, 0) + 1
+        if self.on_lookup is not None:
+            self.on_lookup(kind, result)
+
+    def invalidate(self, kind, key):
+        k = (kind, key)
+        self._entries.pop(k, None)
+        self._loading.pop(k, None)   # a load already running won't store what it read
+
+    def clear(self):
+        self._entries.clear()
+        self._loading.clear()
+
+    def stats(self):
+        """{kind: (hits, misses)} plus totals, for sizing max_entries / ttl."""
+        kinds = sorted(set(self.hits) | set(self.misses))
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "evictions": self.evictions,
+                "kinds": {kind: (self.hits.get(kind, 0), self.misses.get(kind, 0)) for kind in kinds}}
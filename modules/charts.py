@@ -0,0 +1,67 @@
+# market-history charts: per-club series off club_market_rollups, drawn as SVG
+from datetime import datetime, timedelta
+from html import escape
+
+from modules.clubs import MARKET_BUCKETS
+
+# range -> (rollup resolution, days shown); every range reads the coarsest rollup that still draws it smoothly
+CHART_RANGES = {
+    "day": ("hour", 1),
+    "week": ("hour", 7),
+    "month": ("day", 30),
+    "year": ("week", 365),
+    "all": ("week", None),
+}
+CHART_WIDTH = 720
+CHART_HEIGHT = 320
+CHART_PADDING = 48
+CHART_CACHE_MAX = 512   # rendered charts kept by the bot, one per (club, range)
+
+def series_query(club_id, chart_range, now=None):
+    """(sql, params) for a chart's points, oldest first, read straight off the rollups' primary key."""
+    resolution, days = CHART_RANGES[chart_range]
+    sql = "SELECT bucket, open, high, low, close FROM club_market_rollups WHERE club_id=? AND resolution=?"
+    params = (club_id, resolution)
+    if days is not None:
+        sql += f" AND bucket >= {MARKET_BUCKETS[resolution].format(ts='?')}"
+        params += (((now or datetime.now()) - timedelta(days=days)).isoformat(),)
+    return sql + " ORDER BY bucket", params
+
+def render_svg(title, points, width=CHART_WIDTH, height=CHART_HEIGHT):
+    """
+    Line chart of the closing values over the high-low band. `points` are rollup rows
+    (bucket, high, low, close), oldest first. Returns the SVG document as a string.
+    """
+    pad = CHART_PADDING
+    lo = min(p["low"] for p in points) if points else 0
+    hi = max(p["high"] for p in points) if points else 1
+    span = (hi - lo) or 1
+    step = (width - 2 * pad) / max(1, len(points) - 1)
+    def x(i):
+        return round(pad + i * step, 1)
+    def y(value):
+        return round(height - pad - (value - lo) * (height - 2 * pad) / span, 1)
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}" '
+             f'font-family="sans-serif" font-size="12">',
+             f'<rect width="{width}" height="{height}" fill="#ffffff"/>',
+             f'<text x="{pad}" y="{pad // 2}" font-size="15" font-weight="bold">{escape(title)}</text>',
+             f'<line x1="{pad}" y1="{height - pad}" x2="{width - pad}" y2="{height - pad}" stroke="#999999"/>',
+             f'<line x1="{pad}" y1="{pad}" x2="{pad}" y2="{height - pad}" stroke="#999999"/>']
+    if not points:
+        parts.append(f'<text x="{width // 2}" y="{height // 2}" text-anchor="middle" fill="#666666">no market history</text>')
+    else:
+        band = [f"{x(i)},{y(p['high'])}" for i, p in enumerate(points)] + \
+               [f"{x(i)},{y(p['low'])}" for i, p in reversed(list(enumerate(points)))]
+        parts.append(f'<polygon points="{" ".join(band)}" fill="#2b6cb0" fill-opacity="0.15" stroke="none"/>')
+        if len(points) == 1:
+            parts.append(f'<circle cx="{x(0)}" cy="{y(points[0]["close"])}" r="3" fill="#2b6cb0"/>')
+        else:
+            line = " ".join(f"{x(i)},{y(p['close'])}" for i, p in enumerate(points))
+            parts.append(f'<polyline points="{line}" fill="none" stroke="#2b6cb0" stroke-width="2"/>')
+        parts += [f'<text x="{pad - 6}" y="{pad + 4}" text-anchor="end">{hi}</text>',
+                  f'<text x="{pad - 6}" y="{height - pad + 4}" text-anchor="end">{lo}</text>',
+                  f'<text x="{pad}" y="{height - pad + 18}">{escape(points[0]["bucket"])}</text>',
+                  f'<text x="{width - pad}" y="{height - pad + 18}" text-anchor="end">{escape(points[-1]["bucket"])}</text>',
+                  f'<text x="{width - pad}" y="{pad // 2}" text-anchor="end">last {points[-1]["close"]}</text>']
+    parts.append("</svg>")
+    return "\n".join(parts)
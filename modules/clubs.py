@@ -1 +1,49 @@
 # club balance adjust module
+import random
+from datetime import datetime, timedelta
+
+MARKET_TICK_INTERVAL = 3600  # seconds between market revaluations of one guild's clubs
+MARKET_FLOOR = 100           # a club's market value never drops below this
+MARKET_VOLATILITY = 0.03     # random drift per tick, +/- this fraction
+MARKET_BID_FACTOR = 0.001    # extra growth per bid on record (beyond the first)
+
+# club_market_rollups resolutions: bucket of a club_market_history timestamp, as sqlite
+# expressions over `{ts}` (isoformat strings; weeks start on Monday)
+MARKET_BUCKETS = {
+    "hour": "strftime('%Y-%m-%dT%H:00', {ts})",
+    "day": "date({ts})",
+    "week": "date({ts}, 'weekday 0', '-6 days')",
+}
+
+def next_market_value(base, bid_count):
+    bid_factor = max(0, bid_count - 1) * MARKET_BID_FACTOR
+    change = random.uniform(-MARKET_VOLATILITY, MARKET_VOLATILITY) + bid_factor
+    return int(max(MARKET_FLOOR, base * (1 + change)))
+
+async def run_market_tick(db, guild_id, bid_counts, ticks=1, due=None):
+    """
+    Revalue every club of one guild in one pass and write the new values plus their
+    club_market_history rows in a single transaction.
+    bid_counts maps club id (str) -> bids on record, e.g. AuctionEngine.bid_counts("club").
+    ticks > 1 catches up ticks missed while the bot was down: each club steps through all
+    of them (bids only count towards the first), one history row per tick, still one pass.
+    `due` is the unix time the first of them was due; tick k is stamped due + k intervals
+    (without it, the last tick is stamped now). Returns {club_id: new_value}.
+    """
+    clubs = await db.fetchall("SELECT id, value, base_price FROM club WHERE guild_id=?", (guild_id,))
+    if not clubs:
+        return {}
+    first = datetime.fromtimestamp(due) if due is not None else datetime.now() - timedelta(seconds=MARKET_TICK_INTERVAL * (ticks - 1))
+    stamps = [(first + timedelta(seconds=MARKET_TICK_INTERVAL * i)).isoformat() for i in range(ticks)]
+    values = {}
+    async with db.transaction() as tx:
+        for c in clubs:
+            value = int(c["value"] or c["base_price"] or 0)
+            for i, stamp in enumerate(stamps):
+                value = next_market_value(value, bid_counts.get(str(c["id"]), 0) if i == 0 else 0)
+                tx.query("INSERT INTO club_market_history (club_id, timestamp, value) VALUES (?,?,?)", (c["id"], stamp, value))
+            values[c["id"]] = value
+            tx.query("UPDATE club SET value=? WHERE id=?", (value, c["id"]))
+        entry = f"Market updated for {len(values)} clubs in guild {guild_id}"
+        tx.query("INSERT INTO audit_logs (entry) VALUES (?)", (entry + (f" ({ticks} ticks caught up)" if ticks > 1 else ""),))
+    return values
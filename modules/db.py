@@ -0,0 +1,585 @@
+# sqlite helper + async data access layer
+import asyncio
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from modules.clubs import MARKET_BUCKETS
+
+READ_POOL_SIZE = 4   # read-only connections used by AsyncDB
+GROUP_COMMIT_MAX = 256   # flush a group-commit batch early once it holds this many units
+VACUUM_PAGES = 2000      # free pages handed back to the filesystem per incremental vacuum
+VACUUM_INTERVAL = 3600   # seconds between incremental vacuums
+
+SCHEMA = """
+BEGIN TRANSACTION;
+CREATE TABLE IF NOT EXISTS investor_groups (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, funds INTEGER DEFAULT 0);
+CREATE TABLE IF NOT EXISTS groups_members (id INTEGER PRIMARY KEY AUTOINCREMENT, group_name TEXT, user_id TEXT);
+CREATE TABLE IF NOT EXISTS personal_wallets (user_id TEXT PRIMARY KEY, balance INTEGER DEFAULT 0);
+CREATE TABLE IF NOT EXISTS user_profiles (user_id TEXT PRIMARY KEY, bio TEXT, banner TEXT, color TEXT, created_at TEXT);
+CREATE TABLE IF NOT EXISTS club (id INTEGER PRIMARY KEY, name TEXT UNIQUE, base_price INTEGER, slogan TEXT, logo TEXT, banner TEXT, value INTEGER, manager_id TEXT);
+CREATE TABLE IF NOT EXISTS club_market_history (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, value INTEGER);
+CREATE TABLE IF NOT EXISTS bids (id INTEGER PRIMARY KEY AUTOINCREMENT, bidder TEXT, amount INTEGER, item_type TEXT, item_id TEXT, timestamp TEXT DEFAULT (datetime('now')));
+CREATE TABLE IF NOT EXISTS club_history (id INTEGER PRIMARY KEY AUTOINCREMENT, winner TEXT, amount INTEGER, timestamp TEXT, market_value_at_sale INTEGER);
+CREATE TABLE IF NOT EXISTS audit_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, entry TEXT, timestamp TEXT DEFAULT (datetime('now')));
+CREATE TABLE IF NOT EXISTS duelists (id INTEGER PRIMARY KEY AUTOINCREMENT, discord_user_id TEXT, username TEXT, avatar_url TEXT, base_price INTEGER, expected_salary INTEGER, registered_at TEXT, owned_by TEXT);
+CREATE TABLE IF NOT EXISTS duelist_contracts (id INTEGER PRIMARY KEY AUTOINCREMENT, duelist_id INTEGER, club_owner TEXT, purchase_price INTEGER, salary INTEGER, signed_at TEXT);
+CREATE TABLE IF NOT EXISTS wallet_transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, amount INTEGER, type TEXT, timestamp TEXT DEFAULT (datetime('now')));
+COMMIT;
+"""
+
+# ---------- MIGRATIONS ----------
+def _market_rollup_trigger():
+    # every club_market_history insert folds into its hour, day and week bucket
+    upserts = "".join(
+        f"INSERT INTO club_market_rollups (club_id, resolution, bucket, open, high, low, close, samples) "
+        f"VALUES (NEW.club_id, '{res}', {bucket.format(ts='NEW.timestamp')}, NEW.value, NEW.value, NEW.value, NEW.value, 1) "
+        f"ON CONFLICT (club_id, resolution, bucket) DO UPDATE SET high = MAX(high, excluded.high), "
+        f"low = MIN(low, excluded.low), close = excluded.close, samples = samples + 1; "
+        for res, bucket in MARKET_BUCKETS.items())
+    return (f"CREATE TRIGGER IF NOT EXISTS club_market_history_rollup AFTER INSERT ON club_market_history "
+            f"WHEN NEW.club_id IS NOT NULL AND date(NEW.timestamp) IS NOT NULL BEGIN {upserts}END")
+
+def _market_rollup_backfill(res):
+    # the same buckets for the history already on file, first and last value by id
+    bucket = MARKET_BUCKETS[res].format(ts="timestamp")
+    return ("INSERT OR REPLACE INTO club_market_rollups (club_id, resolution, bucket, open, high, low, close, samples) "
+            f"SELECT club_id, '{res}', bucket, MIN(first), MAX(value), MIN(value), MIN(last), COUNT(*) FROM ("
+            f"SELECT club_id, {bucket} AS bucket, value, FIRST_VALUE(value) OVER w AS first, "
+            "LAST_VALUE(value) OVER (w ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS last "
+            "FROM club_market_history WHERE club_id IS NOT NULL AND date(timestamp) IS NOT NULL "
+            f"WINDOW w AS (PARTITION BY club_id, {bucket} ORDER BY id)) "
+            "GROUP BY club_id, bucket")
+
+def _rebuild(table, create_sql):
+    # sqlite can't change a table's constraints in place: create the new shape, copy every
+    # column the two have in common, swap. Indexes on the old table go with it.
+    def step(conn):
+        old = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+        conn.execute(create_sql.replace(f"CREATE TABLE {table} ", f"CREATE TABLE {table}_rebuild ", 1))
+        new = {r[1] for r in conn.execute(f"PRAGMA table_info({table}_rebuild)")}
+        cols = ", ".join(c for c in old if c in new)
+        conn.execute(f"INSERT INTO {table}_rebuild ({cols}) SELECT {cols} FROM {table}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+    return step
+
+# (version, steps) applied in order at startup, each version in its own transaction.
+# A step is a SQL string or a callable taking the connection (for backfills).
+# Never edit a shipped version: append a new one.
+MIGRATIONS = [
+    (1, [
+        # open auctions (base price + announce channel) so the engine can rebuild after a restart
+        "CREATE TABLE IF NOT EXISTS live_auctions (item_type TEXT, item_id TEXT, base_price INTEGER, channel_id INTEGER, PRIMARY KEY (item_type, item_id))",
+        # bid lookups and finalize filter by item; id makes "latest bid" an index walk
+        "CREATE INDEX IF NOT EXISTS idx_bids_item ON bids (item_type, item_id, id)",
+        # memberships are unique per group: drop duplicates before enforcing it
+        "DELETE FROM groups_members WHERE id NOT IN (SELECT MIN(id) FROM groups_members GROUP BY group_name, user_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_groups_members ON groups_members (group_name, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_groups_members_user ON groups_members (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_duelist_contracts_duelist ON duelist_contracts (duelist_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_duelists_user ON duelists (discord_user_id, id)",
+        # audit_logs.id is the rowid, so ORDER BY id DESC already walks the table b-tree backwards
+    ]),
+    (2, [
+        # market history per club (rows written before this have no club and stay NULL)
+        "ALTER TABLE club_market_history ADD COLUMN club_id INTEGER",
+        "CREATE INDEX IF NOT EXISTS idx_club_market_history_club ON club_market_history (club_id, id)",
+    ]),
+    (3, [
+        # daily sale rollups (see modules/history.py), backfilled once from the full history; sales
+        # from before owner identities (migration 4) have no group on record
+        "CREATE TABLE IF NOT EXISTS auction_rollups (day TEXT, item_type TEXT, winner TEXT, group_name TEXT, sales INTEGER, volume INTEGER, PRIMARY KEY (day, item_type, winner))",
+        "CREATE INDEX IF NOT EXISTS idx_auction_rollups_group ON auction_rollups (group_name, day)",
+        "INSERT INTO auction_rollups (day, item_type, winner, sales, volume) "
+        "SELECT date(timestamp), 'club', winner, COUNT(*), SUM(amount) FROM club_history WHERE date(timestamp) IS NOT NULL GROUP BY date(timestamp), winner",
+        "INSERT INTO auction_rollups (day, item_type, winner, sales, volume) "
+        "SELECT date(signed_at), 'duelist', club_owner, COUNT(*), SUM(purchase_price) FROM duelist_contracts WHERE date(signed_at) IS NOT NULL GROUP BY date(signed_at), club_owner",
+    ]),
+    (4, [
+        # owner identity: type ('user' | 'group') + numeric id (discord user id / investor_groups.id).
+        # The old text columns stay as display labels; rows written before this have no identity
+        # on record and keep NULL (the labels are not parsed back into owners).
+        "ALTER TABLE bids ADD COLUMN bidder_type TEXT",
+        "ALTER TABLE bids ADD COLUMN bidder_id INTEGER",
+        "ALTER TABLE duelists ADD COLUMN owner_type TEXT",
+        "ALTER TABLE duelists ADD COLUMN owner_id INTEGER",
+        "ALTER TABLE duelist_contracts ADD COLUMN owner_type TEXT",
+        "ALTER TABLE duelist_contracts ADD COLUMN owner_id INTEGER",
+        "ALTER TABLE club_history ADD COLUMN winner_type TEXT",
+        "ALTER TABLE club_history ADD COLUMN winner_id INTEGER",
+        "ALTER TABLE club_history ADD COLUMN club_id INTEGER",
+        "CREATE INDEX IF NOT EXISTS idx_bids_bidder ON bids (bidder_type, bidder_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_duelists_owner ON duelists (owner_type, owner_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_duelist_contracts_owner ON duelist_contracts (owner_type, owner_id)",
+        "CREATE INDEX IF NOT EXISTS idx_club_history_winner ON club_history (winner_type, winner_id)",
+        "CREATE INDEX IF NOT EXISTS idx_club_history_club ON club_history (club_id, id)",
+    ]),
+    (5, [
+        # audit_logs is cut into time segments by id range; old segments are archived (modules/audit.py)
+        "CREATE TABLE IF NOT EXISTS audit_segments (segment TEXT PRIMARY KEY, first_id INTEGER, last_id INTEGER, "
+        "entries INTEGER, archived_at TEXT, archive_path TEXT)",
+    ]),
+    (6, [
+        # wallet / group fund ledger (modules/finance.py): append-only entries + periodic balance snapshots
+        "CREATE TABLE IF NOT EXISTS ledger_entries (id INTEGER PRIMARY KEY AUTOINCREMENT, account_type TEXT NOT NULL, "
+        "account_id INTEGER NOT NULL, amount INTEGER NOT NULL, balance_after INTEGER NOT NULL, kind TEXT, memo TEXT, "
+        "batch TEXT, created_at TEXT DEFAULT (datetime('now')))",
+        "CREATE INDEX IF NOT EXISTS idx_ledger_entries_account ON ledger_entries (account_type, account_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_ledger_entries_batch ON ledger_entries (batch)",
+        "CREATE TRIGGER IF NOT EXISTS ledger_entries_no_update BEFORE UPDATE ON ledger_entries "
+        "BEGIN SELECT RAISE(ABORT, 'ledger_entries is append-only'); END",
+        "CREATE TRIGGER IF NOT EXISTS ledger_entries_no_delete BEFORE DELETE ON ledger_entries "
+        "BEGIN SELECT RAISE(ABORT, 'ledger_entries is append-only'); END",
+        "CREATE TABLE IF NOT EXISTS ledger_snapshots (account_type TEXT, account_id INTEGER, entry_id INTEGER, balance INTEGER, "
+        "taken_at TEXT DEFAULT (datetime('now')), PRIMARY KEY (account_type, account_id, entry_id))",
+        # existing balances enter the ledger as opening entries, so balance == sum(entries) from here on
+        "INSERT INTO ledger_entries (account_type, account_id, amount, balance_after, kind) "
+        "SELECT 'user', CAST(user_id AS INTEGER), balance, balance, 'opening' FROM personal_wallets WHERE balance != 0",
+        "INSERT INTO ledger_entries (account_type, account_id, amount, balance_after, kind) "
+        "SELECT 'group', id, funds, funds, 'opening' FROM investor_groups WHERE funds != 0",
+    ]),
+    (7, [
+        # every auction table is partitioned by guild (modules/guilds.py). Rows from before
+        # sharding get guild 0 until a guild claims them (LEGACY_GUILD_ID in bot.py).
+        # Club and group names become unique per guild instead of globally.
+        _rebuild("club", "CREATE TABLE club (id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL DEFAULT 0, name TEXT, base_price INTEGER, "
+                 "slogan TEXT, logo TEXT, banner TEXT, value INTEGER, manager_id TEXT, UNIQUE (guild_id, name))"),
+        _rebuild("investor_groups", "CREATE TABLE investor_groups (id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER NOT NULL DEFAULT 0, "
+                 "name TEXT, funds INTEGER DEFAULT 0, UNIQUE (guild_id, name))"),
+        _rebuild("auction_rollups", "CREATE TABLE auction_rollups (guild_id INTEGER NOT NULL DEFAULT 0, day TEXT, item_type TEXT, winner TEXT, "
+                 "group_name TEXT, sales INTEGER, volume INTEGER, PRIMARY KEY (guild_id, day, item_type, winner))"),
+        "CREATE INDEX IF NOT EXISTS idx_auction_rollups_group ON auction_rollups (guild_id, group_name, day)",
+        "CREATE INDEX IF NOT EXISTS idx_club_guild ON club (guild_id, id)",
+        "ALTER TABLE groups_members ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0",
+        "DROP INDEX IF EXISTS ux_groups_members",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_groups_members ON groups_members (guild_id, group_name, user_id)",
+        "ALTER TABLE duelists ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_duelists_guild ON duelists (guild_id, id)",
+        "ALTER TABLE live_auctions ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0",
+        # auctions only known from their bids (older than live_auctions) get a row, so restore can go by live item
+        "INSERT OR IGNORE INTO live_auctions (item_type, item_id, base_price) "
+        "SELECT b.item_type, b.item_id, COALESCE(c.base_price, d.base_price, 0) FROM (SELECT DISTINCT item_type, item_id FROM bids) b "
+        "LEFT JOIN club c ON b.item_type = 'club' AND c.id = CAST(b.item_id AS INTEGER) "
+        "LEFT JOIN duelists d ON b.item_type = 'duelist' AND d.id = CAST(b.item_id AS INTEGER)",
+        "CREATE INDEX IF NOT EXISTS idx_live_auctions_guild ON live_auctions (guild_id)",
+        "ALTER TABLE bids ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE club_history ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_club_history_guild ON club_history (guild_id, id)",
+        "ALTER TABLE duelist_contracts ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0",
+    ]),
+    (8, [
+        # durable delayed jobs (modules/jobs.py): auction deadlines and periodic ticks outlive the process
+        "CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, key TEXT NOT NULL, "
+        "guild_id INTEGER NOT NULL DEFAULT 0, due_at REAL NOT NULL, every REAL, payload TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+        "claimed_by TEXT, claimed_until REAL NOT NULL DEFAULT 0, UNIQUE (kind, key))",
+        # the poller claims by due time; resuming one kind goes through the (kind, key) index
+        "CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (due_at)",
+    ]),
+    (9, [
+        # bids of finished auctions move here (modules/history.py archive_bids); `bids` only holds live auctions'
+        "CREATE TABLE IF NOT EXISTS bids_archive (id INTEGER PRIMARY KEY, guild_id INTEGER NOT NULL DEFAULT 0, bidder TEXT, "
+        "bidder_type TEXT, bidder_id INTEGER, amount INTEGER, item_type TEXT, item_id TEXT, timestamp TEXT, "
+        "archived_at TEXT DEFAULT (datetime('now')), reason TEXT)",
+        # exports walk one guild by (timestamp, id); profiles read a bidder's latest
+        "CREATE INDEX IF NOT EXISTS idx_bids_archive_guild ON bids_archive (guild_id, timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_bids_archive_bidder ON bids_archive (bidder_type, bidder_id, id)",
+    ]),
+    (10, [
+        # hidden maximums of proxy bidders on live auctions (AuctionEngine.set_proxy), restored with the auctions
+        "CREATE TABLE IF NOT EXISTS proxy_bids (guild_id INTEGER NOT NULL DEFAULT 0, item_type TEXT, item_id TEXT, owner_type TEXT, "
+        "owner_id INTEGER, label TEXT, max_amount INTEGER, created_at TEXT DEFAULT (datetime('now')), "
+        "PRIMARY KEY (item_type, item_id, owner_type, owner_id))",
+        "CREATE INDEX IF NOT EXISTS idx_proxy_bids_guild ON proxy_bids (guild_id)",
+    ]),
+    (11, [
+        # payroll (modules/finance.py run_payroll): misses wait on the contract until the next run pays them,
+        # every run keeps its lines under the ledger batch id it posted with
+        "ALTER TABLE duelist_contracts ADD COLUMN misses INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_duelist_contracts_guild ON duelist_contracts (guild_id, duelist_id, id)",
+        "CREATE TABLE IF NOT EXISTS payroll_lines (batch TEXT NOT NULL, guild_id INTEGER NOT NULL DEFAULT 0, contract_id INTEGER, "
+        "duelist_id INTEGER, payer_type TEXT, payer_id INTEGER, payee_id INTEGER, gross INTEGER, penalty INTEGER, net INTEGER, "
+        "status TEXT, created_at TEXT DEFAULT (datetime('now')), PRIMARY KEY (batch, contract_id))",
+    ]),
+    (12, [
+        # market history downsampled per club (modules/charts.py): open/high/low/close per hour, day and
+        # week, kept current by a trigger on insert and backfilled once from the rows on file
+        "CREATE TABLE IF NOT EXISTS club_market_rollups (club_id INTEGER NOT NULL, resolution TEXT NOT NULL, bucket TEXT NOT NULL, "
+        "open INTEGER, high INTEGER, low INTEGER, close INTEGER, samples INTEGER, "
+        "PRIMARY KEY (club_id, resolution, bucket)) WITHOUT ROWID",
+        _market_rollup_trigger(),
+        *(_market_rollup_backfill(res) for res in MARKET_BUCKETS),
+    ]),
+]
+
+# ---------- DATABASE HELPER ----------
+class RowCountMismatch(Exception):
+    """A statement queued with expect= touched a different number of rows; its unit was rolled back."""
+    def __init__(self, sql, expected, actual):
+        super().__init__(f"expected {expected} row(s), got {actual}: {sql}")
+        self.sql = sql
+        self.expected = expected
+        self.actual = actual
+
+class DB:
+    def __init__(self, path, schema_file=None, connect=True):
+        self.path = path
+        self.schema_file = schema_file
+        self.conn = None
+        self.ready = False   # connected, schema in place and migrated
+        self._tx_depth = 0
+        self.on_statement = None   # optional hook(sql, seconds, failed), called on the executing thread
+        if connect:
+            self.open()
+
+    def open(self):
+        # connect=False defers this (and the schema work) until the first query; see AsyncDB.open
+        if self.ready:
+            return
+        if self.conn is not None:
+            self.conn.close()   # a previous attempt failed half-way
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        # a new file gets incremental auto-vacuum; it has to be set before the first table exists
+        if not self.conn.execute("PRAGMA page_count").fetchone()[0]:
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL lets the read pool run alongside the writer; NORMAL only fsyncs at checkpoints
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._up_to_date():
+            self._ensure_schema()
+            self._migrate()
+        self.ready = True
+
+    def _up_to_date(self):
+        # warm start: one lookup instead of re-running the schema script and every migration check
+        has_versions = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_version'").fetchone()
+        if not has_versions:
+            return False
+        current = self.conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+        return current >= MIGRATIONS[-1][0]
+
+    def _ensure_schema(self):
+        # If schema file exists in same folder, use that; otherwise create minimal schema
+        if self.schema_file and os.path.exists(self.schema_file):
+            with open(self.schema_file, "r", encoding="utf-8") as f:
+                schema = f.read()
+        else:
+            schema = SCHEMA
+        self.conn.executescript(schema)
+        self.conn.commit()
+
+    def _migrate(self):
+        self.conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at TEXT DEFAULT (datetime('now')))")
+        self.conn.commit()
+        current = self.conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+        for version, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            with self.transaction():
+                for step in steps:
+                    if callable(step):
+                        step(self.conn)
+                    else:
+                        self.conn.execute(step)
+                self.conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+
+    def execute(self, cur, sql, params=()):
+        # every statement from query/fetchone/fetchall (and the read pool) goes through here
+        if self.on_statement is None:
+            return cur.execute(sql, params)
+        start = time.perf_counter()
+        try:
+            result = cur.execute(sql, params)
+        except Exception:
+            self.on_statement(sql, time.perf_counter() - start, True)
+            raise
+        self.on_statement(sql, time.perf_counter() - start, False)
+        return result
+
+    def query(self, sql, params=()):
+        cur = self.conn.cursor()
+        self.execute(cur, sql, params)
+        if not self._tx_depth:
+            self.conn.commit()
+        return cur
+
+    @contextmanager
+    def transaction(self):
+        # every query() inside the block shares one commit; any error rolls the whole block back
+        if not self._tx_depth and not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self._tx_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._tx_depth -= 1
+            if not self._tx_depth:
+                self.conn.rollback()
+            raise
+        self._tx_depth -= 1
+        if not self._tx_depth:
+            self.conn.commit()
+
+    def run_units(self, units):
+        # group commit: run many units of work in one transaction. each unit gets a savepoint,
+        # so a failing unit is rolled back on its own and reported instead of sinking the batch.
+        results = []
+        with self.transaction():
+            for statements in units:
+                self.conn.execute("SAVEPOINT unit")
+                try:
+                    cursors = []
+                    for statement in statements:
+                        cur = self.query(statement[0], statement[1])
+                        # (sql, params, expect, error): guarded statements abort their unit on a rowcount mismatch
+                        if len(statement) > 2 and statement[2] is not None and cur.rowcount != statement[2]:
+                            raise statement[3] or RowCountMismatch(statement[0], statement[2], cur.rowcount)
+                        cursors.append(cur)
+                except Exception as e:
+                    self.conn.execute("ROLLBACK TO unit")
+                    self.conn.execute("RELEASE unit")
+                    results.append(e)
+                else:
+                    self.conn.execute("RELEASE unit")
+                    results.append(cursors)
+        return results
+
+    def vacuum(self, pages=VACUUM_PAGES):
+        """
+        Hand up to `pages` free pages back to the filesystem. Returns (pages freed, pages
+        still free), or None for a file created before incremental auto-vacuum: converting
+        it is a full rewrite, left to enable_incremental_vacuum().
+        """
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return None
+        before = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # executescript steps the pragma to the end; execute() would free a single page
+        self.conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        after = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return before - after, after
+
+    def enable_incremental_vacuum(self):
+        """
+        Convert the file to incremental auto-vacuum with one full VACUUM. Every write waits
+        for the whole rewrite, so this is a maintenance step, never a periodic one. Returns
+        False if the file was already converted.
+        """
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("VACUUM")
+        return True
+
+    def fetchone(self, sql, params=()):
+        cur = self.conn.cursor()
+        self.execute(cur, sql, params)
+        return cur.fetchone()
+
+    def fetchall(self, sql, params=()):
+        cur = self.conn.cursor()
+        self.execute(cur, sql, params)
+        return cur.fetchall()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+# ---------- ASYNC ACCESS LAYER ----------
+class Transaction:
+    """
+    Unit of work for AsyncDB.transaction(): statements are collected while the block runs
+    and executed atomically on the writer thread when it exits. `cursors` holds the
+    executed cursors (same order as the statements) once the block has committed.
+    With `expect`, the whole unit is rolled back unless the statement touches exactly that
+    many rows, and `error` (or RowCountMismatch) is raised from the block, e.g. a guarded
+    "UPDATE ... WHERE balance + ? >= 0" that found no money.
+    on_commit(fn) queues fn() to run once the unit has committed, e.g. cache invalidation.
+    """
+    def __init__(self):
+        self.statements = []
+        self.cursors = []
+        self.callbacks = []
+
+    def on_commit(self, fn):
+        self.callbacks.append(fn)
+
+    def query(self, sql, params=(), expect=None, error=None):
+        if expect is None:
+            self.statements.append((sql, params))
+        else:
+            self.statements.append((sql, params, expect, error))
+
+class _UnitOfWork:
+    def __init__(self, adb):
+        self.adb = adb
+        self.tx = Transaction()
+
+    async def __aenter__(self):
+        return self.tx
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None and self.tx.statements:
+            self.tx.cursors = await self.adb.run_unit(self.tx.statements)
+            for fn in self.tx.callbacks:
+                fn()
+        return False
+
+class AsyncDB:
+    """
+    Awaitable wrapper around DB so coroutines never block the event loop on sqlite.
+    All writes run on one dedicated writer thread that owns the DB connection;
+    reads run on a small pool of read-only connections (one per reader thread).
+    With group_commit_ms > 0, writes arriving within that window are coalesced
+    into a single sqlite transaction (one fsync for the whole batch).
+    """
+    def __init__(self, db, readers=READ_POOL_SIZE, group_commit_ms=0):
+        self.db = db
+        self.path = db.path
+        self.group_commit_ms = group_commit_ms
+        self._batch = []
+        self._flush_handle = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        # an in-memory database can't be shared across connections, so reads go through the writer
+        if readers and self.path != ":memory:":
+            self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+        else:
+            self._readers = None
+        self._local = threading.local()
+        self._reader_conns = []
+        self._reader_conns_lock = threading.Lock()
+        self.on_statements = None   # optional hook(count), called on the event loop by the issuing task
+        self._opening = None
+
+    def _reader_conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = pathlib.Path(self.path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._reader_conns_lock:
+                self._reader_conns.append(conn)
+        return conn
+
+    def _read(self, sql, params, one):
+        cur = self.db.execute(self._reader_conn().cursor(), sql, params)
+        return cur.fetchone() if one else cur.fetchall()
+
+    async def _run(self, executor, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, fn, *args)
+
+    def open_soon(self):
+        """
+        Start connecting and bringing the schema up to date on the writer thread (once) and
+        return the concurrent future. Needs no event loop, so startup can kick it off before
+        the bot connects and overlap the two.
+        """
+        with self._reader_conns_lock:
+            if self._opening is None or (self._opening.done() and self._opening.exception()):
+                self._opening = self._writer.submit(self.db.open)
+            return self._opening
+
+    async def open(self):
+        # every query awaits this first, so a DB created with connect=False opens on first use
+        if not self.db.ready:
+            await asyncio.wrap_future(self.open_soon())
+
+    def _issued(self, count):
+        if self.on_statements is not None:
+            self.on_statements(count)
+
+    async def query(self, sql, params=()):
+        if not self.db.ready:
+            await self.open()
+        if self.group_commit_ms:
+            return (await self.run_unit([(sql, params)]))[-1]
+        self._issued(1)
+        return await self._run(self._writer, self.db.query, sql, params)
+
+    def transaction(self):
+        # async with db.transaction() as tx: tx.query(...); tx.query(...)
+        return _UnitOfWork(self)
+
+    async def run_unit(self, statements):
+        if not self.db.ready:
+            await self.open()
+        self._issued(len(statements))
+        if not self.group_commit_ms:
+            result = (await self._run(self._writer, self.db.run_units, [statements]))[0]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._batch.append((statements, fut))
+        if len(self._batch) >= GROUP_COMMIT_MAX:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.group_commit_ms / 1000, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._batch = self._batch, []
+        if batch:
+            asyncio.ensure_future(self._commit_batch(batch))
+
+    async def _commit_batch(self, batch):
+        try:
+            results = await self._run(self._writer, self.db.run_units, [statements for statements, _ in batch])
+        except Exception as e:
+            # the commit itself failed: nothing in the batch was written
+            results = [e] * len(batch)
+        for (_, fut), result in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(result, Exception):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+    async def vacuum(self, pages=VACUUM_PAGES):
+        # on the writer thread, so it runs between write batches, never inside one
+        if not self.db.ready:
+            await self.open()
+        return await self._run(self._writer, self.db.vacuum, pages)
+
+    async def enable_incremental_vacuum(self):
+        if not self.db.ready:
+            await self.open()
+        return await self._run(self._writer, self.db.enable_incremental_vacuum)
+
+    async def fetchone(self, sql, params=()):
+        if not self.db.ready:
+            await self.open()
+        self._issued(1)
+        if self._readers is None:
+            return await self._run(self._writer, self.db.fetchone, sql, params)
+        return await self._run(self._readers, self._read, sql, params, True)
+
+    async def fetchall(self, sql, params=()):
+        if not self.db.ready:
+            await self.open()
+        self._issued(1)
+        if self._readers is None:
+            return await self._run(self._writer, self.db.fetchall, sql, params)
+        return await self._run(self._readers, self._read, sql, params, False)
+
+    def close(self):
+        # callers should stop issuing writes first; anything still batched is dropped
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        if self._readers is not None:
+            self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        for conn in self._reader_conns:
+            conn.close()
+        self.db.close()
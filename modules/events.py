@@ -0,0 +1,114 @@
+# in-process pub/sub for live auction events (feeds the dashboard's SSE / WebSocket endpoints)
+import asyncio
+import json
+import threading
+
+SUBSCRIBER_QUEUE = 256   # events buffered per subscriber before it counts as too slow
+ALL_TOPICS = "*"
+
+def auction_topic(item_type, item_id):
+    return f"{item_type}:{item_id}"
+
+class Subscription:
+    """
+    One connected viewer. get() returns the next encoded event, or None once the bus has
+    dropped this subscriber (it fell SUBSCRIBER_QUEUE events behind); the client should
+    reconnect and start over from a fresh snapshot.
+    """
+    def __init__(self, topics, maxsize=SUBSCRIBER_QUEUE):
+        self.topics = topics
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+
+    async def get(self, timeout=None):
+        if self.closed and self.queue.empty():
+            return None
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def _drop(self):
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+class EventBus:
+    """
+    Topic-based fan-out. publish() may be called from any thread (the bot's loop); the
+    event is encoded once and handed to the subscribers' loop (the dashboard's) in a single
+    call_soon_threadsafe, where it is pushed to every matching queue without waiting.
+    A subscriber whose queue is full is dropped instead of slowing everyone else down.
+    `snapshot(topics)` returns the current state as events, sent first on connect.
+    """
+    def __init__(self, snapshot=None, queue_size=SUBSCRIBER_QUEUE):
+        self.snapshot = snapshot
+        self.queue_size = queue_size
+        self._topics = {}    # topic -> set of Subscription (ALL_TOPICS for firehose viewers)
+        self._loop = None    # loop the subscribers live on
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def active(self):
+        # cheap check so publishers can skip building events nobody will see
+        return self._loop is not None and bool(self._topics)
+
+    @property
+    def subscribers(self):
+        return len({s for subs in list(self._topics.values()) for s in subs})
+
+    def subscribe(self, topics=None):
+        # must be called on the loop that will consume the events
+        self._loop = asyncio.get_running_loop()
+        sub = Subscription(frozenset(topics or (ALL_TOPICS,)), self.queue_size)
+        with self._lock:
+            for topic in sub.topics:
+                self._topics.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for topic in sub.topics:
+                subs = self._topics.get(topic)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._topics[topic]
+
+    def initial_events(self, sub):
+        """Encoded snapshot events for a new subscriber."""
+        if self.snapshot is None:
+            return []
+        topics = None if ALL_TOPICS in sub.topics else sub.topics
+        return [encode(e) for e in self.snapshot(topics)]
+
+    def publish(self, topic, event):
+        loop = self._loop
+        if not self.active:
+            return   # nobody listening: publishing costs nothing
+        self.published += 1
+        payload = encode(dict(event, topic=topic))
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fanout(topic, payload)
+        elif not loop.is_closed():
+            loop.call_soon_threadsafe(self._fanout, topic, payload)
+
+    def _fanout(self, topic, payload):
+        with self._lock:
+            targets = list(self._topics.get(topic, ())) + list(self._topics.get(ALL_TOPICS, ()))
+        for sub in targets:
+            if sub.closed:
+                continue
+            try:
+                sub.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                self.unsubscribe(sub)
+                sub._drop()
+
+def encode(event):
+    return json.dumps(event, separators=(",", ":"), default=str)
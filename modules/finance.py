@@ -0,0 +1,229 @@
+# ledger for personal wallets and group funds
+import uuid
+
+from modules.investors import OWNER_GROUP, OWNER_USER
+
+LEDGER_SNAPSHOT_INTERVAL = 3600   # seconds between balance snapshots
+PAYROLL_INTERVAL = 7 * 24 * 3600  # seconds between payrolls of one guild
+
+# account type -> (table, balance column, key column); the balance columns stay the
+# materialized balance everything else reads, the ledger is the history behind them
+ACCOUNTS = {
+    OWNER_USER: ("personal_wallets", "balance", "user_id"),
+    OWNER_GROUP: ("investor_groups", "funds", "id"),
+}
+
+class InsufficientFunds(Exception):
+    def __init__(self, account, amount):
+        super().__init__(f"{account[0]} {account[1]} cannot cover {-amount}")
+        self.account = account
+        self.amount = amount
+
+def _key(account):
+    # personal_wallets.user_id is stored as text
+    return str(account[1]) if account[0] == OWNER_USER else account[1]
+
+def _key_sql(account_type, column):
+    # _key() for a ledger account_id column inside SQL
+    return f"CAST({column} AS TEXT)" if account_type == OWNER_USER else column
+
+class Ledger:
+    """
+    Append-only ledger_entries (one row per posting, with the balance after it) behind the
+    personal_wallets.balance / investor_groups.funds columns. A posting is two statements in
+    the caller's unit of work: the entry, inserted only if the overdraft check passes against
+    the current balance, then the balance update by exactly that entry's amount. Both run on
+    the writer thread inside one transaction, so concurrent commands can't lose updates.
+    Accounts are (owner_type, owner_id), like owners elsewhere (modules/investors.py).
+    `on_change(account)`, if set, is called after each unit that posted to the account commits.
+    """
+    def __init__(self, db, on_change=None):
+        self.db = db
+        self.on_change = on_change
+
+    # ---------- POSTING ----------
+    def post(self, tx, account, amount, kind, memo=None, floor=0, clamp=False, batch=None):
+        """
+        Queue one posting on `tx`. A debit that would take the balance below `floor` aborts
+        the whole unit with InsufficientFunds, unless clamp=True, which takes what is there
+        (down to `floor`) instead. Deposits to a user without a wallet open one.
+        """
+        table, col, key = ACCOUNTS[account[0]]
+        if account[0] == OWNER_USER and amount > 0:
+            tx.query("INSERT OR IGNORE INTO personal_wallets (user_id, balance) VALUES (?, 0)", (_key(account),))
+        if clamp:
+            delta, delta_params, guard, guard_params = f"MAX(?, {col} + ?) - {col}", (floor, amount), "", ()
+        else:
+            delta, delta_params, guard, guard_params = "?", (amount,), f" AND {col} + ? >= ?", (amount, floor)
+        tx.query(
+            f"INSERT INTO ledger_entries (account_type, account_id, amount, balance_after, kind, memo, batch) "
+            f"SELECT ?, ?, {delta}, {col} + {delta}, ?, ?, ? FROM {table} WHERE {key} = ?{guard}",
+            (account[0], account[1]) + delta_params + delta_params + (kind, memo, batch, _key(account)) + guard_params,
+            expect=1, error=InsufficientFunds(account, amount))
+        tx.query(f"UPDATE {table} SET {col} = {col} + (SELECT amount FROM ledger_entries WHERE id = last_insert_rowid()) WHERE {key} = ?",
+                 (_key(account),))
+        if self.on_change is not None:
+            tx.on_commit(lambda: self.on_change(account))
+
+    def post_many(self, tx, postings, batch=None):
+        """
+        Bulk posting for finalizations and payroll: `postings` is an iterable of
+        (account, amount, kind, memo) or dicts of post() arguments. All of them share one
+        batch id and succeed or fail together with the rest of `tx`. Returns the batch id.
+        """
+        batch = batch or uuid.uuid4().hex
+        for p in postings:
+            if isinstance(p, dict):
+                self.post(tx, batch=batch, **p)
+            else:
+                self.post(tx, *p, batch=batch)
+        return batch
+
+    def post_set(self, tx, source, params, kind, memo=None, batch=None):
+        """
+        Set-based post_many, for runs too large to post one by one (payroll). `source` is a
+        SELECT of (account_type, account_id, amount) rows; every account gets one entry with
+        its net amount and each balance column one UPDATE per account type, whatever the
+        row count. There is no overdraft check: `source` must only debit what it has seen is
+        there, inside the same `tx`. Returns the batch id; see notify() for on_change.
+        """
+        batch = batch or uuid.uuid4().hex
+        joins, balances, exists = [], [], []
+        for i, (account_type, (table, col, key)) in enumerate(ACCOUNTS.items()):
+            joins.append(f"LEFT JOIN {table} a{i} ON n.account_type = '{account_type}' AND a{i}.{key} = {_key_sql(account_type, 'n.account_id')}")
+            balances.append(f"a{i}.{col}")
+            if account_type != OWNER_USER:
+                exists.append(f"(n.account_type != '{account_type}' OR a{i}.{key} IS NOT NULL)")
+        # one entry per account, balance_after from the balance as it stands (a wallet opened below starts at 0)
+        tx.query(f"INSERT INTO ledger_entries (account_type, account_id, amount, balance_after, kind, memo, batch) "
+                 f"SELECT n.account_type, n.account_id, n.amount, COALESCE({', '.join(balances)}, 0) + n.amount, ?, ?, ? "
+                 f"FROM (SELECT account_type, account_id, SUM(amount) AS amount FROM ({source}) "
+                 f"GROUP BY account_type, account_id HAVING SUM(amount) != 0) n {' '.join(joins)} WHERE {' AND '.join(exists) or '1'}",
+                 (kind, memo, batch) + tuple(params))
+        tx.query(f"INSERT OR IGNORE INTO personal_wallets (user_id, balance) "
+                 f"SELECT {_key_sql(OWNER_USER, 'account_id')}, 0 FROM ledger_entries WHERE batch = ? AND account_type = ?", (batch, OWNER_USER))
+        for account_type, (table, col, key) in ACCOUNTS.items():
+            tx.query(f"UPDATE {table} SET {col} = {col} + e.amount FROM ledger_entries e "
+                     f"WHERE e.batch = ? AND e.account_type = ? AND {table}.{key} = {_key_sql(account_type, 'e.account_id')}",
+                     (batch, account_type))
+        return batch
+
+    async def notify(self, batch):
+        # on_change for every account a post_set() batch moved, once it has committed
+        if self.on_change is None:
+            return
+        for r in await self.db.fetchall("SELECT account_type, account_id FROM ledger_entries WHERE batch=?", (batch,)):
+            self.on_change((r["account_type"], r["account_id"]))
+
+    async def apply(self, postings, batch=None):
+        # post_many in a unit of work of its own
+        async with self.db.transaction() as tx:
+            batch = self.post_many(tx, postings, batch)
+        return batch
+
+    def transfer(self, tx, source, target, amount, kind, memo=None):
+        self.post(tx, source, -amount, kind, memo)
+        self.post(tx, target, amount, kind, memo)
+
+    # ---------- READING ----------
+    async def balance(self, account):
+        # O(1): the materialized column, never a replay
+        table, col, key = ACCOUNTS[account[0]]
+        row = await self.db.fetchone(f"SELECT {col} AS balance FROM {table} WHERE {key} = ?", (_key(account),))
+        return int(row["balance"] or 0) if row else 0
+
+    async def history(self, account, limit=20):
+        return await self.db.fetchall(
+            "SELECT id, amount, balance_after, kind, memo, created_at FROM ledger_entries "
+            "WHERE account_type=? AND account_id=? ORDER BY id DESC LIMIT ?", (account[0], account[1], limit))
+
+    async def verify(self, account):
+        """
+        (materialized balance, balance rebuilt from the ledger). The rebuild starts at the
+        latest snapshot and only sums the entries after it.
+        """
+        snap = await self.db.fetchone(
+            "SELECT entry_id, balance FROM ledger_snapshots WHERE account_type=? AND account_id=? ORDER BY entry_id DESC LIMIT 1",
+            account)
+        since, base = (snap["entry_id"], snap["balance"]) if snap else (0, 0)
+        tail = await self.db.fetchone(
+            "SELECT COALESCE(SUM(amount), 0) AS total FROM ledger_entries WHERE account_type=? AND account_id=? AND id > ?",
+            (account[0], account[1], since))
+        return await self.balance(account), base + tail["total"]
+
+    # ---------- SNAPSHOTS ----------
+    async def snapshot(self):
+        """Record the balance of every account that moved since the last snapshot. Returns how many."""
+        async with self.db.transaction() as tx:
+            tx.query(
+                "INSERT OR IGNORE INTO ledger_snapshots (account_type, account_id, entry_id, balance) "
+                "SELECT e.account_type, e.account_id, e.id, e.balance_after FROM ledger_entries e "
+                "JOIN (SELECT MAX(id) AS id FROM ledger_entries "
+                "      WHERE id > (SELECT COALESCE(MAX(entry_id), 0) FROM ledger_snapshots) "
+                "      GROUP BY account_type, account_id) latest ON e.id = latest.id")
+        return tx.cursors[0].rowcount
+
+# ---------- PAYROLL ----------
+# one row per active contract (a duelist's latest): `periods` salaries owed by the owner
+# to the duelist's wallet, less the penalties for misses recorded since the last payroll.
+# Each owner's contracts are paid in contract order for as long as its balance covers them.
+_PAYROLL_LINES = f"""
+SELECT c.guild_id, c.id AS contract_id, c.duelist_id, c.owner_type AS payer_type, c.owner_id AS payer_id,
+       CAST(d.discord_user_id AS INTEGER) AS payee_id, c.gross, c.penalty, c.gross - c.penalty AS net,
+       CASE WHEN c.owner_id IS NULL OR d.discord_user_id IS NULL THEN 'no_account'
+            WHEN SUM(c.gross - c.penalty) OVER (PARTITION BY c.owner_type, c.owner_id ORDER BY c.id)
+                 > COALESCE(g.funds, w.balance, 0) THEN 'insufficient'
+            ELSE 'paid' END AS status
+FROM (SELECT id, guild_id, duelist_id, owner_type, owner_id, COALESCE(salary, 0) * ? AS gross,
+             MIN(COALESCE(salary, 0) * ?, misses * (COALESCE(salary, 0) * ? / 100)) AS penalty
+      FROM duelist_contracts
+      WHERE guild_id = ? AND id IN (SELECT MAX(id) FROM duelist_contracts WHERE guild_id = ? GROUP BY duelist_id)) c
+JOIN duelists d ON d.id = c.duelist_id
+LEFT JOIN investor_groups g ON c.owner_type = '{OWNER_GROUP}' AND g.id = c.owner_id
+LEFT JOIN personal_wallets w ON c.owner_type = '{OWNER_USER}' AND w.user_id = CAST(c.owner_id AS TEXT)
+"""
+_PAYROLL_COLUMNS = "guild_id, contract_id, duelist_id, payer_type, payer_id, payee_id, gross, penalty, net, status"
+
+async def run_payroll(ledger, guild_id, periods=1, penalty_percent=0, dry_run=False):
+    """
+    Pay one guild's salaries in one set-based pass. The lines are computed, stored in
+    payroll_lines, posted (one net ledger entry per wallet / group, Ledger.post_set) and
+    the paid contracts' misses cleared, all in a single transaction. Contracts whose owner
+    can't cover them stay unpaid and keep their misses for the next run.
+    dry_run computes the same lines without writing anything and returns them under
+    "lines". Returns a summary: contracts and totals (gross, penalty, net) per status.
+    """
+    params = (periods, periods, penalty_percent, guild_id, guild_id)
+    db = ledger.db
+    if dry_run:
+        lines = await db.fetchall(_PAYROLL_LINES, params)
+        groups = {}
+        for r in lines:
+            g = groups.setdefault(r["status"], [0, 0, 0, 0])
+            g[0] += 1
+            g[1] += r["gross"]
+            g[2] += r["penalty"]
+            g[3] += r["net"]
+        summary = _payroll_summary(None, periods, groups)
+        summary["lines"] = [dict(r) for r in lines]
+        return summary
+    batch = uuid.uuid4().hex
+    async with db.transaction() as tx:
+        tx.query(f"INSERT INTO payroll_lines (batch, {_PAYROLL_COLUMNS}) SELECT ?, {_PAYROLL_COLUMNS} FROM ({_PAYROLL_LINES})",
+                 (batch,) + params)
+        paid = "FROM payroll_lines WHERE batch = ? AND status = 'paid'"
+        ledger.post_set(tx, f"SELECT payer_type AS account_type, payer_id AS account_id, -net AS amount {paid} "
+                            f"UNION ALL SELECT '{OWNER_USER}', payee_id, net {paid}",
+                        (batch, batch), "payroll", f"guild {guild_id}", batch)
+        tx.query(f"UPDATE duelist_contracts SET misses = 0 WHERE id IN (SELECT contract_id {paid})", (batch,))
+    await ledger.notify(batch)
+    rows = await db.fetchall("SELECT status, COUNT(*) AS n, SUM(gross) AS gross, SUM(penalty) AS penalty, SUM(net) AS net "
+                             "FROM payroll_lines WHERE batch = ? GROUP BY status", (batch,))
+    return _payroll_summary(batch, periods, {r["status"]: (r["n"], r["gross"], r["penalty"], r["net"]) for r in rows})
+
+def _payroll_summary(batch, periods, groups):
+    # groups: status -> (contracts, gross, penalty, net)
+    paid = groups.get("paid", (0, 0, 0, 0))
+    return {"batch": batch, "periods": periods, "contracts": sum(g[0] for g in groups.values()),
+            "paid": paid[0], "gross": paid[1], "penalty": paid[2], "net": paid[3],
+            "by_status": {status: tuple(g) for status, g in groups.items()}}
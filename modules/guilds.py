@@ -0,0 +1,85 @@
+# per-guild auction state for the sharded bot
+import asyncio
+
+UNPARTITIONED = 0             # guild_id of rows written before the bot was multi-guild
+
+# tables carrying a guild_id column (migration 7); wallets and the ledger stay per user
+PARTITIONED_TABLES = ("club", "duelists", "investor_groups", "groups_members", "live_auctions", "bids",
+                      "club_history", "duelist_contracts", "auction_rollups", "proxy_bids")
+
+class GuildState:
+    """
+    Everything one guild's auctions need, kept apart from every other guild: its live
+    auctions and write-behind queue (AuctionEngine), its deadlines (DeadlineScheduler)
+    and its freeze flag. A flush or a timer storm in one guild never waits on another
+    guild's work. Its market tick is a recurring job (modules/jobs.py).
+    """
+    def __init__(self, guild_id, engine, scheduler):
+        self.guild_id = guild_id
+        self.engine = engine
+        self.scheduler = scheduler
+        self.frozen = False
+        self._tasks = []
+
+    @property
+    def started(self):
+        return bool(self._tasks)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.ensure_future(self.scheduler.run()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await self.engine.flush()
+
+class GuildRegistry:
+    """
+    guild id -> GuildState, created by `factory(guild_id)` on first use and started as soon
+    as there is a running loop. Each shard process only ever holds the guilds it serves.
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self._guilds = {}
+
+    def get(self, guild_id):
+        state = self._guilds.get(guild_id)
+        if state is None:
+            state = self._guilds[guild_id] = self.factory(guild_id)
+        if not state.started:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return state
+            state.start()
+        return state
+
+    def find(self, guild_id):
+        # no side effects: None for a guild that was never touched
+        return self._guilds.get(guild_id)
+
+    def values(self):
+        return list(self._guilds.values())
+
+    def __len__(self):
+        return len(self._guilds)
+
+    async def drop(self, guild_id):
+        state = self._guilds.pop(guild_id, None)
+        if state is not None:
+            await state.stop()
+        return state
+
+    async def flush(self):
+        for state in self.values():
+            await state.engine.flush()
+
+async def claim_unpartitioned(db, guild_id):
+    """Hand every row from before sharding (guild_id 0) to `guild_id`. Returns rows moved per table."""
+    async with db.transaction() as tx:
+        for table in PARTITIONED_TABLES:
+            tx.query(f"UPDATE {table} SET guild_id=? WHERE guild_id=?", (guild_id, UNPARTITIONED))
+    return {table: cur.rowcount for table, cur in zip(PARTITIONED_TABLES, tx.cursors)}
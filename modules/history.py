@@ -0,0 +1,132 @@
+# sale history rollups + reports
+import asyncio
+import csv
+import gzip
+from datetime import datetime, timedelta, timezone
+
+from modules.investors import OWNER_GROUP
+
+# ---------- ROLLUPS ----------
+# auction_rollups keeps one row per (day, item_type, winner) with sale count and volume.
+# Days are sqlite date() strings (UTC), so rows written with datetime('now') and with
+# isoformat() timestamps land in the same buckets.
+UPSERT_ROLLUP = (
+    "INSERT INTO auction_rollups (guild_id, day, item_type, winner, group_name, sales, volume) "
+    "VALUES (?,COALESCE(?, date('now')),?,?,(SELECT name FROM investor_groups WHERE id=?),?,?) "
+    "ON CONFLICT(guild_id, day, item_type, winner) DO UPDATE SET sales=sales+excluded.sales, volume=volume+excluded.volume"
+)
+
+def rollup_sale(tx, guild_id, item_type, winner, amount, day=None, sales=1):
+    # queue the rollup update on the same unit of work that records the sale; winner is an owner (type, id, label)
+    group_id = winner[1] if winner[0] == OWNER_GROUP else None
+    tx.query(UPSERT_ROLLUP, (guild_id, day, item_type, winner[2], group_id, sales, amount))
+
+def rollup_transfer(tx, guild_id, item_type, day, old_winner, new_winner, amount):
+    # an admin moved a recorded sale to a different winner
+    rollup_sale(tx, guild_id, item_type, old_winner, -amount, day, sales=-1)
+    rollup_sale(tx, guild_id, item_type, new_winner, amount, day)
+    tx.query("DELETE FROM auction_rollups WHERE guild_id=? AND day=? AND item_type=? AND winner=? AND sales<=0",
+             (guild_id, day, item_type, old_winner[2]))
+
+# ---------- BID ARCHIVE ----------
+# Bids of finished (or reset) auctions move to bids_archive in bulk, keeping their ids, so
+# `bids` stays as small as the set of live auctions and its indexes stay hot.
+ARCHIVE_COLUMNS = ("id", "guild_id", "bidder", "bidder_type", "bidder_id", "amount", "item_type", "item_id", "timestamp")
+EXPORT_COLUMNS = ARCHIVE_COLUMNS + ("archived_at", "reason")
+EXPORT_CHUNK = 1000   # archived rows fetched per query by the streaming export
+
+def archive_bids(tx, reason, where, params=()):
+    # queue the move of every bid matching `where` (e.g. "item_type=? AND item_id=?") on the caller's unit of work
+    cols = ", ".join(ARCHIVE_COLUMNS)
+    tx.query(f"INSERT INTO bids_archive ({cols}, reason) SELECT {cols}, ? FROM bids WHERE {where}", (reason, *params))
+    tx.query(f"DELETE FROM bids WHERE {where}", params)
+
+def month_bounds(month):
+    # "2024-05" -> ("2024-05-01", "2024-06-01"); ValueError for anything else
+    first = datetime.strptime(month, "%Y-%m")
+    following = (first + timedelta(days=32)).replace(day=1)
+    return first.strftime("%Y-%m-%d"), following.strftime("%Y-%m-%d")
+
+_ARCHIVE_CHUNK = (f"SELECT {', '.join(EXPORT_COLUMNS)} FROM bids_archive "
+                  "WHERE guild_id=? AND (timestamp, id) > (?, ?) AND timestamp < ? ORDER BY timestamp, id LIMIT ?")
+
+def archived_bids_start(month=None):
+    """(first keyset cursor, end timestamp) of an export; ValueError for a bad month."""
+    first, following = month_bounds(month) if month else ("", "9999")
+    return (first, 0), following
+
+def archived_bids_chunk(guild_id, cursor, end, chunk=EXPORT_CHUNK):
+    """
+    (sql, params) for the next `chunk` archived bids after `cursor`, a (timestamp, id)
+    keyset: one range scan of idx_bids_archive_guild. Shared by every export path (the
+    bot's and the dashboard's), so they page and order columns the same way.
+    """
+    return _ARCHIVE_CHUNK, (guild_id, *cursor, end, chunk)
+
+def next_cursor(rows, chunk=EXPORT_CHUNK):
+    # where the next chunk starts, or None once a short chunk says the walk is over
+    return (rows[-1]["timestamp"], rows[-1]["id"]) if len(rows) == chunk else None
+
+async def iter_archived_bids(db, guild_id, month=None, chunk=EXPORT_CHUNK):
+    """
+    One guild's archived bids (optionally one "YYYY-MM"), oldest first, as an async
+    iterator. Rows come `chunk` at a time by keyset on (timestamp, id), so memory stays
+    flat however large the archive.
+    """
+    cursor, end = archived_bids_start(month)
+    while cursor is not None:
+        rows = await db.fetchall(*archived_bids_chunk(guild_id, cursor, end, chunk))
+        for r in rows:
+            yield r
+        cursor = next_cursor(rows, chunk)
+
+async def export_archived_bids(db, guild_id, path, month=None):
+    """Write iter_archived_bids() to a gzipped CSV at `path` one chunk at a time. Returns the row count."""
+    out = await asyncio.to_thread(gzip.open, path, "wt", encoding="utf-8", newline="")
+    count, rows = 0, []
+    try:
+        writer = csv.writer(out)
+        writer.writerow(EXPORT_COLUMNS)
+        async for r in iter_archived_bids(db, guild_id, month):
+            rows.append(tuple(r))
+            if len(rows) >= EXPORT_CHUNK:
+                await asyncio.to_thread(writer.writerows, rows)
+                count, rows = count + len(rows), []
+        await asyncio.to_thread(writer.writerows, rows)
+        count += len(rows)
+    finally:
+        await asyncio.to_thread(out.close)
+    return count
+
+# ---------- REPORTS ----------
+REPORT_PERIODS = {"day": 1, "week": 7, "month": 30}
+
+def report_window(period="week", start=None, end=None):
+    """(title, first_day, last_day) as YYYY-MM-DD strings; period is day/week/month/custom."""
+    today = datetime.now(timezone.utc).date()
+    if period == "custom":
+        first = datetime.strptime(start, "%Y-%m-%d").date()
+        last = datetime.strptime(end, "%Y-%m-%d").date() if end else today
+        return f"Report {first} → {last}", first.isoformat(), last.isoformat()
+    days = REPORT_PERIODS[period]
+    first = today - timedelta(days=days - 1)
+    titles = {"day": "Daily Report", "week": "Weekly Report", "month": "Monthly Report"}
+    return titles[period], first.isoformat(), today.isoformat()
+
+async def build_report(db, guild_id, period="week", start=None, end=None):
+    # reads only one guild's rollups for the window, never club_history
+    title, first, last = report_window(period, start, end)
+    totals = await db.fetchall(
+        "SELECT item_type, COALESCE(SUM(sales), 0) AS sales, COALESCE(SUM(volume), 0) AS volume "
+        "FROM auction_rollups WHERE guild_id=? AND day BETWEEN ? AND ? GROUP BY item_type", (guild_id, first, last))
+    by_type = {r["item_type"]: r for r in totals}
+    clubs = by_type.get("club")
+    duelists = by_type.get("duelist")
+    top_rows = await db.fetchall(
+        "SELECT group_name, SUM(volume) AS volume FROM auction_rollups "
+        "WHERE guild_id=? AND day BETWEEN ? AND ? AND item_type='club' AND group_name IS NOT NULL "
+        "GROUP BY group_name ORDER BY volume DESC LIMIT 5", (guild_id, first, last))
+    top = [(r["group_name"], r["volume"]) for r in top_rows]
+    return (f"📈 {title}\nTotal Sales: {clubs['sales'] if clubs else 0}\nVolume: {clubs['volume'] if clubs else 0}\n"
+            f"Duelist Signings: {duelists['sales'] if duelists else 0} (volume {duelists['volume'] if duelists else 0})\n"
+            f"Top Groups: {top}\nWindow: {first} → {last}\nGenerated: {datetime.now()}")
@@ -0,0 +1,31 @@
+# investor groups + owner identities
+# An owner is (owner_type, owner_id, label): 'user' + discord user id, or 'group' +
+# investor_groups.id. The label is the display string kept in the legacy text columns.
+OWNER_USER = "user"
+OWNER_GROUP = "group"
+GROUP_SUFFIX = " (group)"
+
+def user_owner(user):
+    return (OWNER_USER, user.id, str(user))
+
+def group_owner(group):
+    # group is an investor_groups row
+    return (OWNER_GROUP, group["id"], group["name"] + GROUP_SUFFIX)
+
+async def owner_from_label(db, guild_id, label):
+    # best effort for free-form owner strings typed by admins (forcewinner); group names are per guild
+    if label.endswith(GROUP_SUFFIX):
+        name = label[:-len(GROUP_SUFFIX)].lower()
+        g = await db.fetchone("SELECT id, name FROM investor_groups WHERE guild_id=? AND name=?", (guild_id, name))
+        return (OWNER_GROUP, g["id"] if g else None, name + GROUP_SUFFIX)
+    mention = label.strip("<@!>")
+    if mention.isdigit():
+        return (OWNER_USER, int(mention), label)
+    return (OWNER_USER, None, label)
+
+async def club_owner(db, club):
+    """(owner_type, owner_id) of a club: the winner on record for its latest sale, or None."""
+    sale = await db.fetchone("SELECT winner_type, winner_id FROM club_history WHERE club_id=? ORDER BY id DESC LIMIT 1", (club["id"],))
+    if sale and sale["winner_type"] is not None and sale["winner_id"] is not None:
+        return sale["winner_type"], sale["winner_id"]
+    return None
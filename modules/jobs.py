@@ -0,0 +1,190 @@
+# durable delayed jobs: deadlines and periodic ticks that survive a restart
+import asyncio
+import json
+import time
+import uuid
+
+JOB_POLL_INTERVAL = 5       # seconds between polls for due jobs
+JOB_CLAIM_BATCH = 50        # jobs claimed per poll
+JOB_LEASE = 300             # seconds a claim holds; a job whose runner died is picked up again after this
+JOB_MAX_ATTEMPTS = 5        # a one-shot job that failed this often is dropped
+JOB_RETRY_BASE = 10         # seconds before the first retry, doubled per failed attempt
+JOB_MAX_CATCHUP = 168       # missed ticks a recurring job is handed at most (a week of hourly ticks)
+JOB_WRITE_BEHIND_DELAY = 0.02
+JOB_WRITE_RETRY = 1         # seconds before a failed write-behind batch is tried again
+
+_UPSERT = ("INSERT INTO jobs (kind, key, guild_id, due_at, every, payload) VALUES (?,?,?,?,?,?) "
+           "ON CONFLICT (kind, key) DO UPDATE SET guild_id=excluded.guild_id, due_at=excluded.due_at, "
+           "every=excluded.every, payload=excluded.payload, attempts=0")
+_ENSURE = "INSERT OR IGNORE INTO jobs (kind, key, guild_id, due_at, every, payload) VALUES (?,?,?,?,?,?)"
+_DELETE = "DELETE FROM jobs WHERE kind=? AND key=?"
+
+class JobQueue:
+    """
+    Jobs live in the `jobs` table, one row per (kind, key), due at a unix time. A one-shot
+    job is deleted once it has run; a recurring one (every=seconds) moves to its next due
+    time. After downtime a recurring job runs once, with job["ticks"] set to the number
+    of ticks it missed and job["due_at"] to the first of them, so the handler can catch
+    up in one batched pass.
+
+    run() polls for due jobs of the kinds that have a handler (register()) and claims them
+    with a lease, so several processes can share the table; with shard_count/shard_ids a
+    process only claims jobs of the guilds its shards serve, plus the global ones (guild 0).
+    Kinds without a handler are only stored: e.g. auction deadlines, which the bot arms on
+    its in-memory DeadlineScheduler at startup from pending(kind).
+
+    defer() and ensure() are written behind in small batches (one row per key per batch),
+    so re-arming a deadline on every bid costs no extra commit.
+    """
+    def __init__(self, db, shard_count=None, shard_ids=None, poll_interval=JOB_POLL_INTERVAL):
+        self.db = db
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids
+        self.poll_interval = poll_interval
+        self.owner = "shards " + ",".join(map(str, shard_ids)) if shard_ids else "all shards"
+        self.handlers = {}
+        self.on_run = None   # optional hook(kind, result), result: 'ok' | 'failed'
+        self._pending = {}   # (kind, key) -> (sql, params, payload) waiting for the next write-behind batch, or None once deleted
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    def register(self, kind, handler):
+        # handler(job) is awaited with the row as a dict: payload decoded, "ticks" added
+        self.handlers[kind] = handler
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    # ---------- WRITING ----------
+    def defer(self, kind, key, due_at, payload=None, guild_id=0, every=None):
+        """Create or move the job (kind, key); a later call for the same key replaces it."""
+        # hot path (every accepted bid): the payload is encoded when the batch is written
+        self._pending[(kind, str(key))] = (_UPSERT, (kind, str(key), guild_id, due_at, every), payload)
+        self._schedule_flush()
+
+    def ensure(self, kind, key, every, guild_id=0, first_in=None, payload=None):
+        """Add a recurring job unless it exists, so a restart keeps its schedule."""
+        due_at = time.time() + (every if first_in is None else first_in)
+        self._pending[(kind, str(key))] = (_ENSURE, (kind, str(key), guild_id, due_at, every), payload)
+        self._schedule_flush()
+
+    def cancel(self, kind, key, tx=None):
+        # with tx the delete commits (or not) with the caller's unit of work; the tombstone
+        # keeps a batch that is being retried from writing the job back
+        if tx is not None:
+            self._pending[(kind, str(key))] = None
+            tx.query(_DELETE, (kind, str(key)))
+        else:
+            self._pending[(kind, str(key))] = (_DELETE, (kind, str(key)), None)
+            self._schedule_flush()
+
+    def _schedule_flush(self, delay=JOB_WRITE_BEHIND_DELAY):
+        if self._flush_task is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return   # no loop yet (state built at import): written by run()'s first flush
+            self._flush_task = loop.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            pending, self._pending = {k: v for k, v in self._pending.items() if v is not None}, {}
+            if not pending:
+                return
+            try:
+                async with self.db.transaction() as tx:
+                    for sql, params, payload in pending.values():
+                        tx.query(sql, params if sql is _DELETE else params + (_dump(payload),))
+            except Exception as e:
+                # keep the batch for a retry; a newer write for the same job (made meanwhile) wins
+                for k, v in pending.items():
+                    self._pending.setdefault(k, v)
+                self._schedule_flush(JOB_WRITE_RETRY)
+                print(f"Failed to persist {len(pending)} job writes, retrying:", e)
+
+    # ---------- READING ----------
+    async def pending(self, kind):
+        """{(guild_id, key): (due_at, payload)} for every stored job of `kind`, in one indexed query."""
+        rows = await self.db.fetchall("SELECT guild_id, key, due_at, payload FROM jobs WHERE kind=?", (kind,))
+        return {(r["guild_id"], r["key"]): (r["due_at"], _load(r["payload"])) for r in rows}
+
+    # ---------- RUNNING ----------
+    async def run(self):
+        # claims this process held when it stopped are released rather than waiting out their lease
+        await self.db.query("UPDATE jobs SET claimed_by=NULL, claimed_until=0 WHERE claimed_by LIKE ?", (self.owner + "/%",))
+        while True:
+            try:
+                await self.flush()
+                claimed = await self.poll()
+            except Exception as e:
+                print("Job poll failed:", e)
+                claimed = 0
+            if claimed < JOB_CLAIM_BATCH:
+                await asyncio.sleep(self.poll_interval)
+
+    async def poll(self):
+        """Claim and run the due jobs this process handles. Returns how many were claimed."""
+        if not self.handlers:
+            return 0
+        now = time.time()
+        token = f"{self.owner}/{uuid.uuid4().hex}"
+        where = f"due_at <= ? AND claimed_until <= ? AND kind IN ({','.join('?' * len(self.handlers))})"
+        params = [now, now, *self.handlers]
+        if self.shard_count and self.shard_ids:
+            # discord's shard of a guild: (guild_id >> 22) % shard_count
+            where += f" AND (guild_id = 0 OR (guild_id >> 22) % ? IN ({','.join('?' * len(self.shard_ids))}))"
+            params += [self.shard_count, *self.shard_ids]
+        async with self.db.transaction() as tx:
+            tx.query(f"UPDATE jobs SET claimed_by=?, claimed_until=? WHERE id IN "
+                     f"(SELECT id FROM jobs WHERE {where} ORDER BY due_at LIMIT ?)",
+                     (token, now + JOB_LEASE, *params, JOB_CLAIM_BATCH))
+        if not tx.cursors[0].rowcount:
+            return 0
+        rows = await self.db.fetchall("SELECT * FROM jobs WHERE due_at <= ? AND claimed_by=?", (now, token))
+        await asyncio.gather(*(self._run(row, token, now) for row in rows))
+        return len(rows)
+
+    async def _run(self, row, token, now):
+        every = row["every"]
+        missed = int((now - row["due_at"]) // every) + 1 if every else 1
+        ticks = min(missed, JOB_MAX_CATCHUP)
+        # past the catch-up limit the handler gets the latest ticks, so due_at moves up to the first of those
+        job = {"id": row["id"], "kind": row["kind"], "key": row["key"], "guild_id": row["guild_id"],
+               "due_at": row["due_at"] + (missed - ticks) * (every or 0), "payload": _load(row["payload"]), "ticks": ticks}
+        try:
+            await self.handlers[row["kind"]](job)
+        except Exception as e:
+            attempts = row["attempts"] + 1
+            print(f"Job {row['kind']} {row['key']} failed (attempt {attempts}):", e)
+            self._count(row["kind"], "failed")
+            if every is None and attempts >= JOB_MAX_ATTEMPTS:
+                await self.db.query("DELETE FROM jobs WHERE id=? AND claimed_by=?", (row["id"], token))
+            else:
+                # due_at stays put (a recurring job keeps its missed ticks); the claim runs out at the retry time
+                retry_at = time.time() + JOB_RETRY_BASE * 2 ** min(attempts - 1, 10)
+                await self.db.query("UPDATE jobs SET attempts=?, claimed_by=NULL, claimed_until=? WHERE id=? AND claimed_by=?",
+                                    (attempts, retry_at, row["id"], token))
+            return
+        self._count(row["kind"], "ok")
+        if every:
+            await self.db.query("UPDATE jobs SET due_at=?, attempts=0, claimed_by=NULL, claimed_until=0 WHERE id=? AND claimed_by=?",
+                                (row["due_at"] + missed * every, row["id"], token))
+        else:
+            await self.db.query("DELETE FROM jobs WHERE id=? AND claimed_by=?", (row["id"], token))
+
+    def _count(self, kind, result):
+        if self.on_run is not None:
+            self.on_run(kind, result)
+
+def _dump(payload):
+    return json.dumps(payload) if payload is not None else None
+
+def _load(payload):
+    return json.loads(payload) if payload else None
@@ -0,0 +1,189 @@
+# in-process metrics (counters, gauges, histograms) rendered in the Prometheus text format
+import asyncio
+import contextvars
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+LOOP_LAG_INTERVAL = 0.5   # seconds between event-loop lag samples
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _num(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()   # DB statements are observed from the writer/reader threads
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self.values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+class Gauge(Metric):
+    """Either set() explicitly or read from `fn()` at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn=None):
+        super().__init__(name, help_text)
+        self.fn = fn
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        try:
+            value = self.fn() if self.fn else self.value
+        except Exception:
+            value = float("nan")
+        return self.header() + [f"{self.name} {_num(value)}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}   # labels -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        with self._lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    s[i] += 1
+                    break
+            else:
+                s[len(self.buckets)] += 1
+            s[-1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self.series.items())
+        lines = self.header()
+        for labels, s in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), s[:-1]):
+                cumulative += n
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(s[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, fn=None):
+        return self.register(Gauge(name, help_text, fn))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# ---------- BOT INSTRUMENTATION ----------
+_invocation = contextvars.ContextVar("metrics_invocation", default=None)
+
+class BotMetrics:
+    """
+    Wires the standard bot metrics: command latency / statements per command (from the
+    before_invoke/after_invoke hooks), per-statement timing from DB, and event-loop lag.
+    Gauges for live state are added by the caller with registry.gauge(..., fn=...).
+    """
+    def __init__(self, registry=None):
+        self.registry = registry or Registry()
+        r = self.registry
+        self.command_latency = r.histogram("bot_command_latency_seconds", "Command wall time, invoke to reply.", ("command",))
+        self.command_statements = r.histogram("bot_command_db_statements", "SQL statements issued per command invocation.",
+                                              ("command",), COUNT_BUCKETS)
+        self.command_failures = r.counter("bot_command_failures_total", "Command invocations that raised.", ("command",))
+        self.statement_latency = r.histogram("db_statement_seconds", "SQL statement execution time by verb.",
+                                             ("verb",), STATEMENT_BUCKETS)
+        self.statement_errors = r.counter("db_statement_errors_total", "SQL statements that raised, by verb.", ("verb",))
+        self.loop_lag = r.histogram("event_loop_lag_seconds", "How late a timed wakeup on the event loop fired.")
+        self._invocations = {}   # id(ctx) -> [start, statements]
+
+    # command hooks
+    def command_started(self, ctx):
+        self._invocations[id(ctx)] = [time.perf_counter(), 0]
+        # before_invoke runs in the command's own task, so this tags everything it awaits
+        _invocation.set(id(ctx))
+
+    def command_finished(self, ctx):
+        inv = self._invocations.pop(id(ctx), None)
+        if inv is None:
+            return
+        name = ctx.command.qualified_name if ctx.command else "unknown"
+        self.command_latency.observe(time.perf_counter() - inv[0], name)
+        self.command_statements.observe(inv[1], name)
+        if getattr(ctx, "command_failed", False):
+            self.command_failures.inc(name)
+
+    # AsyncDB / DB hooks
+    def on_statements(self, count):
+        # called on the event loop by AsyncDB for the task issuing the statements
+        inv = self._invocations.get(_invocation.get())
+        if inv is not None:
+            inv[1] += count
+
+    def on_statement(self, sql, seconds, failed=False):
+        # called by DB on whichever thread ran the statement
+        verb = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "?"
+        self.statement_latency.observe(seconds, verb)
+        if failed:
+            self.statement_errors.inc(verb)
+
+    async def sample_loop_lag(self, interval=LOOP_LAG_INTERVAL):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(max(0.0, loop.time() - start - interval))
+
+    def render(self):
+        return self.registry.render()
@@ -0,0 +1,118 @@
+# background DM dispatcher (group bid notifications etc.)
+import asyncio
+from collections import OrderedDict
+
+NOTIFY_WORKERS = 4        # concurrent DM senders
+NOTIFY_QUEUE_SIZE = 1000  # users waiting for a DM; notify() drops beyond this
+NOTIFY_MAX_ATTEMPTS = 3
+DM_CHUNK = 1900           # stay under Discord's 2000 character limit
+NOTIFY_USER_CACHE = 1000  # users resolved over REST kept; the least recently used go first
+
+class Notifier:
+    """
+    Fire-and-forget DMs. notify() only enqueues, so commands never wait on Discord.
+    Workers resolve users from the gateway cache (bot.get_user) before falling back to
+    REST, back off per route when Discord answers 429, and coalesce every message queued
+    for the same user into one DM.
+    """
+    def __init__(self, bot, workers=NOTIFY_WORKERS, max_queue=NOTIFY_QUEUE_SIZE):
+        self.bot = bot
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._pending = {}        # user_id -> messages waiting for that user's next DM
+        self._users = OrderedDict()   # user_id -> user resolved over REST, least recently used first
+        self._backoff_until = {}  # route -> loop time we may hit it again
+        self._tasks = []
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def notify(self, user_id, message):
+        uid = int(user_id)
+        messages = self._pending.get(uid)
+        if messages is not None:
+            # user already queued: ride along in the same DM
+            if message not in messages:
+                messages.append(message)
+            return True
+        try:
+            self.queue.put_nowait((uid, 1))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._pending[uid] = [message]
+        return True
+
+    async def resolve_user(self, user_id):
+        uid = int(user_id)
+        user = self._users.get(uid)
+        if user is not None:
+            self._users.move_to_end(uid)
+            return user
+        # the gateway cache is authoritative and bounded by discord.py; only REST results are kept here
+        user = self.bot.get_user(uid)
+        if user is None:
+            user = self._users[uid] = await self.bot.fetch_user(uid)
+            while len(self._users) > NOTIFY_USER_CACHE:
+                self._users.popitem(last=False)
+        return user
+
+    async def _worker(self):
+        while True:
+            uid, attempt = await self.queue.get()
+            try:
+                messages = self._pending.pop(uid, None)
+                if messages:
+                    await self._deliver(uid, messages, attempt)
+            except Exception as e:
+                self.failed += 1
+                print(f"DM to {uid} failed:", e)
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, uid, messages, attempt):
+        route = f"dm:{uid}"
+        await self._wait_backoff("global")
+        await self._wait_backoff(route)
+        text = "\n".join(messages)
+        try:
+            user = await self.resolve_user(uid)
+            for i in range(0, len(text), DM_CHUNK):
+                await user.send(text[i:i + DM_CHUNK])
+            self.sent += 1
+        except Exception as e:
+            status = getattr(e, "status", None)
+            if status == 429 and attempt < NOTIFY_MAX_ATTEMPTS:
+                retry_after = float(getattr(e, "retry_after", None) or 1.0)
+                scope = "global" if getattr(e, "is_global", False) else route
+                self._backoff_until[scope] = asyncio.get_running_loop().time() + retry_after
+                self._requeue(uid, messages, attempt + 1)
+            elif status in (403, 404):
+                # DMs closed or unknown user: nothing to retry
+                self.failed += 1
+            else:
+                raise
+
+    def _requeue(self, uid, messages, attempt):
+        # anything queued for this user meanwhile is merged back in front of the retry
+        merged = messages + [m for m in self._pending.pop(uid, []) if m not in messages]
+        try:
+            self.queue.put_nowait((uid, attempt))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self._pending[uid] = merged
+
+    async def _wait_backoff(self, route):
+        until = self._backoff_until.get(route)
+        if until is None:
+            return
+        delay = until - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            self._backoff_until.pop(route, None)
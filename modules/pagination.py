@@ -0,0 +1,123 @@
+# keyset-paginated listings with next/previous buttons
+import time
+
+import discord
+
+PAGE_SIZE = 15           # max rows per page
+PAGE_CHAR_LIMIT = 1900   # rendered page stays under Discord's 2000 character limit
+PAGE_CACHE_TTL = 10      # seconds a rendered page is reused across viewers
+PAGE_CACHE_MAX = 512
+VIEW_TIMEOUT = 180
+
+_page_cache = {}   # (cache_key, start cursor) -> (expires, text, next cursor)
+
+class KeysetPager:
+    """
+    Pages through a query by id instead of OFFSET, so every page costs one indexed range scan.
+    `sql` must select an `id` column and contain a `{where}` placeholder for the cursor
+    condition and an `{order}` placeholder, e.g.
+        "SELECT id, name FROM club WHERE {where} ORDER BY id {order} LIMIT ?"
+    `render(row)` returns the line for one row. `head()`, if given, returns extra lines shown
+    above the rows on the first page only (never cached), e.g. entries not yet written.
+    """
+    def __init__(self, db, cache_key, title, sql, params, render, descending=False, page_size=PAGE_SIZE, wrap=None, head=None):
+        self.db = db
+        self.cache_key = cache_key
+        self.title = title
+        self.sql = sql
+        self.params = tuple(params)
+        self.render = render
+        self.descending = descending
+        self.page_size = page_size
+        self.wrap = wrap   # optional (prefix, suffix) around the rows, e.g. a code block
+        self.head = head
+
+    async def page(self, start):
+        """Rendered page starting after `start` (None = first page): (text or None, next cursor or None)."""
+        key = (self.cache_key, start)
+        head = "".join(line[:300] + "\n" for line in self.head()) if start is None and self.head else ""
+        hit = None if head else _page_cache.get(key)
+        if hit and hit[0] > time.monotonic():
+            return hit[1], hit[2]
+        if start is None:
+            where, params = "1=1", self.params
+        else:
+            where, params = ("id < ?" if self.descending else "id > ?"), self.params + (start,)
+        sql = self.sql.format(where=where, order="DESC" if self.descending else "ASC")
+        rows = await self.db.fetchall(sql, params + (self.page_size + 1,))
+        prefix, suffix = self.wrap or ("", "")
+        if not rows:
+            return (f"{self.title}\n{prefix}{head}{suffix}", None) if head else (None, None)
+        body, last_id = "", None
+        budget = PAGE_CHAR_LIMIT - len(self.title) - len(prefix) - len(suffix) - len(head) - 40
+        for r in rows[:self.page_size]:
+            line = self.render(r)[:300] + "\n"
+            if body and len(body) + len(line) > budget:
+                break
+            body += line
+            last_id = r["id"]
+        has_more = len(rows) > self.page_size or last_id != rows[min(len(rows), self.page_size) - 1]["id"]
+        text = f"{self.title}\n{prefix}{head}{body}{suffix}"
+        next_cursor = last_id if has_more else None
+        if head:
+            return text, next_cursor
+        if len(_page_cache) >= PAGE_CACHE_MAX:
+            _page_cache.clear()
+        _page_cache[key] = (time.monotonic() + PAGE_CACHE_TTL, text, next_cursor)
+        return text, next_cursor
+
+class PageView(discord.ui.View):
+    # the invoker pages back and forth; we keep the stack of page start cursors
+    def __init__(self, pager, author_id, first_next):
+        super().__init__(timeout=VIEW_TIMEOUT)
+        self.pager = pager
+        self.author_id = author_id
+        self.starts = [None]
+        self.next_cursor = first_next
+        self.message = None
+        self._sync_buttons()
+
+    def _sync_buttons(self):
+        self.prev_page.disabled = len(self.starts) == 1
+        self.next_page.disabled = self.next_cursor is None
+
+    async def interaction_check(self, interaction):
+        return interaction.user.id == self.author_id
+
+    async def _show(self, interaction, start):
+        text, self.next_cursor = await self.pager.page(start)
+        if text is None:
+            text = "Nothing here anymore."
+        self._sync_buttons()
+        await interaction.response.edit_message(content=f"{text}\nPage {len(self.starts)}", view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction, button):
+        if len(self.starts) > 1:
+            self.starts.pop()
+        await self._show(interaction, self.starts[-1])
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        if self.next_cursor is not None:
+            self.starts.append(self.next_cursor)
+        await self._show(interaction, self.starts[-1])
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except Exception:
+                pass
+
+async def send_paginated(ctx, pager):
+    """Send the first page (with buttons if there is more). Returns False when there are no rows."""
+    text, next_cursor = await pager.page(None)
+    if text is None:
+        return False
+    if next_cursor is None:
+        await ctx.send(text)
+        return True
+    view = PageView(pager, ctx.author.id, next_cursor)
+    view.message = await ctx.send(f"{text}\nPage 1", view=view)
+    return True
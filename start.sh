@@ -1,2 +1,2 @@
 #!/bin/bash
-uvicorn backend.app:app --host 0.0.0.0 --port $PORT
+uvicorn backend.app:app --host 0.0.0.0 --port ${PORT:-8000}
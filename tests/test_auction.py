@@ -0,0 +1,40 @@
+import unittest
+
+from modules.auction import AuctionEngine
+from modules.db import DB, AsyncDB
+from modules.investors import OWNER_GROUP, OWNER_USER
+
+GROUP = (OWNER_GROUP, 1, "whales (group)")
+USER = (OWNER_USER, 7, "alice")
+
+class ProxyFundsTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.db = AsyncDB(DB(":memory:"))
+        self.engine = AuctionEngine(self.db, 10, guild_id=1)
+        self.engine.open("club", "1", 100)
+
+    async def asyncTearDown(self):
+        await self.engine.flush()
+
+    async def test_withdrawn_funds_cap_group_proxy(self):
+        accepted, _ = self.engine.set_proxy("club", "1", GROUP, 1000)
+        self.assertTrue(accepted)
+        # the group withdraws down to 300
+        self.assertEqual(self.engine.cap_proxies(GROUP[:2], 300), 1)
+        accepted, auction = self.engine.place("club", "1", USER, 400)
+        self.assertTrue(accepted)
+        self.assertEqual(auction.leader, USER[:2])
+        self.assertEqual(auction.high_bid, 400)
+
+    async def test_cap_answers_up_to_funds(self):
+        self.engine.set_proxy("club", "1", GROUP, 1000)
+        self.engine.cap_proxies(GROUP[:2], 300)
+        _, auction = self.engine.place("club", "1", USER, 200)
+        self.assertEqual(auction.leader, GROUP[:2])
+        self.assertLessEqual(auction.high_bid, 300)
+        await self.engine.flush()
+        row = await self.db.fetchone("SELECT max_amount FROM proxy_bids WHERE owner_type=? AND owner_id=?", GROUP[:2])
+        self.assertEqual(row["max_amount"], 300)
+
+if __name__ == "__main__":
+    unittest.main()